@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from database import DATABASE_URL
+
+# Aggregate cost of Numeric vs Float columns.
+#
+#   python -m bench.aggregates --rows 2000000 --save bench/aggregates_baseline.json
+#   python -m bench.aggregates --rows 2000000 --baseline bench/aggregates_baseline.json
+#
+# Builds two temporary copies of a stock_movements-like table, one with
+# DOUBLE PRECISION and one with NUMERIC(14, 3), and times the aggregate
+# shapes used by the dashboard and inventory reports against both. Also
+# times the live dashboard queries. With --baseline, any query slower than
+# baseline * (1 + tolerance) fails the run.
+
+SYNTHETIC_QUERIES = {
+    "sum": "SELECT sum(quantity) FROM {table}",
+    "sum_by_item": "SELECT item_id, sum(quantity) FROM {table} GROUP BY item_id",
+    "signed_sum_by_item": (
+        "SELECT item_id, sum(CASE WHEN movement_type = 'inbound' THEN quantity ELSE -quantity END) "
+        "FROM {table} GROUP BY item_id"
+    ),
+    "filtered_sum": "SELECT sum(quantity) FROM {table} WHERE movement_type = 'outbound'",
+}
+
+DASHBOARD_QUERIES = {
+    "dashboard_total_sales": "SELECT sum(total_amount) FROM orders WHERE order_type = 'sales'",
+    "dashboard_total_purchases": "SELECT sum(total_amount) FROM orders WHERE order_type = 'purchase'",
+    "dashboard_low_stock": "SELECT count(inventory_id) FROM inventory_levels WHERE available <= reorder_point",
+}
+
+async def _time(conn, sql, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await conn.execute(text(sql))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+async def run(rows, items, repeat):
+    engine = create_async_engine(DATABASE_URL)
+    results = {}
+    async with engine.connect() as conn:
+        for table, sql_type in (("bench_float", "DOUBLE PRECISION"), ("bench_numeric", "NUMERIC(14, 3)")):
+            await conn.execute(text(
+                f"CREATE TEMP TABLE {table} (item_id INTEGER, movement_type VARCHAR, quantity {sql_type})"
+            ))
+            await conn.execute(text(
+                f"INSERT INTO {table} "
+                f"SELECT (random() * :items)::int, "
+                f"CASE WHEN random() < 0.5 THEN 'inbound' ELSE 'outbound' END, "
+                f"round((random() * 1000)::numeric, 3) "
+                f"FROM generate_series(1, :rows)"
+            ), {"rows": rows, "items": items})
+            await conn.execute(text(f"ANALYZE {table}"))
+
+        for name, sql in SYNTHETIC_QUERIES.items():
+            float_ms = await _time(conn, sql.format(table="bench_float"), repeat)
+            numeric_ms = await _time(conn, sql.format(table="bench_numeric"), repeat)
+            results[f"float.{name}"] = float_ms
+            results[f"numeric.{name}"] = numeric_ms
+
+        for name, sql in DASHBOARD_QUERIES.items():
+            results[name] = await _time(conn, sql, repeat)
+    await engine.dispose()
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if value > previous * (1 + tolerance):
+            regressions.append(f"{name}: {previous:.2f} ms -> {value:.2f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Numeric vs Float aggregate benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rows, args.items, args.repeat))
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"{name:<{width}}  {value:9.2f} ms")
+    for name in SYNTHETIC_QUERIES:
+        ratio = results[f"numeric.{name}"] / results[f"float.{name}"]
+        print(f"numeric/float {name:<{width - 14}}  {ratio:9.2f}x")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print("  " + line)
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
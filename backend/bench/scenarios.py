@@ -0,0 +1,124 @@
+import random
+import time
+from collections import defaultdict
+
+# Load scenarios for bench.run. Each scenario is a coroutine run in a loop
+# by `users` concurrent virtual users until its duration elapses. Requests
+# go through Recorder.request so every call is timed under a stable
+# endpoint name (the route template, not the concrete URL).
+
+API = "/api/v1"
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, method, name, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, API + url, **kwargs)
+        except Exception:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+class Context:
+    """Ids of seeded rows, loaded once before the scenarios start."""
+
+    def __init__(self, items, customers, suppliers, employees):
+        self.items = items
+        self.customers = customers
+        self.suppliers = suppliers
+        self.employees = employees
+
+    def popular_item(self, rng):
+        return self.items[int(rng.paretovariate(1.2) - 1) % len(self.items)]
+
+async def load_context(client):
+    async def ids(url, key):
+        response = await client.get(API + url, params={"limit": 1000})
+        response.raise_for_status()
+        return [row[key] for row in response.json()]
+
+    return Context(
+        items=await ids("/master-data/items/", "item_id"),
+        customers=await ids("/master-data/customers/", "customer_id"),
+        suppliers=await ids("/master-data/suppliers/", "supplier_id"),
+        employees=await ids("/hr/employees/", "employee_id"),
+    )
+
+async def order_entry(client, recorder, ctx, rng):
+    # Clerk keying a sales order with explicit prices, then reading it back
+    lines = [
+        {"item_id": ctx.popular_item(rng), "quantity": rng.randint(1, 20), "unit_price": round(rng.uniform(1, 200), 2)}
+        for _ in range(rng.randint(1, 8))
+    ]
+    response = await recorder.request(client, "POST", "POST /orders/", "/orders/", json={
+        "order_type": "sales", "customer_id": rng.choice(ctx.customers), "items": lines,
+    })
+    if response is not None and response.status_code == 200:
+        order_id = response.json()["order_id"]
+        await recorder.request(client, "GET", "GET /orders/{order_id}", f"/orders/{order_id}")
+
+async def scanner_burst(client, recorder, ctx, rng):
+    # Handheld scanner posting a burst of movements for the same pallet
+    item_id = ctx.popular_item(rng)
+    for _ in range(rng.randint(5, 20)):
+        await recorder.request(client, "POST", "POST /inventory/movements/", "/inventory/movements/", json={
+            "item_id": item_id,
+            "movement_type": rng.choice(["inbound", "outbound"]),
+            "quantity": rng.randint(1, 10),
+            "employee_id": rng.choice(ctx.employees),
+        })
+
+async def dashboard_storm(client, recorder, ctx, rng):
+    # Start of shift: everyone opens the dashboard at once
+    await recorder.request(client, "GET", "GET /dashboard/stats", "/dashboard/stats")
+
+async def login_storm(client, recorder, ctx, rng):
+    response = await recorder.request(client, "POST", "POST /auth/login", "/auth/login",
+                                      data={"username": "admin", "password": "admin123"})
+    if response is not None and response.status_code == 200:
+        token = response.json()["access_token"]
+        await recorder.request(client, "GET", "GET /auth/me", "/auth/me",
+                               headers={"Authorization": f"Bearer {token}"})
+
+# One list endpoint per router, read the way the screens read them
+SWEEP_ENDPOINTS = [
+    "/master-data/suppliers/",
+    "/master-data/customers/",
+    "/master-data/items/",
+    "/master-data/products/",
+    "/hr/employees/",
+    "/hr/attendance/",
+    "/hr/leaves/",
+    "/inventory/levels/",
+    "/inventory/movements/",
+    "/orders/",
+    "/accounting/invoices/",
+    "/accounting/payments/",
+    "/production/bom/",
+    "/production/orders/",
+    "/production/consumption/",
+    "/pricing/price-lists/",
+    "/jobs/",
+]
+
+async def router_sweep(client, recorder, ctx, rng):
+    url = rng.choice(SWEEP_ENDPOINTS)
+    await recorder.request(client, "GET", f"GET {url}", url)
+
+SCENARIOS = {
+    "order_entry": dict(run=order_entry, users=10),
+    "scanner_burst": dict(run=scanner_burst, users=20),
+    "dashboard_storm": dict(run=dashboard_storm, users=50),
+    "login_storm": dict(run=login_storm, users=20),
+    "router_sweep": dict(run=router_sweep, users=20),
+}
+
+def user_rng(seed, scenario, user):
+    return random.Random(f"{seed}:{scenario}:{user}")
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from database import DATABASE_URL, Base
+import main  # noqa: F401 - registers every model on Base.metadata
+from models import master_data, hr, inventory, orders
+from services.partitions import PARTITIONED, create_partitions
+
+# Synthetic data generator for benchmarks.
+#
+#   python -m bench.seed --scale medium
+#   python -m bench.seed --suppliers 500 --items 20000 --orders 50000
+#
+# Item popularity is skewed (a few items get most of the lines and
+# movements) and dates spread over the last `days`, so list, dashboard and
+# aggregate queries see realistic distributions. Deterministic per --seed.
+
+SCALES = {
+    "small": dict(suppliers=20, customers=100, items=500, employees=20, orders=1_000, lines=4, movements=5_000, days=90),
+    "medium": dict(suppliers=200, customers=2_000, items=5_000, employees=100, orders=20_000, lines=5, movements=100_000, days=365),
+    "large": dict(suppliers=1_000, customers=20_000, items=50_000, employees=500, orders=200_000, lines=6, movements=2_000_000, days=730),
+}
+
+CHUNK = 5_000
+UNITS = ["pcs", "kg", "m", "l", "box"]
+CATEGORIES = ["raw", "packaging", "component", "consumable", "spare"]
+DEPARTMENTS = ["production", "warehouse", "sales", "finance", "hr"]
+LOCATIONS = ["MAIN", "WH2", "WH3"]
+
+async def _insert(conn, model, rows):
+    for start in range(0, len(rows), CHUNK):
+        await conn.execute(insert(model), rows[start:start + CHUNK])
+
+async def _ids(conn, column):
+    return list((await conn.execute(select(column).order_by(column))).scalars())
+
+def _popular(rng, population):
+    # Pareto-skewed pick: low indexes are much more likely
+    index = int(rng.paretovariate(1.2)) - 1
+    return population[index % len(population)]
+
+async def seed(suppliers, customers, items, employees, orders_count, lines, movements, days, seed_value=42):
+    rng = random.Random(seed_value)
+    today = date.today()
+    engine = create_async_engine(DATABASE_URL)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for table in PARTITIONED:
+            await create_partitions(conn, table, today - timedelta(days=days), today)
+
+        await _insert(conn, master_data.Supplier, [
+            {"company_name": f"Supplier {i}", "email": f"supplier{i}@example.com", "activity_type": "trading",
+             "rating": round(rng.uniform(1, 5), 1)}
+            for i in range(suppliers)
+        ])
+        await _insert(conn, master_data.Customer, [
+            {"full_name": f"Customer {i}", "contact_info": f"+213 555 {i:06d}"}
+            for i in range(customers)
+        ])
+        await _insert(conn, master_data.Item, [
+            {"item_code": f"BENCH-{i:07d}", "item_name": f"Item {i}", "category": rng.choice(CATEGORIES),
+             "unit": rng.choice(UNITS)}
+            for i in range(items)
+        ])
+        await _insert(conn, hr.Employee, [
+            {"first_name": f"First{i}", "last_name": f"Last{i}", "email": f"employee{i}@example.com",
+             "department": rng.choice(DEPARTMENTS), "basic_salary": rng.randint(30_000, 150_000)}
+            for i in range(employees)
+        ])
+
+        supplier_ids = await _ids(conn, master_data.Supplier.supplier_id)
+        customer_ids = await _ids(conn, master_data.Customer.customer_id)
+        item_ids = await _ids(conn, master_data.Item.item_id)
+        employee_ids = await _ids(conn, hr.Employee.employee_id)
+        rng.shuffle(item_ids)
+
+        await _insert(conn, inventory.Location, [
+            {"code": code, "name": f"Warehouse {code}", "is_default": code == "MAIN", "is_active": True}
+            for code in LOCATIONS
+        ])
+        location_ids = await _ids(conn, inventory.Location.location_id)
+
+        # Every item is stocked at the main warehouse, some at the others too
+        await _insert(conn, inventory.InventoryLevel, [
+            {"item_id": item_id, "location_id": location_id, "on_hand": rng.randint(0, 1_000),
+             "available": rng.randint(0, 1_000), "min_level": 10, "max_level": 1_000,
+             "reorder_point": rng.randint(20, 200)}
+            for item_id in item_ids
+            for location_id in location_ids
+            if location_id == location_ids[0] or rng.random() < 0.3
+        ])
+
+        order_rows = []
+        line_rows = []
+        for i in range(orders_count):
+            sales = rng.random() < 0.6
+            order_lines = []
+            for _ in range(rng.randint(1, lines * 2 - 1)):
+                quantity = rng.randint(1, 50)
+                price = round(rng.uniform(1, 500), 2)
+                order_lines.append({"item_id": _popular(rng, item_ids), "quantity": quantity, "unit_price": price,
+                                    "discount": 0, "tax_rate": 0, "tax_amount": 0,
+                                    "line_total": round(quantity * price, 2)})
+            total = round(sum(line["line_total"] for line in order_lines), 2)
+            order_rows.append({
+                "order_number": f"BENCH-{i:08d}",
+                "order_type": "sales" if sales else "purchase",
+                "order_date": today - timedelta(days=rng.randrange(days)),
+                "customer_id": rng.choice(customer_ids) if sales else None,
+                "supplier_id": None if sales else rng.choice(supplier_ids),
+                "status": rng.choice(["pending", "in_progress", "delivered" if sales else "received"]),
+                "subtotal": total, "discount_total": 0, "tax_total": 0, "total_amount": total,
+            })
+            line_rows.append(order_lines)
+
+        for start in range(0, len(order_rows), CHUNK):
+            chunk = order_rows[start:start + CHUNK]
+            result = await conn.execute(
+                insert(orders.Order).returning(orders.Order.order_id, sort_by_parameter_order=True), chunk
+            )
+            order_ids = result.scalars().all()
+            await _insert(conn, orders.OrderItem, [
+                {**line, "order_id": order_id}
+                for order_id, order_lines in zip(order_ids, line_rows[start:start + CHUNK])
+                for line in order_lines
+            ])
+
+        movement_rows = []
+        now = datetime.utcnow()
+        for i in range(movements):
+            movement_rows.append({
+                "item_id": _popular(rng, item_ids),
+                "location_id": rng.choice(location_ids),
+                "movement_type": "inbound" if rng.random() < 0.45 else "outbound",
+                "transaction_number": f"BENCH-TX-{i:09d}",
+                "date": now - timedelta(minutes=rng.randrange(days * 24 * 60)),
+                "quantity": rng.randint(1, 100),
+                "employee_id": rng.choice(employee_ids),
+            })
+            if len(movement_rows) == CHUNK:
+                await _insert(conn, inventory.StockMovement, movement_rows)
+                movement_rows = []
+        await _insert(conn, inventory.StockMovement, movement_rows)
+
+        attendance_rows = []
+        for offset in range(min(days, 365)):
+            day = today - timedelta(days=offset)
+            if day.weekday() >= 5:
+                continue
+            for employee_id in employee_ids:
+                start = datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=rng.randint(-15, 45))
+                attendance_rows.append({
+                    "employee_id": employee_id, "date": day, "time_in": start,
+                    "time_out": start + timedelta(hours=8, minutes=rng.randint(0, 90)),
+                    "status": "late" if start.hour >= 8 and start.minute > 15 else "present",
+                })
+        await _insert(conn, hr.Attendance, attendance_rows)
+
+        for table in ("orders", "order_items", "stock_movements", "inventory_levels", "attendance"):
+            await conn.exec_driver_sql(f"ANALYZE {table}")
+    await engine.dispose()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name}", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    asyncio.run(seed(
+        sizes["suppliers"], sizes["customers"], sizes["items"], sizes["employees"], sizes["orders"],
+        sizes["lines"], sizes["movements"], sizes["days"], seed_value=args.seed,
+    ))
+
+if __name__ == "__main__":
+    main_cli()
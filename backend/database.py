@@ -1,5 +1,10 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import Column, Index, Table
 from sqlalchemy.orm import sessionmaker, declarative_base
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException
+import asyncio
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://postgres:postgres@db/orliterp")
@@ -11,7 +16,20 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 elif DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Requests allowed to hold a session at once; the rest wait at most
+# DB_ACQUIRE_TIMEOUT seconds and are then shed with 503 instead of queueing
+# for a pool connection until the client times out. A few connections are
+# left for background jobs and middleware bookkeeping.
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW - 3)))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 2))
+
+# SQL_ECHO=false silences statement logging (benchmarks, busy deployments)
+engine_options = {"echo": os.getenv("SQL_ECHO", "true").lower() == "true"}
+if DATABASE_URL.startswith("postgresql"):
+    engine_options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+engine = create_async_engine(DATABASE_URL, **engine_options)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -22,7 +40,39 @@ SessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+def archive_table(table: Table) -> Table:
+    """<table>_archive: same columns, key, indexes and partitioning as `table`,
+    without foreign keys. Holds the partitions of closed fiscal years (see
+    services/partitions.py); rows are never written to it directly."""
+    name = f"{table.name}_archive"
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+        for c in table.columns
+    ]
+    archive = Table(name, table.metadata, *columns, postgresql_partition_by=table.dialect_options["postgresql"]["partition_by"])
+    for index in table.indexes:
+        Index(index.name.replace(table.name, name, 1), *(archive.c[c.name] for c in index.columns), unique=index.unique)
+    return archive
+
+# Created on first use, inside the server's event loop (see services/numbering.py)
+_db_slots: Optional[asyncio.Semaphore] = None
+
+@asynccontextmanager
+async def db_slot():
+    global _db_slots
+    if _db_slots is None:
+        _db_slots = asyncio.Semaphore(DB_MAX_CONCURRENCY)
+    try:
+        await asyncio.wait_for(_db_slots.acquire(), timeout=DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Database is busy, retry shortly", headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        _db_slots.release()
+
 async def get_db():
-    async with SessionLocal() as session:
-        yield session
+    async with db_slot():
+        async with SessionLocal() as session:
+            yield session
 
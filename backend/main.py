@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import master_data, hr, inventory, orders, accounting, production, dashboard, auth
+from routers import master_data, hr, inventory, orders, accounting, production, dashboard, auth, pricing, jobs, events, composite, sync
 from database import engine, Base, SessionLocal
 # Import all model modules so Base.metadata knows about them
 from models import auth as auth_model
@@ -10,6 +10,18 @@ from models import inventory as inventory_model
 from models import orders as orders_model
 from models import accounting as accounting_model
 from models import production as production_model
+from models import pricing as pricing_model
+from models import jobs as jobs_model
+from models import idempotency as idempotency_model
+from models import sync as sync_model
+from migrations import run_migrations
+from services.numbering import sync_sequences
+from services.jobs import runner as job_runner
+from services.events import broker as event_broker
+from middleware.compression import CompressionMiddleware
+from middleware.fields import SparseFieldsMiddleware
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.ratelimit import RateLimitMiddleware
 
 from routers.auth import get_password_hash
 from sqlalchemy import select
@@ -29,18 +41,31 @@ origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5
 if "*" in origins:
     origins = ["*"]
 
+# The last one added is outermost, so fields are trimmed and idempotent
+# responses stored before compression
+app.add_middleware(SparseFieldsMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Throttled requests are turned away before any work is done
+app.add_middleware(RateLimitMiddleware)
+# Outermost, so every response (429s included) carries the CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 @app.on_event("startup")
 async def startup():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
+    await sync_sequences(engine)
+    job_runner.start()
+    event_broker.start()
     # Seed admin user if not present
     async with SessionLocal() as session:
         result = await session.execute(select(auth_model.User).where(auth_model.User.username == "admin"))
@@ -56,6 +81,11 @@ async def startup():
             session.add(new_admin)
             await session.commit()
 
+@app.on_event("shutdown")
+async def shutdown():
+    await job_runner.stop()
+    await event_broker.stop()
+
 # Include routers
 from fastapi import APIRouter
 
@@ -71,6 +101,11 @@ api_v1_router.include_router(accounting.router)
 api_v1_router.include_router(production.router)
 api_v1_router.include_router(dashboard.router)
 api_v1_router.include_router(auth.router)
+api_v1_router.include_router(pricing.router)
+api_v1_router.include_router(jobs.router)
+api_v1_router.include_router(events.router)
+api_v1_router.include_router(composite.router)
+api_v1_router.include_router(sync.router)
 
 app.include_router(api_v1_router)
 
@@ -0,0 +1,62 @@
+import json
+from urllib.parse import parse_qs
+from starlette.datastructures import MutableHeaders
+
+class SparseFieldsMiddleware:
+    """?fields=a,b,c trims JSON GET responses to the listed top-level keys.
+
+    Applies to a single object or to each object of a list; unknown names
+    are ignored. Nested objects are kept whole when their key is listed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        query = parse_qs(scope.get("query_string", b"").decode())
+        fields = {f.strip() for value in query.get("fields", []) for f in value.split(",") if f.strip()}
+        if not fields:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                content_type = MutableHeaders(raw=message["headers"]).get("content-type", "")
+                if message["status"] != 200 or not content_type.startswith("application/json"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            data = json.loads(b"".join(chunks))
+            if isinstance(data, list):
+                data = [_pick(row, fields) for row in data]
+            else:
+                data = _pick(data, fields)
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+def _pick(row, fields):
+    if not isinstance(row, dict):
+        return row
+    return {key: value for key, value in row.items() if key in fields}
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from services import idempotency as store
+
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", 10)) # seconds a retry waits for the original to finish
+POLL_INTERVAL = 0.25
+MAX_KEY_LENGTH = 255
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Set per response by the server or the outer middleware, not replayed
+SKIPPED_HEADERS = ("content-length", "content-encoding", "transfer-encoding", "vary", "date", "server")
+
+class IdempotencyMiddleware:
+    """Writes sent with an Idempotency-Key header run once per key.
+
+    The first response (anything but a 5xx) is stored and replayed, with
+    Idempotent-Replayed: true, to retries with the same key and request. A
+    retry that arrives while the original is still running waits up to
+    IDEMPOTENCY_WAIT seconds for its response. Reusing a key for a
+    different request is rejected with 422. Requests without the header
+    are untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=422)(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        key_hash = store.digest(headers.get("authorization", "").encode(), key.encode())
+        request_hash = store.digest(scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body)
+        existing = await store.claim(key_hash, request_hash)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while existing is not None and existing.status != "completed" and existing.request_hash == request_hash:
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+            existing = await store.lookup(key_hash)
+            if existing is None: # the original failed and let go of the key
+                existing = await store.claim(key_hash, request_hash)
+
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, status_code=422)
+            elif existing.status != "completed":
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still being processed"},
+                    status_code=409,
+                    headers={"Retry-After": "1"},
+                )
+            else:
+                response = Response(existing.body or b"", status_code=existing.status_code)
+                for name, value in existing.headers or []:
+                    response.headers.append(name, value)
+                response.headers["Idempotent-Replayed"] = "true"
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start_message = None
+        response_chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            await store.release(key_hash)
+            raise
+        if start_message is None or start_message["status"] >= 500:
+            await store.release(key_hash)
+            return
+        stored_headers = [
+            [name.decode("latin-1"), value.decode("latin-1")]
+            for name, value in start_message["headers"]
+            if name.decode("latin-1").lower() not in SKIPPED_HEADERS
+        ]
+        await store.complete(key_hash, start_message["status"], stored_headers, b"".join(response_chunks))
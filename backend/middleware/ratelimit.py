@@ -0,0 +1,208 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from routers.auth import ALGORITHM, SECRET_KEY
+
+try:
+    import redis.asyncio as aioredis
+except ImportError: # optional; only needed for RATE_LIMIT_BACKEND=redis
+    aioredis = None
+
+# Request throttling in front of the API.
+#
+# Each request takes a token from a bucket keyed by rule and client (the
+# token's user, else the client IP). Buckets refill at `rate` tokens per
+# second up to `burst`. The in-memory backend is per worker; the redis
+# backend shares buckets between workers and instances. Each client may
+# also have at most RATE_LIMIT_CONCURRENCY requests in flight per worker,
+# and list endpoints have their `limit` query parameter capped.
+
+logger = logging.getLogger("orliterp.ratelimit")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory") # memory, redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", 20)) # requests per second per client
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 40))
+RATE_LIMIT_CONCURRENCY = int(os.getenv("RATE_LIMIT_CONCURRENCY", 8)) # in-flight requests per client
+# Behind a proxy (Render) every request comes from the proxy's address
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+# Proxies that append to X-Forwarded-For; the client is that many entries
+# from the right, everything left of it is whatever the client sent
+RATE_LIMIT_TRUSTED_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", 1))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+
+class Rule(NamedTuple):
+    name: str
+    prefix: str
+    rate: float # tokens per second
+    burst: int
+    by_ip: bool = False # key on the client IP even for signed-in users
+
+# First matching prefix wins
+RULES = (
+    Rule("login", "/api/v1/auth/login", rate=5 / 60, burst=5, by_ip=True),
+    Rule("dashboard", "/api/v1/dashboard/", rate=0.5, burst=5),
+    Rule("composite", "/api/v1/composite/", rate=2, burst=10),
+    Rule("default", "/", rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST),
+)
+
+# Docs and long-lived event streams are neither throttled nor counted
+EXEMPT_PREFIXES = ("/docs", "/redoc", "/openapi.json", "/api/v1/events")
+
+# `limit` caps tighter than MAX_PAGE_SIZE, by path prefix
+PAGE_SIZE_CAPS = {
+    "/api/v1/orders/": 200,
+    "/api/v1/jobs/": 200,
+    "/api/v1/pricing/": 200,
+}
+
+class MemoryBackend:
+    """Token buckets in a bounded LRU map; idle clients are evicted first."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> (tokens, last refill)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token. Returns 0 when allowed, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+# KEYS[1] bucket; ARGV rate, burst. Uses the server clock so all workers agree.
+TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local last = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - last) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+class RedisBackend:
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package")
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._script(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+
+BACKENDS = {
+    "memory": lambda: MemoryBackend(),
+    "redis": lambda: RedisBackend(RATE_LIMIT_REDIS_URL),
+}
+
+def _client_ip(scope, headers: Headers) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = headers.get("x-forwarded-for")
+        hops = [hop.strip() for hop in (forwarded or "").split(",") if hop.strip()]
+        if hops:
+            return hops[-min(RATE_LIMIT_TRUSTED_HOPS, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _user(headers: Headers) -> Optional[str]:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+def _too_many(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+def _cap_limit(scope):
+    """Clamp ?limit= to the path's cap; returns the scope to pass on."""
+    query = scope.get("query_string", b"")
+    if b"limit=" not in query:
+        return scope
+    path = scope["path"]
+    cap = next((size for prefix, size in PAGE_SIZE_CAPS.items() if path.startswith(prefix)), MAX_PAGE_SIZE)
+    params = parse_qsl(query.decode("latin-1"), keep_blank_values=True)
+    changed = False
+    for i, (name, value) in enumerate(params):
+        if name == "limit" and value.isdigit() and int(value) > cap:
+            params[i] = (name, str(cap))
+            changed = True
+    if not changed:
+        return scope
+    return dict(scope, query_string=urlencode(params).encode("latin-1"))
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend: Optional[str] = None):
+        self.app = app
+        self.backend = BACKENDS[backend or RATE_LIMIT_BACKEND]()
+        self._in_flight: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS" or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        scope = _cap_limit(scope)
+
+        headers = Headers(scope=scope)
+        rule = next(r for r in RULES if path.startswith(r.prefix))
+        ip = _client_ip(scope, headers)
+        user = None if rule.by_ip else _user(headers)
+        client = f"user:{user}" if user else f"ip:{ip}"
+
+        try:
+            wait = await self.backend.take(f"{rule.name}:{client}", rule.rate, rule.burst)
+        except Exception:
+            # A broken shared backend must not take the API down with it
+            logger.exception("Rate limit backend failed; letting request through")
+            wait = 0.0
+        if wait > 0:
+            await _too_many("Too many requests", wait)(scope, receive, send)
+            return
+
+        streaming = path.endswith("/stream")
+        if not streaming:
+            if self._in_flight.get(client, 0) >= RATE_LIMIT_CONCURRENCY:
+                await _too_many("Too many concurrent requests", 1)(scope, receive, send)
+                return
+            self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not streaming:
+                remaining = self._in_flight[client] - 1
+                if remaining:
+                    self._in_flight[client] = remaining
+                else:
+                    del self._in_flight[client]
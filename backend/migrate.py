@@ -0,0 +1,15 @@
+import asyncio
+from database import engine, Base
+import main  # noqa: F401 - registers every model on Base.metadata
+from migrations import run_migrations
+
+# Apply pending migrations ahead of a deploy: python migrate.py
+
+async def migrate():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,46 @@
+import importlib
+import pkgutil
+import re
+from sqlalchemy import text
+
+# Lightweight schema migrations for databases created before a model change.
+# Base.metadata.create_all only creates missing tables, so every module named
+# mNNNN_<name>.py in this package exposes `async def upgrade(engine)` that
+# brings an existing database up to date. Migrations must be idempotent:
+# on a fresh database create_all has already built the final schema.
+
+async def run_concurrently(engine, statements):
+    """Run statements outside a transaction block, as CREATE INDEX CONCURRENTLY requires.
+
+    CREATE INDEX ... IF NOT EXISTS statements for indexes that already exist
+    are skipped: partitioned tables refuse CONCURRENTLY even when the index
+    is there and the statement would be a no-op.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in statements:
+            index = re.search(r"INDEX CONCURRENTLY IF NOT EXISTS (\w+)", statement)
+            if index and await conn.scalar(text("SELECT to_regclass(CAST(:name AS text)) IS NOT NULL"), {"name": index.group(1)}):
+                continue
+            await conn.execute(text(statement))
+
+async def run_migrations(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR PRIMARY KEY, applied_at TIMESTAMP DEFAULT now())"
+        ))
+        result = await conn.execute(text("SELECT version FROM schema_migrations"))
+        applied = {row[0] for row in result}
+
+    names = sorted(m.name for m in pkgutil.iter_modules(__path__) if m.name.startswith("m"))
+    for name in names:
+        if name in applied:
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        await module.upgrade(engine)
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:v) ON CONFLICT DO NOTHING"),
+                {"v": name},
+            )
@@ -0,0 +1,21 @@
+from sqlalchemy import text
+
+# Tax and discount breakdown on orders. Adding a column with a constant
+# default is a catalog-only change on Postgres 11+, so this is safe online.
+
+STATEMENTS = [
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS subtotal DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS discount_total DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS tax_total DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE order_items ADD COLUMN IF NOT EXISTS tax_rate DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE order_items ADD COLUMN IF NOT EXISTS tax_amount DOUBLE PRECISION DEFAULT 0",
+    # Existing orders had no tax, so the subtotal is the old total plus discounts
+    "UPDATE orders o SET subtotal = o.total_amount + coalesce(d.discounts, 0), discount_total = coalesce(d.discounts, 0) "
+    "FROM (SELECT order_id, sum(discount) AS discounts FROM order_items GROUP BY order_id) d "
+    "WHERE d.order_id = o.order_id AND o.subtotal = 0",
+]
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        for statement in STATEMENTS:
+            await conn.execute(text(statement))
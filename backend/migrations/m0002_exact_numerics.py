@@ -0,0 +1,176 @@
+import asyncio
+import os
+from sqlalchemy import text
+
+# Float -> Numeric(p, s) for money and quantity columns, done online.
+#
+# ALTER COLUMN ... TYPE would rewrite each table under an ACCESS EXCLUSIVE
+# lock, blocking reads and writes on stock_movements for the whole rewrite.
+# Instead, per table:
+#   1. add a shadow column "<col>__num" for every converted column
+#   2. a BEFORE INSERT/UPDATE trigger keeps the shadows in sync with new writes
+#   3. existing rows are copied in primary key chunks, one short transaction each
+#   4. NOT NULL is prepared with a NOT VALID check constraint validated under
+#      a non-blocking lock
+#   5. a single short transaction drops the old columns and renames the
+#      shadows into place (catalog-only changes)
+# Every step checks the catalog first, so an interrupted run can be resumed.
+
+CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", 5000))
+CHUNK_PAUSE = float(os.getenv("MIGRATION_CHUNK_PAUSE", 0.05))
+SWAP_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+SWAP_ATTEMPTS = 10
+
+MONEY = "NUMERIC(14, 2)"
+UNIT_PRICE = "NUMERIC(14, 4)"
+QUANTITY = "NUMERIC(14, 3)"
+RATE = "NUMERIC(7, 4)"
+
+# table -> (primary key, [(column, type, not null, default)])
+TABLES = {
+    "orders": ("order_id", [
+        ("subtotal", MONEY, False, "0"),
+        ("discount_total", MONEY, False, "0"),
+        ("tax_total", MONEY, False, "0"),
+        ("total_amount", MONEY, False, "0"),
+    ]),
+    "order_items": ("order_item_id", [
+        ("quantity", QUANTITY, True, None),
+        ("unit_price", UNIT_PRICE, True, None),
+        ("discount", MONEY, False, "0"),
+        ("tax_rate", RATE, False, "0"),
+        ("tax_amount", MONEY, False, "0"),
+        ("line_total", MONEY, True, None),
+    ]),
+    "receiving_notes": ("rn_id", [
+        ("quantity_received", QUANTITY, True, None),
+    ]),
+    "invoices": ("invoice_id", [
+        ("amount", MONEY, True, None),
+        ("taxes", MONEY, False, "0"),
+        ("discount", MONEY, False, "0"),
+    ]),
+    "payments": ("payment_id", [
+        ("amount", MONEY, True, None),
+    ]),
+    "accounts_receivable": ("receivable_id", [
+        ("total_amount", MONEY, True, None),
+        ("paid_amount", MONEY, False, "0"),
+    ]),
+    "inventory_levels": ("inventory_id", [
+        ("on_hand", QUANTITY, False, "0"),
+        ("available", QUANTITY, False, "0"),
+        ("min_level", QUANTITY, False, "0"),
+        ("max_level", QUANTITY, False, "0"),
+        ("reorder_point", QUANTITY, False, "0"),
+    ]),
+    "stock_movements": ("movement_id", [
+        ("quantity", QUANTITY, True, None),
+    ]),
+    "bill_of_materials": ("bom_id", [
+        ("qty_required", QUANTITY, True, None),
+    ]),
+    "manufacturing_orders": ("mo_id", [
+        ("quantity_required", QUANTITY, True, None),
+    ]),
+    "material_consumption": ("cons_id", [
+        ("actual_quantity", QUANTITY, True, None),
+        ("waste", QUANTITY, False, "0"),
+    ]),
+    "products": ("product_id", [
+        ("price", MONEY, False, "0"),
+    ]),
+    "employees": ("employee_id", [
+        ("basic_salary", MONEY, False, "0"),
+    ]),
+    "price_list_items": ("price_list_item_id", [
+        ("unit_price", UNIT_PRICE, True, None),
+        ("tax_rate", RATE, False, "0"),
+    ]),
+}
+
+async def _column_types(conn, table):
+    result = await conn.execute(
+        text("SELECT column_name, data_type FROM information_schema.columns WHERE table_name = :t"),
+        {"t": table},
+    )
+    return dict(result.all())
+
+async def _convert_table(engine, table, pk, columns):
+    async with engine.connect() as conn:
+        existing = await _column_types(conn, table)
+    pending = [c for c in columns if existing.get(c[0]) in ("double precision", "real")]
+    if not pending:
+        return
+
+    trigger = f"{table}__numeric_sync"
+
+    # 1 + 2. Shadow columns and the sync trigger
+    async with engine.begin() as conn:
+        for column, sql_type, _, _ in pending:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}__num {sql_type}"))
+        assignments = " ".join(f"NEW.{c}__num := NEW.{c};" for c, _, _, _ in pending)
+        await conn.execute(text(
+            f"CREATE OR REPLACE FUNCTION {trigger}() RETURNS trigger AS $$ "
+            f"BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql"
+        ))
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+        await conn.execute(text(
+            f"CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {trigger}()"
+        ))
+
+    # 3. Chunked backfill; rows written since step 2 are already in sync
+    async with engine.connect() as conn:
+        bounds = (await conn.execute(text(f"SELECT min({pk}), max({pk}) FROM {table}"))).first()
+    low, high = bounds
+    if low is not None:
+        copy = ", ".join(f"{c}__num = {c}" for c, _, _, _ in pending)
+        stale = " OR ".join(f"{c}__num IS DISTINCT FROM {c}::{t}" for c, t, _, _ in pending)
+        for start in range(low, high + 1, CHUNK_SIZE):
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text(f"UPDATE {table} SET {copy} WHERE {pk} >= :start AND {pk} < :end AND ({stale})"),
+                    {"start": start, "end": start + CHUNK_SIZE},
+                )
+            await asyncio.sleep(CHUNK_PAUSE)
+
+    # 4. NOT NULL without a full-table lock: the validated check lets
+    # SET NOT NULL skip its own scan
+    for column, _, not_null, _ in pending:
+        if not not_null:
+            continue
+        check = f"{table}_{column}__num_not_null"
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                f"DO $$ BEGIN "
+                f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column}__num IS NOT NULL) NOT VALID; "
+                f"EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+            ))
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}"))
+
+    # 5. Swap; give up quickly instead of queueing behind long transactions
+    for attempt in range(SWAP_ATTEMPTS):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+                for column, _, not_null, default in pending:
+                    await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+                    await conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}__num TO {column}"))
+                    if default is not None:
+                        await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default}"))
+                    if not_null:
+                        await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+                        await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {table}_{column}__num_not_null"))
+                await conn.execute(text(f"DROP FUNCTION IF EXISTS {trigger}()"))
+            return
+        except Exception:
+            if attempt == SWAP_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(1 + attempt)
+
+async def upgrade(engine):
+    for table, (pk, columns) in TABLES.items():
+        await _convert_table(engine, table, pk, columns)
@@ -0,0 +1,11 @@
+from migrations import run_concurrently
+
+# Indexes used by bulk invoicing of delivered orders. Built concurrently so
+# orders and invoices stay writable; document number sequences are created
+# by create_all.
+
+async def upgrade(engine):
+    await run_concurrently(engine, [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoices_order_id ON invoices (order_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_type_status ON orders (order_type, status)",
+    ])
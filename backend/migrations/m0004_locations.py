@@ -0,0 +1,53 @@
+import asyncio
+from sqlalchemy import text
+from migrations import run_concurrently
+from migrations.m0002_exact_numerics import CHUNK_SIZE, CHUNK_PAUSE
+
+# Location dimension for inventory. Existing stock is assigned to a default
+# "MAIN" location. inventory_levels is small and is updated in place;
+# stock_movements is backfilled in primary key chunks. The one-row-per-item
+# unique constraint is replaced by a unique index on (item_id, location_id),
+# built concurrently before the old constraint is dropped.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO locations (code, name, is_default, is_active) "
+            "SELECT 'MAIN', 'Main warehouse', true, true "
+            "WHERE NOT EXISTS (SELECT 1 FROM locations)"
+        ))
+        default_id = await conn.scalar(text(
+            "SELECT location_id FROM locations ORDER BY is_default DESC, location_id LIMIT 1"
+        ))
+        for table in ("inventory_levels", "stock_movements"):
+            await conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS location_id INTEGER REFERENCES locations (location_id)"
+            ))
+        await conn.execute(text(
+            "UPDATE inventory_levels SET location_id = :id WHERE location_id IS NULL"
+        ), {"id": default_id})
+        await conn.execute(text("ALTER TABLE inventory_levels ALTER COLUMN location_id SET NOT NULL"))
+
+    async with engine.connect() as conn:
+        low, high = (await conn.execute(text(
+            "SELECT min(movement_id), max(movement_id) FROM stock_movements WHERE location_id IS NULL"
+        ))).one()
+    if low is not None:
+        for start in range(low, high + 1, CHUNK_SIZE):
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    "UPDATE stock_movements SET location_id = :id "
+                    "WHERE movement_id >= :start AND movement_id < :end AND location_id IS NULL"
+                ), {"id": default_id, "start": start, "end": start + CHUNK_SIZE})
+            await asyncio.sleep(CHUNK_PAUSE)
+
+    await run_concurrently(engine, [
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_inventory_levels_item_location "
+        "ON inventory_levels (item_id, location_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_inventory_levels_location_item "
+        "ON inventory_levels (location_id, item_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stock_movements_item_location_date "
+        "ON stock_movements (item_id, location_id, date)",
+    ])
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE inventory_levels DROP CONSTRAINT IF EXISTS inventory_levels_item_id_key"))
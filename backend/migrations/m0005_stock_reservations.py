@@ -0,0 +1,13 @@
+from sqlalchemy import text
+
+# Ship-from location and promised/expected date on orders. The
+# stock_reservations table itself is created by create_all. Open sales
+# orders placed before this migration hold no reservations; they reserve
+# the next time they are edited and ship stock when marked delivered.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS location_id INTEGER REFERENCES locations (location_id)"
+        ))
+        await conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS expected_date DATE"))
@@ -0,0 +1,16 @@
+from sqlalchemy import text
+from migrations import run_concurrently
+
+# Preferred supplier on items for replenishment, and an expression index so
+# the replenishment run finds levels at or below their reorder point
+# without scanning inventory_levels.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS preferred_supplier_id INTEGER REFERENCES suppliers (supplier_id)"
+        ))
+    await run_concurrently(engine, [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_inventory_levels_reorder_gap "
+        "ON inventory_levels ((available - reorder_point))",
+    ])
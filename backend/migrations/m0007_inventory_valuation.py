@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from migrations import run_concurrently
+
+# Movement costs and opening valuation. Movements posted before this
+# migration stay uncosted (NULL). Stock on hand is opened at each item's
+# latest net purchase price (zero if it was never purchased): one running
+# total and one FIFO layer per item, and an opening snapshot per item and
+# location so as-of reports start from today's levels rather than from
+# uncosted history. The valuation tables are created by create_all.
+
+OPENING_PRICES = (
+    "SELECT DISTINCT ON (oi.item_id) oi.item_id, "
+    "round(oi.line_total / nullif(oi.quantity, 0), 4) AS unit_cost "
+    "FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+    "WHERE o.order_type = 'purchase' AND o.status <> 'cancelled' "
+    "ORDER BY oi.item_id, o.order_date DESC, o.order_id DESC"
+)
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS unit_cost NUMERIC(14, 4)"))
+        await conn.execute(text("ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS total_cost NUMERIC(14, 2)"))
+
+        opened = await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM item_valuations)"))
+        if not opened:
+            await conn.execute(text(
+                "CREATE TEMPORARY TABLE opening ON COMMIT DROP AS "
+                "SELECT l.item_id, l.location_id, l.on_hand, coalesce(p.unit_cost, 0) AS unit_cost "
+                f"FROM inventory_levels l LEFT JOIN ({OPENING_PRICES}) p ON p.item_id = l.item_id"
+            ))
+            await conn.execute(text(
+                "INSERT INTO item_valuations (item_id, quantity, value, updated_at) "
+                "SELECT item_id, sum(on_hand), sum(round(on_hand * unit_cost, 2)), now() AT TIME ZONE 'utc' "
+                "FROM opening GROUP BY item_id"
+            ))
+            await conn.execute(text(
+                "INSERT INTO valuation_layers (item_id, received_at, quantity, remaining, unit_cost) "
+                "SELECT item_id, now() AT TIME ZONE 'utc', sum(on_hand), sum(on_hand), max(unit_cost) "
+                "FROM opening GROUP BY item_id HAVING sum(on_hand) > 0"
+            ))
+            await conn.execute(text(
+                "INSERT INTO valuation_snapshots (taken_at, item_id, location_id, quantity, value) "
+                "SELECT now() AT TIME ZONE 'utc', item_id, location_id, on_hand, round(on_hand * unit_cost, 2) "
+                "FROM opening"
+            ))
+
+    await run_concurrently(engine, [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stock_movements_date ON stock_movements (date)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_valuation_layers_open "
+        "ON valuation_layers (item_id, layer_id) WHERE remaining > 0",
+    ])
@@ -0,0 +1,29 @@
+from sqlalchemy import text
+
+# Default chart of accounts for the general ledger; the posting engine
+# (services/ledger.py) needs the codes it posts to. The ledger tables are
+# created by create_all. Documents written before this migration are not
+# posted; opening balances are entered as a manual journal entry.
+
+DEFAULT_ACCOUNTS = [
+    ("1000", "Cash and bank", "asset"),
+    ("1200", "Accounts receivable", "asset"),
+    ("1300", "Inventory", "asset"),
+    ("1400", "VAT receivable", "asset"),
+    ("2000", "Accounts payable", "liability"),
+    ("2100", "Goods received not invoiced", "liability"),
+    ("2200", "VAT payable", "liability"),
+    ("3000", "Owner's equity", "equity"),
+    ("3100", "Retained earnings", "equity"),
+    ("4000", "Sales revenue", "revenue"),
+    ("5000", "Cost of goods sold", "expense"),
+    ("6000", "Operating expenses", "expense"),
+]
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        for code, name, account_type in DEFAULT_ACCOUNTS:
+            await conn.execute(text(
+                "INSERT INTO accounts (code, name, account_type, is_active) "
+                "VALUES (:code, :name, :type, true) ON CONFLICT (code) DO NOTHING"
+            ), {"code": code, "name": name, "type": account_type})
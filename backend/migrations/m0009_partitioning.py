@@ -0,0 +1,151 @@
+import asyncio
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from migrations import run_concurrently
+from migrations.m0002_exact_numerics import CHUNK_PAUSE, CHUNK_SIZE, SWAP_ATTEMPTS, SWAP_LOCK_TIMEOUT
+from services.partitions import PARTITION_PREMAKE_MONTHS, PARTITIONED, add_months, create_partitions, month_start
+
+# stock_movements and attendance become range-partitioned on date.
+#
+# Rows are not copied. The existing table is attached, as it is, as one
+# partition (<table>_p_legacy) covering everything before the month after
+# its latest row; monthly partitions start there. Per table:
+#   1. undated rows get UNDATED, in primary key chunks
+#   2. NOT NULL and the partition bound are added as NOT VALID checks and
+#      validated under a non-blocking lock
+#   3. model columns the table lacks are added empty; a unique index on
+#      (key, date), the partitioned primary key, and any missing model
+#      index are built concurrently; the swap makes the first the table's
+#      primary key
+#   4. a single short transaction renames the table and its indexes, creates
+#      the partitioned parent with the same sequence position and attaches
+#      the old table; the validated checks and the prebuilt indexes let the
+#      attach skip every scan
+# The legacy partition moves to the archive like any other once the fiscal
+# year of its last month is closed. On a fresh database create_all has
+# built the partitioned tables and only the monthly partitions are made.
+
+UNDATED = date(1970, 1, 1) # rows written without a date sort before all others
+
+async def _relkind(engine, table):
+    async with engine.connect() as conn:
+        return await conn.scalar(text("SELECT CAST(relkind AS text) FROM pg_class WHERE oid = to_regclass(CAST(:t AS text))"), {"t": table})
+
+async def _fill_undated(engine, table, pk):
+    async with engine.connect() as conn:
+        low, high = (await conn.execute(text(f"SELECT min({pk}), max({pk}) FROM {table} WHERE date IS NULL"))).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, CHUNK_SIZE):
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                f"UPDATE {table} SET date = :undated WHERE {pk} >= :start AND {pk} < :end AND date IS NULL"
+            ), {"undated": UNDATED, "start": start, "end": start + CHUNK_SIZE})
+        await asyncio.sleep(CHUNK_PAUSE)
+
+async def _swap(conn, model, cutover):
+    table = model.__table__
+    name = table.name
+    pk = model.__mapper__.primary_key[0].name
+    legacy = f"{name}_p_legacy"
+
+    await conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+    await conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+    sequence = await conn.scalar(text("SELECT pg_get_serial_sequence(:t, :c)"), {"t": name, "c": pk})
+    primary_key = await conn.scalar(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'"
+    ), {"t": name})
+
+    # The old table, renamed out of the way
+    await conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN {pk} SET NOT NULL"))
+    await conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN date SET NOT NULL"))
+    await conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN {pk} DROP DEFAULT"))
+    if primary_key:
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {primary_key}"))
+    # ATTACH only reuses an index for the parent's key if it backs a key constraint
+    await conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_{pk}_date PRIMARY KEY USING INDEX {name}_{pk}_date"))
+    await conn.execute(text(f"ALTER TABLE {name} RENAME TO {legacy}"))
+    for index in table.indexes:
+        await conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name.replace(name, legacy, 1)}"))
+    if sequence:
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {name}_{pk}_seq_legacy"))
+
+    # The partitioned parent; numbering carries on where the old sequence was
+    await conn.execute(CreateTable(table))
+    for index in table.indexes:
+        await conn.execute(CreateIndex(index))
+    if sequence:
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence(:t, :c), last_value, is_called) FROM {name}_{pk}_seq_legacy"
+        ), {"t": name, "c": pk})
+        await conn.execute(text(f"DROP SEQUENCE {name}_{pk}_seq_legacy"))
+
+    await conn.execute(text(
+        f"ALTER TABLE {name} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{cutover.isoformat()}')"
+    ))
+    await conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT {name}_date_not_null"))
+    await conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT {name}_date_bound"))
+
+async def _convert(engine, model):
+    name = model.__tablename__
+    pk = model.__mapper__.primary_key[0].name
+
+    # 1
+    await _fill_undated(engine, name, pk)
+
+    # 2
+    async with engine.connect() as conn:
+        latest = await conn.scalar(text(f"SELECT max(date) FROM {name}"))
+    today = datetime.utcnow().date()
+    latest = latest.date() if isinstance(latest, datetime) else latest
+    cutover = add_months(month_start(max(latest or today, today)), 1)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {name}_date_not_null"))
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {name}_date_bound"))
+        await conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_date_not_null CHECK (date IS NOT NULL) NOT VALID"))
+        await conn.execute(text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_date_bound CHECK (date < '{cutover.isoformat()}') NOT VALID"
+        ))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {name} VALIDATE CONSTRAINT {name}_date_not_null"))
+        await conn.execute(text(f"ALTER TABLE {name} VALIDATE CONSTRAINT {name}_date_bound"))
+
+    # 3. The parent is built from the model, which may carry columns and
+    # indexes of later migrations (lot_id): the old table gets them first
+    # so the attach matches it without a scan
+    table = model.__table__
+    async with engine.begin() as conn:
+        existing = set((await conn.execute(text(
+            "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:t AS regclass) AND attnum > 0 AND NOT attisdropped"
+        ), {"t": name})).scalars())
+        for column in table.columns:
+            if column.name not in existing:
+                await conn.execute(text(f"ALTER TABLE {name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"))
+    await run_concurrently(engine, [
+        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name}_{pk}_date ON {name} ({pk}, date)",
+        *(
+            f"CREATE {'UNIQUE ' if index.unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {index.name} "
+            f"ON {name} ({', '.join(column.name for column in index.columns)})"
+            for index in table.indexes
+        ),
+    ])
+
+    # 4. Give up quickly instead of queueing behind long transactions
+    for attempt in range(SWAP_ATTEMPTS):
+        try:
+            async with engine.begin() as conn:
+                await _swap(conn, model, cutover)
+            return
+        except Exception:
+            if attempt == SWAP_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(1 + attempt)
+
+async def upgrade(engine):
+    today = datetime.utcnow().date()
+    for name, model in PARTITIONED.items():
+        if await _relkind(engine, name) == "r":
+            await _convert(engine, model)
+        async with engine.begin() as conn:
+            await create_partitions(conn, name, today, add_months(today, PARTITION_PREMAKE_MONTHS))
@@ -0,0 +1,74 @@
+import asyncio
+from sqlalchemy import text
+from migrations import run_concurrently
+from migrations.m0002_exact_numerics import CHUNK_PAUSE, CHUNK_SIZE
+from services.sync import SYNC_TABLES, primary_key
+
+# Change tracking for the delta sync (services/sync.py). The tracked tables
+# get updated_at and sync_xid, existing rows are marked sync_xid = 0 (sent
+# on a client's first sync only) in primary key chunks, and then the
+# triggers are installed: sync_touch stamps every insert and update,
+# sync_tombstone records deletes. The (sync_xid, key) indexes are built
+# concurrently. sync_tombstones is created by create_all.
+
+TOUCH = (
+    "CREATE OR REPLACE FUNCTION sync_touch() RETURNS trigger AS $$ "
+    "BEGIN "
+    "NEW.updated_at := now() AT TIME ZONE 'utc'; "
+    "NEW.sync_xid := pg_current_xact_id()::text::bigint; "
+    "RETURN NEW; "
+    "END $$ LANGUAGE plpgsql"
+)
+
+# TG_ARGV[0] names the primary key column
+TOMBSTONE = (
+    "CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$ "
+    "BEGIN "
+    "INSERT INTO sync_tombstones (table_name, row_id, deleted_at, sync_xid) "
+    "VALUES (TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::integer, now() AT TIME ZONE 'utc', "
+    "pg_current_xact_id()::text::bigint); "
+    "RETURN OLD; "
+    "END $$ LANGUAGE plpgsql"
+)
+
+async def _mark_existing(engine, table, pk):
+    async with engine.connect() as conn:
+        low, high = (await conn.execute(text(f"SELECT min({pk}), max({pk}) FROM {table} WHERE sync_xid IS NULL"))).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, CHUNK_SIZE):
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                f"UPDATE {table} SET sync_xid = 0 WHERE {pk} >= :start AND {pk} < :end AND sync_xid IS NULL"
+            ), {"start": start, "end": start + CHUNK_SIZE})
+        await asyncio.sleep(CHUNK_PAUSE)
+
+async def upgrade(engine):
+    tables = [(spec.model.__tablename__, primary_key(spec.model).name) for spec in SYNC_TABLES.values()]
+    async with engine.begin() as conn:
+        for table, _ in tables:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS sync_xid BIGINT DEFAULT 0"))
+
+    for table, pk in tables:
+        await _mark_existing(engine, table, pk)
+
+    async with engine.begin() as conn:
+        await conn.execute(text(TOUCH))
+        await conn.execute(text(TOMBSTONE))
+        for table, pk in tables:
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_sync_touch ON {table}"))
+            await conn.execute(text(
+                f"CREATE TRIGGER {table}_sync_touch BEFORE INSERT OR UPDATE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION sync_touch()"
+            ))
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_sync_tombstone ON {table}"))
+            await conn.execute(text(
+                f"CREATE TRIGGER {table}_sync_tombstone AFTER DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION sync_tombstone('{pk}')"
+            ))
+
+    await run_concurrently(engine, [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_sync ON {table} (sync_xid, {pk})"
+        for table, pk in tables
+    ])
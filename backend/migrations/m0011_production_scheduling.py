@@ -0,0 +1,11 @@
+from sqlalchemy import text
+
+# Finite-capacity scheduling (services/scheduling.py): manufacturing orders
+# get a priority and a due date. Work centers, their calendars, routings
+# and scheduled_operations are created by create_all; existing orders are
+# planned by the first scheduling run.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE manufacturing_orders ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0"))
+        await conn.execute(text("ALTER TABLE manufacturing_orders ADD COLUMN IF NOT EXISTS due_date DATE"))
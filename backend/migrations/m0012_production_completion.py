@@ -0,0 +1,10 @@
+from sqlalchemy import text
+
+# Manufacturing order completion (services/production.py) records the
+# finished quantity on the order. production_variances is created by
+# create_all. Orders completed before this migration were never posted
+# and keep quantity_completed NULL.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE manufacturing_orders ADD COLUMN IF NOT EXISTS quantity_completed NUMERIC(14, 3)"))
@@ -0,0 +1,19 @@
+from sqlalchemy import text
+from migrations import run_concurrently
+
+# Multi-level BOM cost rollup (services/costing.py): BOM lines can name a
+# product as a sub-assembly component and items get an optional standard
+# cost. The where-used indexes are built concurrently; product_costs is
+# created by create_all and filled on first read or by the nightly rollup.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "ALTER TABLE bill_of_materials ADD COLUMN IF NOT EXISTS component_product_id INTEGER REFERENCES products (product_id)"
+        ))
+        await conn.execute(text("ALTER TABLE items ADD COLUMN IF NOT EXISTS standard_cost NUMERIC(14, 4)"))
+    await run_concurrently(engine, [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bill_of_materials_item ON bill_of_materials (item_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bill_of_materials_component_product ON bill_of_materials (component_product_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bill_of_materials_product ON bill_of_materials (product_id)",
+    ])
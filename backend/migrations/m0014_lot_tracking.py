@@ -0,0 +1,53 @@
+from sqlalchemy import text
+from migrations import run_concurrently
+from services.partitions import partitions
+
+# Lot and serial number tracking (services/lots.py). lots and lot_links are
+# created by create_all; existing tables get a nullable lot_id. The lot
+# index on the partitioned stock_movements (and its archive) is made on the
+# parent only, then built concurrently on each partition and attached, so
+# no partition is locked against writes while it builds. Partitions created
+# afterwards get it from the parent. Where the index already came with the
+# table (create_all, or m0009 built the parent from the model) and
+# partitions already have theirs, nothing is done.
+
+COLUMNS = [
+    "ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS lot_id INTEGER",
+    "ALTER TABLE stock_movements_archive ADD COLUMN IF NOT EXISTS lot_id INTEGER",
+    "ALTER TABLE stock_reservations ADD COLUMN IF NOT EXISTS lot_id INTEGER REFERENCES lots (lot_id)",
+    "ALTER TABLE order_items ADD COLUMN IF NOT EXISTS lot_id INTEGER REFERENCES lots (lot_id)",
+    "ALTER TABLE material_consumption ADD COLUMN IF NOT EXISTS lot_id INTEGER REFERENCES lots (lot_id)",
+    "ALTER TABLE receiving_notes ADD COLUMN IF NOT EXISTS item_id INTEGER REFERENCES items (item_id)",
+    "ALTER TABLE receiving_notes ADD COLUMN IF NOT EXISTS lot_id INTEGER REFERENCES lots (lot_id)",
+]
+
+async def _attached(conn, index: str, partition: str) -> bool:
+    return await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:index AS regclass) AND x.indrelid = CAST(:partition AS regclass))"
+    ), {"index": index, "partition": partition})
+
+async def _partitioned_index(engine, table: str, index: str):
+    async with engine.begin() as conn:
+        valid = await conn.scalar(text(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(CAST(:index AS text))"
+        ), {"index": index})
+        if valid:
+            # Built by create_all (or m0009) with the table: partitions have it
+            return
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} (lot_id)"))
+        names = sorted(await partitions(conn, table))
+    for name in names:
+        async with engine.connect() as conn:
+            if await _attached(conn, index, name):
+                continue
+        await run_concurrently(engine, [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_lot ON {name} (lot_id)"])
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER INDEX {index} ATTACH PARTITION {name}_lot"))
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        for statement in COLUMNS:
+            await conn.execute(text(statement))
+    await _partitioned_index(engine, "stock_movements", "ix_stock_movements_lot")
+    await _partitioned_index(engine, "stock_movements_archive", "ix_stock_movements_archive_lot")
@@ -0,0 +1,12 @@
+from sqlalchemy import text
+
+# Cycle counts (services/counts.py): count_sessions, count_lines and the
+# cycle_count number sequence are created by create_all. Count gains and
+# losses post to an inventory adjustments account, added to the chart.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO accounts (code, name, account_type, is_active) "
+            "VALUES ('5100', 'Inventory adjustments', 'expense', true) ON CONFLICT (code) DO NOTHING"
+        ))
@@ -0,0 +1,9 @@
+from sqlalchemy import text
+
+# Demand forecasting (services/forecasting.py): demand_forecasts is created
+# by create_all; inventory levels get the auto_reorder flag that lets the
+# forecast job set their reorder point and max level.
+
+async def upgrade(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE inventory_levels ADD COLUMN IF NOT EXISTS auto_reorder BOOLEAN DEFAULT false"))
@@ -0,0 +1,12 @@
+from migrations import run_concurrently
+
+# Supplier performance scoring (services/supplier_scoring.py). supplier_scores
+# is created by create_all; scoring one supplier on each receiving note reads
+# its purchase orders and their notes, so both get an index, built
+# concurrently. Ratings fill in with the first nightly run.
+
+async def upgrade(engine):
+    await run_concurrently(engine, [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_supplier ON orders (supplier_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_receiving_notes_order ON receiving_notes (purchase_order_id)",
+    ])
@@ -0,0 +1,19 @@
+from sqlalchemy import text
+from migrations import run_concurrently
+
+# One invoice per order (services/invoicing.py inserts with ON CONFLICT on
+# it). The unique index replaces the plain ix_invoices_order_id; both are
+# built and dropped concurrently. Orders already invoiced more than once
+# have to be resolved by hand first: the migration stops and names them.
+
+async def upgrade(engine):
+    async with engine.connect() as conn:
+        duplicated = (await conn.execute(text(
+            "SELECT order_id FROM invoices WHERE order_id IS NOT NULL GROUP BY order_id HAVING count(*) > 1 ORDER BY order_id LIMIT 20"
+        ))).scalars().all()
+    if duplicated:
+        raise RuntimeError(f"Orders with more than one invoice, merge or unlink them before upgrading: {duplicated}")
+    await run_concurrently(engine, [
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_invoices_order_id ON invoices (order_id)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invoices_order_id",
+    ])
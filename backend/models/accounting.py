@@ -1,18 +1,21 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Boolean, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from database import Base
+from models.types import Money
 from datetime import datetime
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    # One invoice per order: concurrent bulk runs cannot both invoice it
+    __table_args__ = (Index("uq_invoices_order_id", "order_id", unique=True),)
 
     invoice_id = Column(Integer, primary_key=True, index=True)
     invoice_number = Column(String, unique=True, index=True, nullable=False)
     order_id = Column(Integer, ForeignKey("orders.order_id"), nullable=True)
     issue_date = Column(Date, default=datetime.utcnow().date)
-    amount = Column(Float, nullable=False)
-    taxes = Column(Float, default=0.0)
-    discount = Column(Float, default=0.0)
+    amount = Column(Money, nullable=False)
+    taxes = Column(Money, default=0.0)
+    discount = Column(Money, default=0.0)
     payment_method = Column(String, nullable=True)
     status = Column(String, default="unpaid") # paid, unpaid, partial
 
@@ -23,7 +26,7 @@ class Payment(Base):
 
     payment_id = Column(Integer, primary_key=True, index=True)
     invoice_id = Column(Integer, ForeignKey("invoices.invoice_id"))
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
     payment_date = Column(Date, default=datetime.utcnow().date)
     method = Column(String, nullable=True)
 
@@ -36,9 +39,57 @@ class AccountsReceivable(Base):
     customer_id = Column(Integer, ForeignKey("customers.customer_id"))
     invoice_id = Column(Integer, ForeignKey("invoices.invoice_id"))
     due_date = Column(Date, nullable=True)
-    total_amount = Column(Float, nullable=False)
-    paid_amount = Column(Float, default=0.0)
+    total_amount = Column(Money, nullable=False)
+    paid_amount = Column(Money, default=0.0)
     status = Column(String, default="due") # overdue, due, paid
 
     customer = relationship("Customer")
     invoice = relationship("Invoice")
+
+class Account(Base):
+    __tablename__ = "accounts"
+
+    account_id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    account_type = Column(String, nullable=False) # asset, liability, equity, revenue, expense
+    is_active = Column(Boolean, default=True)
+
+class JournalEntry(Base):
+    __tablename__ = "journal_entries"
+    __table_args__ = (Index("ix_journal_entries_source", "source_type", "source_id"),)
+
+    entry_id = Column(Integer, primary_key=True, index=True)
+    entry_number = Column(String, unique=True, index=True, nullable=False)
+    entry_date = Column(Date, nullable=False, index=True)
+    description = Column(String, nullable=True)
+    source_type = Column(String, nullable=True) # invoice, payment, stock_movement; NULL for manual entries
+    source_id = Column(Integer, nullable=True) # no FK: sources live in several tables
+    reversal_of = Column(Integer, ForeignKey("journal_entries.entry_id"), nullable=True)
+    posted_at = Column(DateTime, default=datetime.utcnow)
+
+    lines = relationship("JournalLine", back_populates="entry")
+
+class JournalLine(Base):
+    __tablename__ = "journal_lines"
+    __table_args__ = (Index("ix_journal_lines_account_entry", "account_id", "entry_id"),)
+
+    line_id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("journal_entries.entry_id"), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.account_id"), nullable=False)
+    debit = Column(Money, default=0.0)
+    credit = Column(Money, default=0.0)
+    description = Column(String, nullable=True)
+
+    entry = relationship("JournalEntry", back_populates="lines")
+    account = relationship("Account")
+
+class AccountBalance(Base):
+    __tablename__ = "account_balances"
+    __table_args__ = (PrimaryKeyConstraint("account_id", "period"),)
+
+    # Debit and credit totals per account and month, kept by the posting engine
+    account_id = Column(Integer, ForeignKey("accounts.account_id"), nullable=False)
+    period = Column(Date, nullable=False) # first day of the month
+    debit = Column(Money, default=0.0)
+    credit = Column(Money, default=0.0)
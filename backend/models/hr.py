@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, Date, Boolean, DateTime
 from sqlalchemy.orm import relationship
-from database import Base
+from database import Base, archive_table
+from models.types import Money
 from datetime import datetime
 
 class Employee(Base):
@@ -13,21 +14,25 @@ class Employee(Base):
     phone = Column(String, nullable=True)
     job_position = Column(String, nullable=True)
     department = Column(String, nullable=True)
-    basic_salary = Column(Float, default=0.0)
+    basic_salary = Column(Money, default=0.0)
     hire_date = Column(Date, nullable=True)
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    # Monthly range partitions, see services/partitions.py
+    __table_args__ = {"postgresql_partition_by": "RANGE (date)"}
 
-    attendance_id = Column(Integer, primary_key=True, index=True)
+    attendance_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.employee_id"))
-    date = Column(Date, default=datetime.utcnow().date)
+    date = Column(Date, primary_key=True, default=lambda: datetime.utcnow().date()) # partition key, so part of the primary key
     time_in = Column(DateTime, nullable=True)
     time_out = Column(DateTime, nullable=True)
     status = Column(String, default="present") # present, absent, late
 
     employee = relationship("Employee")
 
+attendance_archive = archive_table(Attendance.__table__)
+
 class LeaveRequest(Base):
     __tablename__ = "leave_requests"
 
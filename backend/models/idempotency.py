@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, JSON, Index
+from database import Base
+from datetime import datetime
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("ix_idempotency_keys_expires_at", "expires_at"),)
+
+    key_hash = Column(LargeBinary(32), primary_key=True) # sha256 of caller + Idempotency-Key
+    request_hash = Column(LargeBinary(32), nullable=False) # sha256 of method, path, query and body
+    status = Column(String, default="in_progress") # in_progress, completed
+    status_code = Column(Integer, nullable=True)
+    headers = Column(JSON, nullable=True) # [[name, value], ...] as sent
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
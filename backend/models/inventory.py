@@ -1,40 +1,222 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Boolean, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
-from database import Base
+from database import Base, archive_table
+from models.sync import ChangeTracked, sync_index
+from models.types import Money, Quantity, UnitPrice
 from datetime import datetime
 import enum
 
 class MovementType(str, enum.Enum):
     INBOUND = "inbound"
     OUTBOUND = "outbound"
+    TRANSFER_IN = "transfer_in"
+    TRANSFER_OUT = "transfer_out"
 
-class InventoryLevel(Base):
+class Location(ChangeTracked, Base):
+    __tablename__ = "locations"
+
+    location_id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    address = Column(String, nullable=True)
+    is_default = Column(Boolean, default=False) # used when a request names no location
+    is_active = Column(Boolean, default=True)
+
+sync_index(Location)
+
+class InventoryLevel(ChangeTracked, Base):
     __tablename__ = "inventory_levels"
+    __table_args__ = (
+        # One row per item and location; also serves item-wide lookups
+        UniqueConstraint("item_id", "location_id", name="uq_inventory_levels_item_location"),
+        # Per-location availability and low-stock scans
+        Index("ix_inventory_levels_location_item", "location_id", "item_id"),
+        # Replenishment looks up rows with available - reorder_point <= 0
+        Index("ix_inventory_levels_reorder_gap", text("(available - reorder_point)")),
+    )
 
     inventory_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("items.item_id"), unique=True)
-    on_hand = Column(Float, default=0.0)
-    available = Column(Float, default=0.0)
-    min_level = Column(Float, default=0.0)
-    max_level = Column(Float, default=0.0)
-    reorder_point = Column(Float, default=0.0)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=False)
+    on_hand = Column(Quantity, default=0.0)
+    available = Column(Quantity, default=0.0)
+    min_level = Column(Quantity, default=0.0)
+    max_level = Column(Quantity, default=0.0)
+    reorder_point = Column(Quantity, default=0.0)
+    auto_reorder = Column(Boolean, default=False) # reorder_point and max_level set from the demand forecast
 
     item = relationship("Item")
+    location = relationship("Location")
+
+sync_index(InventoryLevel)
 
 class StockMovement(Base):
     __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_item_location_date", "item_id", "location_id", "date"),
+        # Valuation reports sum movements over a date range
+        Index("ix_stock_movements_date", "date"),
+        # Traceability finds a lot's movements
+        Index("ix_stock_movements_lot", "lot_id"),
+        # Monthly range partitions, see services/partitions.py
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
-    movement_id = Column(Integer, primary_key=True, index=True)
+    movement_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     item_id = Column(Integer, ForeignKey("items.item_id"))
-    movement_type = Column(String, nullable=False) # inbound, outbound
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=True) # NULL only on rows older than locations
+    movement_type = Column(String, nullable=False) # inbound, outbound, transfer_in, transfer_out
     transaction_number = Column(String, nullable=True)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, primary_key=True, default=datetime.utcnow) # partition key, so part of the primary key
     reference_id = Column(Integer, nullable=True) # PO, SO, MO ID
-    quantity = Column(Float, nullable=False)
+    quantity = Column(Quantity, nullable=False)
     condition = Column(String, default="good") # good, damaged, missing
     beneficiary = Column(String, nullable=True) # customer, supplier, department
     employee_id = Column(Integer, ForeignKey("employees.employee_id"), nullable=True)
     delivery_status = Column(String, default="completed")
+    unit_cost = Column(UnitPrice, nullable=True) # set by valuation; NULL on rows older than valuation
+    total_cost = Column(Money, nullable=True)
+    lot_id = Column(Integer, nullable=True) # no FK, kept off the partitioned table
 
     item = relationship("Item")
     employee = relationship("Employee")
+    location = relationship("Location")
+
+stock_movements_archive = archive_table(StockMovement.__table__)
+
+class Lot(Base):
+    # A lot or serial number of an item (received or bought) or of a
+    # product (made by a manufacturing order)
+    __tablename__ = "lots"
+    __table_args__ = (
+        UniqueConstraint("item_id", "lot_number", name="uq_lots_item_number"),
+        UniqueConstraint("product_id", "lot_number", name="uq_lots_product_number"),
+    )
+
+    lot_id = Column(Integer, primary_key=True, index=True)
+    lot_number = Column(String, nullable=False, index=True)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), nullable=True)
+    tracking = Column(String, nullable=False, default="lot") # lot, serial (moves one unit at a time)
+    supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True)
+    mo_id = Column(Integer, ForeignKey("manufacturing_orders.mo_id"), nullable=True, index=True) # made by
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LotLink(Base):
+    # Genealogy: parent lot went into child lot
+    __tablename__ = "lot_links"
+    __table_args__ = (
+        # Forward and backward traces walk the links from either end
+        Index("ix_lot_links_parent_child", "parent_lot_id", "child_lot_id"),
+        Index("ix_lot_links_child_parent", "child_lot_id", "parent_lot_id"),
+    )
+
+    link_id = Column(Integer, primary_key=True)
+    parent_lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=False)
+    child_lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=False)
+    mo_id = Column(Integer, ForeignKey("manufacturing_orders.mo_id"), nullable=True)
+    quantity = Column(Quantity, nullable=False)
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_order_status", "order_id", "status"),
+        Index("ix_stock_reservations_item_location", "item_id", "location_id"),
+    )
+
+    reservation_id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.order_id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=False)
+    quantity = Column(Quantity, nullable=False)
+    lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=True) # shipped from this lot
+    status = Column(String, default="active") # active, released, consumed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    closed_at = Column(DateTime, nullable=True)
+
+    item = relationship("Item")
+    location = relationship("Location")
+
+class ItemValuation(Base):
+    __tablename__ = "item_valuations"
+
+    # Running totals per item; value is the sum of signed movement costs
+    item_id = Column(Integer, ForeignKey("items.item_id"), primary_key=True)
+    quantity = Column(Quantity, default=0.0)
+    value = Column(Money, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ValuationLayer(Base):
+    __tablename__ = "valuation_layers"
+    __table_args__ = (
+        # FIFO consumption reads the open layers of an item oldest first
+        Index("ix_valuation_layers_open", "item_id", "layer_id", postgresql_where=text("remaining > 0")),
+    )
+
+    layer_id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    movement_id = Column(Integer, nullable=True) # inbound movement; no FK, stock_movements may be partitioned
+    received_at = Column(DateTime, default=datetime.utcnow)
+    quantity = Column(Quantity, nullable=False)
+    remaining = Column(Quantity, nullable=False)
+    unit_cost = Column(UnitPrice, nullable=False)
+
+class ValuationSnapshot(Base):
+    __tablename__ = "valuation_snapshots"
+    __table_args__ = (
+        UniqueConstraint("taken_at", "item_id", "location_id", name="uq_valuation_snapshots_taken_item_location"),
+    )
+
+    snapshot_id = Column(Integer, primary_key=True, index=True)
+    taken_at = Column(DateTime, nullable=False) # covers movements dated up to and including this instant
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=False)
+    quantity = Column(Quantity, nullable=False)
+    value = Column(Money, nullable=False)
+
+class CountSession(Base):
+    # A physical or cycle count of one location, see services/counts.py
+    __tablename__ = "count_sessions"
+
+    session_id = Column(Integer, primary_key=True, index=True)
+    session_number = Column(String, unique=True, nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=False)
+    status = Column(String, nullable=False, default="open") # open, posted, cancelled
+    note = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    posted_at = Column(DateTime, nullable=True)
+
+    location = relationship("Location")
+
+class CountLine(Base):
+    __tablename__ = "count_lines"
+    __table_args__ = (
+        # One line per item; bulk entry upserts on it
+        UniqueConstraint("session_id", "item_id", name="uq_count_lines_session_item"),
+    )
+
+    line_id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("count_sessions.session_id", ondelete="CASCADE"), nullable=False)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    expected = Column(Quantity, nullable=False) # on_hand frozen when the session opened
+    counted = Column(Quantity, nullable=True) # NULL until counted
+    counted_at = Column(DateTime, nullable=True)
+
+class DemandForecast(Base):
+    # Latest forecast per item and location, see services/forecasting.py
+    __tablename__ = "demand_forecasts"
+    __table_args__ = (
+        UniqueConstraint("item_id", "location_id", name="uq_demand_forecasts_item_location"),
+    )
+
+    forecast_id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=False)
+    bucket = Column(String, nullable=False) # day, week
+    model = Column(String, nullable=False) # moving_average, exponential_smoothing, seasonal_naive
+    demand_per_day = Column(Quantity, nullable=False)
+    error = Column(Quantity, nullable=False) # backtest RMSE per bucket
+    safety_stock = Column(Quantity, nullable=False)
+    reorder_point = Column(Quantity, nullable=False) # lead time demand + safety stock
+    max_level = Column(Quantity, nullable=False) # reorder point + demand over the review period
+    computed_at = Column(DateTime, default=datetime.utcnow)
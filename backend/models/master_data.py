@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, Enum, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
+from models.sync import ChangeTracked, sync_index
+from models.types import Money, Rate, UnitPrice
+from datetime import datetime
 import enum
 
 class ActivityType(str, enum.Enum):
@@ -20,7 +23,25 @@ class Supplier(Base):
     state = Column(String, nullable=True)
     address = Column(Text, nullable=True)
     activity_type = Column(String, nullable=True) # Using String for simplicity or Enum if strict
-    rating = Column(Float, default=0.0)
+    rating = Column(Float, default=0.0) # 0-5, set by supplier scoring once the supplier has deliveries
+
+class SupplierScore(Base):
+    # Delivery performance over a rolling window, see services/supplier_scoring.py
+    __tablename__ = "supplier_scores"
+    __table_args__ = (
+        UniqueConstraint("supplier_id", "window_days", "category", name="uq_supplier_scores_supplier_window_category"),
+    )
+
+    score_id = Column(Integer, primary_key=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id", ondelete="CASCADE"), nullable=False, index=True)
+    window_days = Column(Integer, nullable=False)
+    category = Column(String, nullable=False, default="") # item category; "" for all deliveries
+    deliveries = Column(Integer, nullable=False) # purchase order lines received
+    on_time_rate = Column(Rate, nullable=True)
+    in_full_rate = Column(Rate, nullable=True)
+    quality_rate = Column(Rate, nullable=True)
+    score = Column(Rate, nullable=False) # weighted rates, 0-1
+    computed_at = Column(DateTime, default=datetime.utcnow)
 
 class Customer(Base):
     __tablename__ = "customers"
@@ -30,7 +51,7 @@ class Customer(Base):
     contact_info = Column(String, nullable=True)
     address = Column(Text, nullable=True)
 
-class Item(Base):
+class Item(ChangeTracked, Base):
     __tablename__ = "items"
 
     item_id = Column(Integer, primary_key=True, index=True)
@@ -38,8 +59,12 @@ class Item(Base):
     item_name = Column(String, nullable=False)
     category = Column(String, nullable=True)
     unit = Column(String, nullable=False) # e.g., kg, pcs, m
+    preferred_supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True) # used by replenishment
+    standard_cost = Column(UnitPrice, nullable=True) # used by the cost rollup; average cost when unset
 
-class Product(Base):
+sync_index(Item)
+
+class Product(ChangeTracked, Base):
     __tablename__ = "products"
 
     product_id = Column(Integer, primary_key=True, index=True)
@@ -47,5 +72,7 @@ class Product(Base):
     product_name = Column(String, nullable=False)
     product_type = Column(String, nullable=True)
     description = Column(Text, nullable=True)
-    price = Column(Float, default=0.0)
+    price = Column(Money, default=0.0)
     stock_quantity = Column(Integer, default=0)
+
+sync_index(Product)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
+from models.types import Money, Quantity, Rate, UnitPrice
 from datetime import datetime
 import enum
 
@@ -17,6 +18,11 @@ class OrderStatus(str, enum.Enum):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_type_status", "order_type", "status"),
+        # Supplier scoring reads one supplier's purchase orders
+        Index("ix_orders_supplier", "supplier_id"),
+    )
 
     order_id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String, unique=True, index=True, nullable=False)
@@ -25,10 +31,16 @@ class Order(Base):
     supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True)
     customer_id = Column(Integer, ForeignKey("customers.customer_id"), nullable=True)
     status = Column(String, default="pending")
-    total_amount = Column(Float, default=0.0)
+    location_id = Column(Integer, ForeignKey("locations.location_id"), nullable=True) # ship-from / receive-at; default location when NULL
+    expected_date = Column(Date, nullable=True) # promised delivery (sales) or expected receipt (purchase)
+    subtotal = Column(Money, default=0.0) # sum of quantity * unit_price
+    discount_total = Column(Money, default=0.0)
+    tax_total = Column(Money, default=0.0)
+    total_amount = Column(Money, default=0.0) # subtotal - discount_total + tax_total
 
     supplier = relationship("Supplier")
     customer = relationship("Customer")
+    location = relationship("Location")
     items = relationship("OrderItem", back_populates="order")
 
 class OrderItem(Base):
@@ -37,22 +49,31 @@ class OrderItem(Base):
     order_item_id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.order_id"))
     item_id = Column(Integer, ForeignKey("items.item_id"))
-    quantity = Column(Float, nullable=False)
-    unit_price = Column(Float, nullable=False)
-    discount = Column(Float, default=0.0)
-    line_total = Column(Float, nullable=False)
+    quantity = Column(Quantity, nullable=False)
+    unit_price = Column(UnitPrice, nullable=False)
+    discount = Column(Money, default=0.0)
+    tax_rate = Column(Rate, default=0.0)
+    tax_amount = Column(Money, default=0.0)
+    line_total = Column(Money, nullable=False) # net of discount, before tax
+    lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=True) # sales lines: ship from this lot
 
     order = relationship("Order", back_populates="items")
     item = relationship("Item")
 
 class ReceivingNote(Base):
     __tablename__ = "receiving_notes"
+    __table_args__ = (
+        # Supplier scoring groups the notes of each purchase order
+        Index("ix_receiving_notes_order", "purchase_order_id"),
+    )
 
     rn_id = Column(Integer, primary_key=True, index=True)
     purchase_order_id = Column(Integer, ForeignKey("orders.order_id"))
     note_number = Column(String, unique=True, index=True)
-    quantity_received = Column(Float, nullable=False)
+    quantity_received = Column(Quantity, nullable=False)
     quality_status = Column(String, default="compliant") # compliant, rejected
     date_received = Column(Date, default=datetime.utcnow().date)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=True)
+    lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=True) # supplier lot received
 
     purchase_order = relationship("Order")
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy.orm import relationship
+from database import Base
+from models.types import Rate, UnitPrice
+
+class PriceList(Base):
+    __tablename__ = "price_lists"
+
+    price_list_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    customer_id = Column(Integer, ForeignKey("customers.customer_id"), nullable=True, index=True) # NULL = default list
+    is_active = Column(Boolean, default=True)
+
+    customer = relationship("Customer")
+    items = relationship("PriceListItem", back_populates="price_list")
+
+class PriceListItem(Base):
+    __tablename__ = "price_list_items"
+    __table_args__ = (UniqueConstraint("price_list_id", "item_id"),)
+
+    price_list_item_id = Column(Integer, primary_key=True, index=True)
+    price_list_id = Column(Integer, ForeignKey("price_lists.price_list_id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    unit_price = Column(UnitPrice, nullable=False)
+    tax_rate = Column(Rate, default=0.0) # e.g. 0.19 for 19%
+
+    price_list = relationship("PriceList", back_populates="items")
+    item = relationship("Item")
@@ -1,41 +1,130 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
+from models.sync import ChangeTracked, sync_index
+from models.types import Money, Quantity, Rate, UnitPrice
 from datetime import datetime
 
-class BillOfMaterials(Base):
+class BillOfMaterials(ChangeTracked, Base):
     __tablename__ = "bill_of_materials"
+    __table_args__ = (
+        # Where-used lookups walk the BOM upwards from a component
+        Index("ix_bill_of_materials_item", "item_id"),
+        Index("ix_bill_of_materials_component_product", "component_product_id"),
+        Index("ix_bill_of_materials_product", "product_id"),
+    )
 
     bom_id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.product_id"))
-    item_id = Column(Integer, ForeignKey("items.item_id"))
-    qty_required = Column(Float, nullable=False)
+    # The component: an item, or a product made as a sub-assembly
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=True)
+    component_product_id = Column(Integer, ForeignKey("products.product_id"), nullable=True)
+    qty_required = Column(Quantity, nullable=False)
 
-    product = relationship("Product")
+    product = relationship("Product", foreign_keys=[product_id])
     item = relationship("Item")
+    component_product = relationship("Product", foreign_keys=[component_product_id])
+
+sync_index(BillOfMaterials)
+
+class ProductCost(Base):
+    # Cached standard cost per unit of a product, see services/costing.py
+    __tablename__ = "product_costs"
+
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    material_cost = Column(UnitPrice, nullable=False)
+    stale = Column(Boolean, nullable=False, default=False, server_default="false")
+    computed_at = Column(DateTime, default=datetime.utcnow)
 
-class ManufacturingOrder(Base):
+class ManufacturingOrder(ChangeTracked, Base):
     __tablename__ = "manufacturing_orders"
 
     mo_id = Column(Integer, primary_key=True, index=True)
     production_order_number = Column(String, unique=True, index=True, nullable=False)
     product_id = Column(Integer, ForeignKey("products.product_id"))
-    quantity_required = Column(Float, nullable=False)
+    quantity_required = Column(Quantity, nullable=False)
     start_date = Column(Date, nullable=True)
     end_date = Column(Date, nullable=True)
     status = Column(String, default="pending") # pending, in_progress, completed, cancelled
+    priority = Column(Integer, nullable=False, default=0, server_default="0") # higher is scheduled first
+    due_date = Column(Date, nullable=True)
+    quantity_completed = Column(Quantity, nullable=True) # set by completion
 
     product = relationship("Product")
 
+sync_index(ManufacturingOrder)
+
+class WorkCenter(Base):
+    __tablename__ = "work_centers"
+
+    work_center_id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    hours_per_day = Column(Rate, nullable=False, default=8)
+    working_days = Column(String, nullable=False, default="12345") # ISO weekdays, 1 = Monday
+    is_active = Column(Boolean, default=True)
+
+class WorkCenterCalendar(Base):
+    # Exceptions to a work center's week: holidays (0 hours), overtime, shifts
+    __tablename__ = "work_center_calendar"
+    __table_args__ = (UniqueConstraint("work_center_id", "day", name="uq_work_center_calendar_day"),)
+
+    calendar_id = Column(Integer, primary_key=True, index=True)
+    work_center_id = Column(Integer, ForeignKey("work_centers.work_center_id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    hours = Column(Rate, nullable=False)
+
+class Routing(Base):
+    # One operation of a product's routing, run in `sequence` order
+    __tablename__ = "routings"
+
+    routing_id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False, index=True)
+    work_center_id = Column(Integer, ForeignKey("work_centers.work_center_id"), nullable=False)
+    sequence = Column(Integer, nullable=False, default=10)
+    setup_hours = Column(Rate, nullable=False, default=0)
+    run_hours_per_unit = Column(Rate, nullable=False, default=0)
+
+    work_center = relationship("WorkCenter")
+
+class ScheduledOperation(Base):
+    # Hours of one routing operation booked on a work center on one day
+    __tablename__ = "scheduled_operations"
+    __table_args__ = (
+        Index("ix_scheduled_operations_center_day", "work_center_id", "day"),
+    )
+
+    slot_id = Column(Integer, primary_key=True)
+    mo_id = Column(Integer, ForeignKey("manufacturing_orders.mo_id", ondelete="CASCADE"), nullable=False, index=True)
+    routing_id = Column(Integer, ForeignKey("routings.routing_id", ondelete="CASCADE"), nullable=False)
+    work_center_id = Column(Integer, ForeignKey("work_centers.work_center_id"), nullable=False)
+    day = Column(Date, nullable=False)
+    hours = Column(Rate, nullable=False)
+
 class MaterialConsumption(Base):
     __tablename__ = "material_consumption"
 
     cons_id = Column(Integer, primary_key=True, index=True)
     mo_id = Column(Integer, ForeignKey("manufacturing_orders.mo_id"))
     item_id = Column(Integer, ForeignKey("items.item_id"))
-    actual_quantity = Column(Float, nullable=False)
-    waste = Column(Float, default=0.0)
+    actual_quantity = Column(Quantity, nullable=False)
+    waste = Column(Quantity, default=0.0)
     withdrawal_date = Column(Date, default=datetime.utcnow().date)
+    lot_id = Column(Integer, ForeignKey("lots.lot_id"), nullable=True)
 
     manufacturing_order = relationship("ManufacturingOrder")
     item = relationship("Item")
+
+class ProductionVariance(Base):
+    # Actual against standard (BOM) component usage of a completed order
+    __tablename__ = "production_variances"
+
+    variance_id = Column(Integer, primary_key=True, index=True)
+    mo_id = Column(Integer, ForeignKey("manufacturing_orders.mo_id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(Integer, ForeignKey("items.item_id"), nullable=False)
+    standard_quantity = Column(Quantity, nullable=False)
+    actual_quantity = Column(Quantity, nullable=False)
+    quantity_variance = Column(Quantity, nullable=False) # actual - standard
+    unit_cost = Column(UnitPrice, nullable=False)
+    cost_variance = Column(Money, nullable=False)
+    recorded_at = Column(DateTime, default=datetime.utcnow)
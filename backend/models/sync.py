@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, text
+from database import Base
+from datetime import datetime
+
+class ChangeTracked:
+    """Change tracking for the delta sync (services/sync.py). Both columns
+    are set by the sync_touch trigger on every insert and update."""
+    updated_at = Column(DateTime, nullable=True)
+    sync_xid = Column(BigInteger, nullable=True, server_default=text("0")) # id of the writing transaction
+
+def sync_index(model) -> Index:
+    """(sync_xid, primary key), the order changes are read in."""
+    return Index(f"ix_{model.__tablename__}_sync", model.__table__.c.sync_xid, *model.__table__.primary_key.columns)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_table_xid", "table_name", "sync_xid", "tombstone_id"),
+        Index("ix_sync_tombstones_deleted_at", "deleted_at"),
+    )
+
+    # Written by the sync_tombstone trigger when a tracked row is deleted
+    tombstone_id = Column(BigInteger, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False)
@@ -0,0 +1,8 @@
+from sqlalchemy import Numeric
+
+# Exact numeric column types for money and quantities. Float columns drift
+# when millions of movements are summed; Numeric keeps aggregates exact.
+Money = Numeric(14, 2)
+UnitPrice = Numeric(14, 4)
+Quantity = Numeric(14, 3)
+Rate = Numeric(7, 4)
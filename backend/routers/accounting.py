@@ -1,10 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from datetime import date
 from database import get_db
 from models import accounting as models
+from models import orders as order_models
 from schemas import accounting as schemas
+from services.numbering import numbering
+from services.invoicing import invoice_delivered_orders
+from services.ledger import (
+    ACCOUNT_TYPES, balance_sheet, post_entries, post_invoices, post_payment, profit_and_loss,
+    reset_account_cache, reverse_source, trial_balance,
+)
 
 router = APIRouter(
     prefix="/accounting",
@@ -14,12 +24,52 @@ router = APIRouter(
 # --- Invoices ---
 @router.post("/invoices/", response_model=schemas.Invoice)
 async def create_invoice(invoice: schemas.InvoiceCreate, db: AsyncSession = Depends(get_db)):
-    db_invoice = models.Invoice(**invoice.dict())
+    values = invoice.dict()
+    order = None
+    if invoice.order_id is not None:
+        result = await db.execute(select(order_models.Order).filter(order_models.Order.order_id == invoice.order_id))
+        order = result.scalars().first()
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        invoiced = await db.scalar(select(models.Invoice.invoice_number).where(models.Invoice.order_id == order.order_id))
+        if invoiced is not None:
+            raise HTTPException(status_code=409, detail=f"Order is already invoiced by {invoiced}")
+        if invoice.amount is None:
+            values["amount"] = order.total_amount
+        if invoice.taxes is None:
+            values["taxes"] = order.tax_total
+        if invoice.discount is None:
+            values["discount"] = order.discount_total
+    if values["amount"] is None:
+        raise HTTPException(status_code=422, detail="Invoice amount is required when no order is linked")
+    values["taxes"] = values["taxes"] or 0
+    values["discount"] = values["discount"] or 0
+    if not values["invoice_number"]:
+        values["invoice_number"] = await numbering.next(db, "invoice")
+
+    db_invoice = models.Invoice(**values)
     db.add(db_invoice)
+    await db.flush()
+    await post_invoices(db, [{
+        "invoice_id": db_invoice.invoice_id,
+        "invoice_number": db_invoice.invoice_number,
+        "issue_date": db_invoice.issue_date,
+        "amount": db_invoice.amount,
+        "taxes": db_invoice.taxes,
+        "order_type": order.order_type if order is not None else None,
+    }])
     await db.commit()
     await db.refresh(db_invoice)
     return db_invoice
 
+@router.post("/invoices/from-delivered-orders", response_model=schemas.InvoiceBatchResult)
+async def create_invoices_from_delivered_orders(
+    issue_date: Optional[date] = None,
+    due_days: int = 30,
+    db: AsyncSession = Depends(get_db),
+):
+    return await invoice_delivered_orders(db, issue_date=issue_date, due_days=due_days)
+
 @router.get("/invoices/", response_model=List[schemas.Invoice])
 async def read_invoices(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Invoice).offset(skip).limit(limit))
@@ -32,6 +82,7 @@ async def delete_invoice(invoice_id: int, db: AsyncSession = Depends(get_db)):
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
+    await reverse_source(db, "invoice", invoice_id)
     await db.delete(db_invoice)
     await db.commit()
     return {"message": "Invoice deleted successfully"}
@@ -52,7 +103,14 @@ async def create_payment(payment: schemas.PaymentCreate, db: AsyncSession = Depe
             invoice.status = "paid"
         else:
             invoice.status = "partial"
-            
+
+    order_type = None
+    if invoice is not None and invoice.order_id is not None:
+        order_type = await db.scalar(
+            select(order_models.Order.order_type).where(order_models.Order.order_id == invoice.order_id)
+        )
+    await db.flush()
+    await post_payment(db, db_payment.payment_id, db_payment.payment_date, db_payment.amount, purchase=order_type == "purchase")
     await db.commit()
     await db.refresh(db_payment)
     return db_payment
@@ -61,3 +119,107 @@ async def create_payment(payment: schemas.PaymentCreate, db: AsyncSession = Depe
 async def read_payments(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Payment).offset(skip).limit(limit))
     return result.scalars().all()
+
+# --- Chart of Accounts ---
+@router.post("/accounts/", response_model=schemas.Account)
+async def create_account(account: schemas.AccountCreate, db: AsyncSession = Depends(get_db)):
+    if account.account_type not in ACCOUNT_TYPES:
+        raise HTTPException(status_code=422, detail=f"account_type must be one of {', '.join(ACCOUNT_TYPES)}")
+    existing = await db.scalar(select(models.Account.account_id).where(models.Account.code == account.code))
+    if existing is not None:
+        raise HTTPException(status_code=409, detail="Account code already exists")
+    db_account = models.Account(**account.dict())
+    db.add(db_account)
+    await db.commit()
+    await db.refresh(db_account)
+    return db_account
+
+@router.get("/accounts/", response_model=List[schemas.Account])
+async def read_accounts(skip: int = 0, limit: int = 500, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.Account).order_by(models.Account.code).offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.put("/accounts/{account_id}", response_model=schemas.Account)
+async def update_account(account_id: int, account: schemas.AccountCreate, db: AsyncSession = Depends(get_db)):
+    db_account = await db.get(models.Account, account_id)
+    if not db_account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if account.account_type not in ACCOUNT_TYPES:
+        raise HTTPException(status_code=422, detail=f"account_type must be one of {', '.join(ACCOUNT_TYPES)}")
+    for key, value in account.dict().items():
+        setattr(db_account, key, value)
+    await db.commit()
+    await db.refresh(db_account)
+    reset_account_cache()
+    return db_account
+
+# --- Journal ---
+@router.post("/journal/", response_model=schemas.JournalEntry)
+async def create_journal_entry(entry: schemas.JournalEntryCreate, db: AsyncSession = Depends(get_db)):
+    account_ids = {line.account_id for line in entry.lines}
+    found = await db.scalar(select(func.count(models.Account.account_id)).where(models.Account.account_id.in_(account_ids)))
+    if found != len(account_ids):
+        raise HTTPException(status_code=404, detail="Account not found")
+    if any(line.debit < 0 or line.credit < 0 for line in entry.lines):
+        raise HTTPException(status_code=422, detail="Debits and credits must not be negative")
+    entry_ids = await post_entries(db, [{
+        "entry_date": entry.entry_date or date.today(),
+        "description": entry.description,
+        "lines": [(line.account_id, line.debit, line.credit, line.description) for line in entry.lines],
+    }])
+    if not entry_ids:
+        raise HTTPException(status_code=422, detail="Journal entry has no amounts")
+    await db.commit()
+    return await _load_entry(db, entry_ids[0])
+
+async def _load_entry(db: AsyncSession, entry_id: int):
+    result = await db.execute(
+        select(models.JournalEntry).options(selectinload(models.JournalEntry.lines)).filter(models.JournalEntry.entry_id == entry_id)
+    )
+    return result.scalars().first()
+
+@router.get("/journal/", response_model=List[schemas.JournalEntry])
+async def read_journal(
+    source_type: Optional[str] = None,
+    source_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.JournalEntry).options(selectinload(models.JournalEntry.lines)).order_by(models.JournalEntry.entry_id.desc())
+    if source_type:
+        query = query.filter(models.JournalEntry.source_type == source_type)
+    if source_id is not None:
+        query = query.filter(models.JournalEntry.source_id == source_id)
+    if date_from is not None:
+        query = query.filter(models.JournalEntry.entry_date >= date_from)
+    if date_to is not None:
+        query = query.filter(models.JournalEntry.entry_date <= date_to)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.get("/journal/{entry_id}", response_model=schemas.JournalEntry)
+async def read_journal_entry(entry_id: int, db: AsyncSession = Depends(get_db)):
+    entry = await _load_entry(db, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Journal entry not found")
+    return entry
+
+# --- Reports ---
+@router.get("/trial-balance", response_model=schemas.TrialBalance)
+async def read_trial_balance(period: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    return await trial_balance(db, period or date.today())
+
+@router.get("/profit-and-loss", response_model=schemas.ProfitAndLoss)
+async def read_profit_and_loss(from_period: Optional[date] = None, to_period: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    to_period = to_period or date.today()
+    from_period = from_period or to_period.replace(month=1)
+    if from_period > to_period:
+        raise HTTPException(status_code=422, detail="from_period must not be after to_period")
+    return await profit_and_loss(db, from_period, to_period)
+
+@router.get("/balance-sheet", response_model=schemas.BalanceSheet)
+async def read_balance_sheet(period: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    return await balance_sheet(db, period or date.today())
@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from database import SessionLocal, db_slot
+from routers import master_data, hr, inventory, orders, accounting, production, pricing, jobs
+from schemas import master_data as master_data_schemas
+from schemas import hr as hr_schemas
+from schemas import inventory as inventory_schemas
+from schemas import orders as order_schemas
+from schemas import accounting as accounting_schemas
+from schemas import production as production_schemas
+from schemas import pricing as pricing_schemas
+from schemas import jobs as job_schemas
+from schemas import composite as schemas
+from schemas.compat import from_orm
+from services.composite import composite_cache
+
+router = APIRouter(
+    prefix="/composite",
+    tags=["Composite"],
+)
+
+MAX_QUERIES = 10
+
+class Resource(NamedTuple):
+    read: Callable # the list endpoint, called as read(skip=, limit=, db=)
+    schema: Any
+    max_limit: int = 500
+    cache_ttl: Optional[float] = None # cache master data briefly; None = never cache
+    includes: Tuple[str, ...] = () # values accepted for `include`
+
+# Resources a composite request can read; names follow the list URLs
+RESOURCES: Dict[str, Resource] = {
+    "suppliers": Resource(master_data.read_suppliers, master_data_schemas.Supplier, 1000, composite_cache.ttl),
+    "customers": Resource(master_data.read_customers, master_data_schemas.Customer, 1000, composite_cache.ttl),
+    "items": Resource(master_data.read_items, master_data_schemas.Item, 1000, composite_cache.ttl),
+    "products": Resource(master_data.read_products, master_data_schemas.Product, 1000, composite_cache.ttl),
+    "employees": Resource(hr.read_employees, hr_schemas.Employee, 1000, composite_cache.ttl),
+    "attendance": Resource(hr.read_attendance, hr_schemas.Attendance),
+    "leaves": Resource(hr.read_leave_requests, hr_schemas.LeaveRequest),
+    "locations": Resource(inventory.read_locations, inventory_schemas.Location, 1000, composite_cache.ttl),
+    "inventory_levels": Resource(inventory.read_inventory_levels, inventory_schemas.InventoryLevel),
+    "stock_movements": Resource(inventory.read_stock_movements, inventory_schemas.StockMovement),
+    "orders": Resource(orders.read_orders, order_schemas.Order, 200, includes=("items",)),
+    "invoices": Resource(accounting.read_invoices, accounting_schemas.Invoice),
+    "payments": Resource(accounting.read_payments, accounting_schemas.Payment),
+    "bill_of_materials": Resource(production.read_bom, production_schemas.BillOfMaterials),
+    "manufacturing_orders": Resource(production.read_mos, production_schemas.ManufacturingOrder),
+    "material_consumption": Resource(production.read_consumptions, production_schemas.MaterialConsumption),
+    "price_lists": Resource(pricing.read_price_lists, pricing_schemas.PriceList, 200),
+    "jobs": Resource(jobs.read_jobs, job_schemas.Job, 200),
+}
+
+async def _run_query(query: schemas.CompositeQuery) -> schemas.CompositeResult:
+    resource = RESOURCES[query.resource]
+    limit = min(query.limit or 100, resource.max_limit)
+    key = (query.resource, query.skip, limit, query.include)
+    extra = {"include": query.include} if query.include else {}
+    if resource.cache_ttl is not None:
+        cached = composite_cache.get(key)
+        if cached is not None:
+            return schemas.CompositeResult(status=200, data=cached, cached=True)
+    try:
+        # Own session per query so they run side by side on separate connections
+        async with db_slot(), SessionLocal() as session:
+            rows = await resource.read(skip=query.skip, limit=limit, db=session, **extra)
+            data = jsonable_encoder([from_orm(resource.schema, row) for row in rows])
+    except HTTPException as e:
+        return schemas.CompositeResult(status=e.status_code, error=str(e.detail))
+    if resource.cache_ttl is not None:
+        composite_cache.set(key, data, resource.cache_ttl)
+    return schemas.CompositeResult(status=200, data=data)
+
+async def _run(queries: Dict[str, schemas.CompositeQuery]) -> Dict[str, schemas.CompositeResult]:
+    if not queries:
+        raise HTTPException(status_code=422, detail="No queries given")
+    if len(queries) > MAX_QUERIES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_QUERIES} queries per request")
+    unknown = sorted({q.resource for q in queries.values()} - set(RESOURCES))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown resources: {', '.join(unknown)}")
+    for name, query in queries.items():
+        if query.include and not set(query.include.split(",")) <= set(RESOURCES[query.resource].includes):
+            raise HTTPException(status_code=422, detail=f"{name}: cannot include {query.include}")
+    results = await asyncio.gather(*(_run_query(q) for q in queries.values()))
+    return dict(zip(queries, results))
+
+@router.get("/resources", response_model=List[str])
+async def read_resources():
+    return sorted(RESOURCES)
+
+@router.get("/", response_model=Dict[str, schemas.CompositeResult])
+async def read_composite(
+    resources: str = Query(..., description="Comma separated, e.g. orders,customers,items"),
+    limit: Optional[int] = None,
+    include: Optional[str] = Query(None, description="resource.relation pairs, e.g. orders.items"),
+):
+    names = [name.strip() for name in resources.split(",") if name.strip()]
+    includes: Dict[str, List[str]] = {}
+    for pair in (include or "").split(","):
+        name, _, relation = pair.strip().partition(".")
+        if relation:
+            includes.setdefault(name, []).append(relation)
+    return await _run({
+        name: schemas.CompositeQuery(resource=name, limit=limit, include=",".join(includes[name]) if name in includes else None)
+        for name in names
+    })
+
+@router.post("/", response_model=Dict[str, schemas.CompositeResult])
+async def query_composite(request: schemas.CompositeRequest):
+    return await _run(request.queries)
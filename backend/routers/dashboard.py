@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
 from database import get_db
 from models import master_data, orders, inventory, hr, production, accounting
+from services.inventory import low_stock_by_location
 
 router = APIRouter(
     prefix="/dashboard",
@@ -11,7 +13,7 @@ router = APIRouter(
 )
 
 @router.get("/stats")
-async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
+async def get_dashboard_stats(location_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
     # Counts
     suppliers_count = await db.scalar(select(func.count(master_data.Supplier.supplier_id)))
     customers_count = await db.scalar(select(func.count(master_data.Customer.customer_id)))
@@ -23,8 +25,21 @@ async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
     total_purchases = await db.scalar(select(func.sum(orders.Order.total_amount)).where(orders.Order.order_type == "purchase")) or 0
     pending_invoices = await db.scalar(select(func.count(accounting.Invoice.invoice_id)).where(accounting.Invoice.status == "unpaid"))
     
-    # Inventory
-    low_stock_items = await db.scalar(select(func.count(inventory.InventoryLevel.inventory_id)).where(inventory.InventoryLevel.available <= inventory.InventoryLevel.reorder_point))
+    # Inventory (one grouped scan; the total is the sum over locations)
+    by_location = await low_stock_by_location(db)
+    if location_id is not None:
+        by_location = [row for row in by_location if row["location_id"] == location_id]
+    low_stock_items = sum(row["low_stock_items"] for row in by_location)
+    # Levels at or under the reorder point the demand forecast suggests
+    level, forecast = inventory.InventoryLevel, inventory.DemandForecast
+    below_forecast = (
+        select(func.count(level.inventory_id))
+        .join(forecast, (forecast.item_id == level.item_id) & (forecast.location_id == level.location_id))
+        .where(level.available <= forecast.reorder_point)
+    )
+    if location_id is not None:
+        below_forecast = below_forecast.where(level.location_id == location_id)
+    below_forecast_items = await db.scalar(below_forecast)
     
     # Production
     active_mos = await db.scalar(select(func.count(production.ManufacturingOrder.mo_id)).where(production.ManufacturingOrder.status == "in_progress"))
@@ -43,6 +58,8 @@ async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
         },
         "inventory": {
             "low_stock_items": low_stock_items,
+            "low_stock_by_location": by_location,
+            "below_forecast_reorder_point": below_forecast_items,
         },
         "production": {
             "active_mos": active_mos,
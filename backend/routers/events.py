@@ -0,0 +1,62 @@
+import asyncio
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from services.events import TOPICS, broker
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Live Events"],
+)
+
+HEARTBEAT_INTERVAL = 15
+
+def _format(event_id: str, event: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events for inventory, order and production changes.
+
+    `topics` is a comma-separated subset of the known topics (default: all).
+    Each event carries {"topic", "op", "id", "data"}; a `resync` event means
+    the client missed changes and should refetch.
+    """
+    wanted = set(topics.split(",")) if topics else set(TOPICS)
+    unknown = wanted - set(TOPICS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown topics: {', '.join(sorted(unknown))}")
+
+    async def events():
+        async with broker.subscribe(wanted) as queue:
+            backlog = broker.replay(last_event_id, wanted)
+            if backlog is None:
+                yield _format(broker.event_id(0), "resync", "{}")
+            else:
+                for sequence, event, data in backlog:
+                    yield _format(broker.event_id(sequence), event, data)
+            yield "retry: 3000\n\n"
+
+            while True:
+                try:
+                    sequence, event, data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    if not broker.is_subscribed(queue):
+                        yield _format(broker.event_id(0), "resync", "{}")
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format(broker.event_id(sequence), event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from datetime import date, datetime
+from typing import List, Optional
 from database import get_db
 from models import hr as models
 from schemas import hr as schemas
+from services.composite import composite_cache
+from services.partitions import archived, check_open, ensure_partitions, open_from, with_archive
 
 router = APIRouter(
     prefix="/hr",
@@ -17,6 +20,7 @@ async def create_employee(employee: schemas.EmployeeCreate, db: AsyncSession = D
     db_employee = models.Employee(**employee.dict())
     db.add(db_employee)
     await db.commit()
+    composite_cache.invalidate("employees")
     await db.refresh(db_employee)
     return db_employee
 
@@ -36,6 +40,7 @@ async def update_employee(employee_id: int, employee: schemas.EmployeeCreate, db
         setattr(db_employee, key, value)
     
     await db.commit()
+    composite_cache.invalidate("employees")
     await db.refresh(db_employee)
     return db_employee
 
@@ -48,43 +53,69 @@ async def delete_employee(employee_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_employee)
     await db.commit()
+    composite_cache.invalidate("employees")
     return {"message": "Employee deleted successfully"}
 
 # --- Attendance ---
+async def _get_attendance(db: AsyncSession, attendance_id: int) -> models.Attendance:
+    result = await db.execute(select(models.Attendance).filter(models.Attendance.attendance_id == attendance_id))
+    db_attendance = result.scalars().first()
+    if db_attendance is None:
+        if await archived(db, models.Attendance, attendance_id):
+            raise HTTPException(status_code=409, detail="Attendance record belongs to a closed fiscal year")
+        raise HTTPException(status_code=404, detail="Attendance record not found")
+    check_open(db_attendance.date)
+    return db_attendance
+
 @router.post("/attendance/", response_model=schemas.Attendance)
 async def create_attendance(attendance: schemas.AttendanceCreate, db: AsyncSession = Depends(get_db)):
-    db_attendance = models.Attendance(**attendance.dict())
+    day = attendance.date or datetime.utcnow().date()
+    await ensure_partitions("attendance", [day])
+    db_attendance = models.Attendance(**{**attendance.dict(), "date": day})
     db.add(db_attendance)
     await db.commit()
     await db.refresh(db_attendance)
     return db_attendance
 
 @router.get("/attendance/", response_model=List[schemas.Attendance])
-async def read_attendance(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.Attendance).offset(skip).limit(limit))
+async def read_attendance(
+    skip: int = 0,
+    limit: int = 100,
+    employee_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # Closed fiscal years are only read when date_from reaches into them
+    attendance = with_archive(models.Attendance, date_from or open_from())
+    query = select(attendance)
+    if employee_id is not None:
+        query = query.filter(attendance.employee_id == employee_id)
+    if date_from is not None:
+        query = query.filter(attendance.date >= date_from)
+    if date_to is not None:
+        query = query.filter(attendance.date <= date_to)
+    result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
 
 @router.put("/attendance/{attendance_id}", response_model=schemas.Attendance)
 async def update_attendance(attendance_id: int, attendance: schemas.AttendanceCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.Attendance).filter(models.Attendance.attendance_id == attendance_id))
-    db_attendance = result.scalars().first()
-    if db_attendance is None:
-        raise HTTPException(status_code=404, detail="Attendance record not found")
-    
+    db_attendance = await _get_attendance(db, attendance_id)
+    day = attendance.date or db_attendance.date
+    await ensure_partitions("attendance", [day])
+
     for key, value in attendance.dict().items():
         setattr(db_attendance, key, value)
-    
+    db_attendance.date = day # the partition key; the row moves if the month changes
+
     await db.commit()
     await db.refresh(db_attendance)
     return db_attendance
 
 @router.delete("/attendance/{attendance_id}")
 async def delete_attendance(attendance_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.Attendance).filter(models.Attendance.attendance_id == attendance_id))
-    db_attendance = result.scalars().first()
-    if db_attendance is None:
-        raise HTTPException(status_code=404, detail="Attendance record not found")
-    
+    db_attendance = await _get_attendance(db, attendance_id)
+
     await db.delete(db_attendance)
     await db.commit()
     return {"message": "Attendance record deleted successfully"}
@@ -1,28 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import inventory as models
 from schemas import inventory as schemas
+from schemas.compat import from_orm
+from services.events import publish, publish_many
+from services.inventory import apply_stock_delta, movement_delta, publish_levels, reset_default_location, resolve_location, take_stock
+from services.counts import enter_counts, open_session, post_session, stream_counts
+from services.forecasting import run_forecast
+from services.lots import check_serial, resolve_lot, trace
+from services.numbering import numbering
+from services.partitions import archived, check_open, ensure_partitions, open_from, with_archive
+from services.replenishment import run_replenishment
+from services.valuation import reverse_movement, stock_as_of, stock_card, valuation_as_of, value_movements
+from services.reservations import available_to_promise
+from services.composite import composite_cache
 
 router = APIRouter(
     prefix="/inventory",
     tags=["Inventory Management"],
 )
 
+# --- Locations ---
+async def _set_default_location(db: AsyncSession, location_id: int):
+    await db.execute(
+        update(models.Location)
+        .where(models.Location.location_id != location_id, models.Location.is_default.is_(True))
+        .values(is_default=False)
+        .execution_options(synchronize_session=False)
+    )
+
+@router.post("/locations/", response_model=schemas.Location)
+async def create_location(location: schemas.LocationCreate, db: AsyncSession = Depends(get_db)):
+    db_location = models.Location(**location.dict())
+    db.add(db_location)
+    await db.flush()
+    if location.is_default:
+        await _set_default_location(db, db_location.location_id)
+    await db.commit()
+    reset_default_location()
+    composite_cache.invalidate("locations")
+    await db.refresh(db_location)
+    return db_location
+
+@router.get("/locations/", response_model=List[schemas.Location])
+async def read_locations(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.Location).order_by(models.Location.code).offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.put("/locations/{location_id}", response_model=schemas.Location)
+async def update_location(location_id: int, location: schemas.LocationCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.Location).filter(models.Location.location_id == location_id))
+    db_location = result.scalars().first()
+    if not db_location:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    for key, value in location.dict().items():
+        setattr(db_location, key, value)
+    if location.is_default:
+        await _set_default_location(db, location_id)
+
+    await db.commit()
+    reset_default_location()
+    composite_cache.invalidate("locations")
+    await db.refresh(db_location)
+    return db_location
+
 # --- Inventory Levels ---
 @router.post("/levels/", response_model=schemas.InventoryLevel)
 async def create_inventory_level(level: schemas.InventoryLevelCreate, db: AsyncSession = Depends(get_db)):
-    db_level = models.InventoryLevel(**level.dict())
+    location_id = await resolve_location(db, level.location_id)
+    existing = await db.scalar(
+        select(models.InventoryLevel.inventory_id)
+        .where(models.InventoryLevel.item_id == level.item_id, models.InventoryLevel.location_id == location_id)
+    )
+    if existing:
+        raise HTTPException(status_code=409, detail="Item already has an inventory level at this location")
+    db_level = models.InventoryLevel(**{**level.dict(), "location_id": location_id})
     db.add(db_level)
+    await db.flush()
+    await publish(db, "inventory_levels", "create", db_level.inventory_id, from_orm(schemas.InventoryLevel, db_level))
     await db.commit()
     await db.refresh(db_level)
     return db_level
 
 @router.get("/levels/", response_model=List[schemas.InventoryLevel])
-async def read_inventory_levels(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.InventoryLevel).offset(skip).limit(limit))
+async def read_inventory_levels(skip: int = 0, limit: int = 100, location_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    query = select(models.InventoryLevel)
+    if location_id is not None:
+        query = query.filter(models.InventoryLevel.location_id == location_id)
+    result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
 
 @router.put("/levels/{inventory_id}", response_model=schemas.InventoryLevel)
@@ -32,9 +105,15 @@ async def update_inventory_level(inventory_id: int, level: schemas.InventoryLeve
     if not db_level:
         raise HTTPException(status_code=404, detail="Inventory level not found")
     
-    for key, value in level.dict().items():
+    # The level stays where it is unless a location is sent; fields the
+    # levels page does not send (auto_reorder) keep their values
+    for key, value in level.dict(exclude={"location_id"}, exclude_unset=True).items():
         setattr(db_level, key, value)
+    if level.location_id is not None:
+        db_level.location_id = level.location_id
     
+    await db.flush()
+    await publish(db, "inventory_levels", "update", inventory_id, from_orm(schemas.InventoryLevel, db_level))
     await db.commit()
     await db.refresh(db_level)
     return db_level
@@ -47,39 +126,78 @@ async def delete_inventory_level(inventory_id: int, db: AsyncSession = Depends(g
         raise HTTPException(status_code=404, detail="Inventory level not found")
     
     await db.delete(db_level)
+    await publish(db, "inventory_levels", "delete", inventory_id)
     await db.commit()
     return {"message": "Inventory level deleted"}
 
 # --- Stock Movements ---
+async def _item_lot(db: AsyncSession, item_id: int, lot_id: Optional[int]) -> Optional[models.Lot]:
+    if lot_id is None:
+        return None
+    db_lot = await db.get(models.Lot, lot_id)
+    if db_lot is None:
+        raise HTTPException(status_code=404, detail="Lot not found")
+    if db_lot.item_id != item_id:
+        raise HTTPException(status_code=422, detail=f"Lot {db_lot.lot_number} is not a lot of item {item_id}")
+    return db_lot
+
 @router.post("/movements/", response_model=schemas.StockMovement)
 async def create_stock_movement(movement: schemas.StockMovementCreate, db: AsyncSession = Depends(get_db)):
+    if movement.movement_type in ("transfer_in", "transfer_out"):
+        raise HTTPException(status_code=422, detail="Use /inventory/transfers/ to move stock between locations")
+    delta = movement_delta(movement.movement_type, movement.quantity)
+    location_id = await resolve_location(db, movement.location_id)
+    when = movement.date or datetime.utcnow()
+    await ensure_partitions("stock_movements", [when])
+    if movement.lot_number:
+        # Receipts bring new lots; anything else moves a known one
+        db_lot = await resolve_lot(db, movement.lot_number, item_id=movement.item_id, create=movement.movement_type == "inbound")
+    else:
+        db_lot = await _item_lot(db, movement.item_id, movement.lot_id)
+    check_serial(db_lot, movement.quantity)
+
     # 1. Create Movement
-    db_movement = models.StockMovement(**movement.dict())
+    db_movement = models.StockMovement(**{
+        **movement.dict(exclude={"lot_number"}),
+        "location_id": location_id,
+        "date": when,
+        "lot_id": db_lot.lot_id if db_lot else None,
+    })
     db.add(db_movement)
-    
-    # 2. Update Inventory Level
-    result = await db.execute(select(models.InventoryLevel).filter(models.InventoryLevel.item_id == movement.item_id))
-    inventory_level = result.scalars().first()
-    
-    if not inventory_level:
-        # Create if not exists
-        inventory_level = models.InventoryLevel(item_id=movement.item_id, on_hand=0, available=0)
-        db.add(inventory_level)
-    
-    if movement.movement_type == "inbound":
-        inventory_level.on_hand += movement.quantity
-        inventory_level.available += movement.quantity
-    elif movement.movement_type == "outbound":
-        inventory_level.on_hand -= movement.quantity
-        inventory_level.available -= movement.quantity
-        
+
+    # 2. Update Inventory Level (created if missing)
+    levels = await apply_stock_delta(db, [(movement.item_id, location_id, delta, delta)])
+
+    # 3. Cost it and update the valuation
+    await db.flush()
+    await value_movements(db, [{c.key: getattr(db_movement, c.key) for c in models.StockMovement.__table__.c}])
+    await db.refresh(db_movement)
+
+    await publish(db, "stock_movements", "create", db_movement.movement_id, from_orm(schemas.StockMovement, db_movement))
+    await publish_levels(db, levels)
     await db.commit()
     await db.refresh(db_movement)
     return db_movement
 
 @router.get("/movements/", response_model=List[schemas.StockMovement])
-async def read_stock_movements(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.StockMovement).offset(skip).limit(limit))
+async def read_stock_movements(
+    skip: int = 0,
+    limit: int = 100,
+    location_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # Closed fiscal years are only read when date_from reaches into them
+    movement = with_archive(models.StockMovement, date_from or open_from())
+    query = select(movement)
+    if location_id is not None:
+        query = query.filter(movement.location_id == location_id)
+    if date_from is not None:
+        query = query.filter(movement.date >= date_from)
+    if date_to is not None:
+        query = query.filter(movement.date <= date_to)
+    result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
 
 @router.delete("/movements/{movement_id}")
@@ -88,23 +206,265 @@ async def delete_stock_movement(movement_id: int, db: AsyncSession = Depends(get
     result = await db.execute(select(models.StockMovement).filter(models.StockMovement.movement_id == movement_id))
     db_movement = result.scalars().first()
     if not db_movement:
+        if await archived(db, models.StockMovement, movement_id):
+            raise HTTPException(status_code=409, detail="Stock movement belongs to a closed fiscal year")
         raise HTTPException(status_code=404, detail="Stock movement not found")
+    check_open(db_movement.date)
+    if db_movement.movement_type in ("transfer_in", "transfer_out"):
+        raise HTTPException(status_code=409, detail="Transfer movements cannot be deleted one side at a time")
 
-    # 2. Find Inventory Level
-    result_level = await db.execute(select(models.InventoryLevel).filter(models.InventoryLevel.item_id == db_movement.item_id))
-    inventory_level = result_level.scalars().first()
+    # 2. Reverse the effect on Inventory Level
+    delta = -movement_delta(db_movement.movement_type, db_movement.quantity)
+    location_id = await resolve_location(db, db_movement.location_id)
+    levels = await apply_stock_delta(db, [(db_movement.item_id, location_id, delta, delta)])
+    await publish_levels(db, levels)
+    await reverse_movement(db, db_movement)
 
-    if inventory_level:
-        # 3. Reverse the effect on Inventory Level
-        if db_movement.movement_type == "inbound":
-            inventory_level.on_hand -= db_movement.quantity
-            inventory_level.available -= db_movement.quantity
-        elif db_movement.movement_type == "outbound":
-            inventory_level.on_hand += db_movement.quantity
-            inventory_level.available += db_movement.quantity
-
-    # 4. Delete the movement
+    # 3. Delete the movement
     await db.delete(db_movement)
+    await publish(db, "stock_movements", "delete", movement_id)
     await db.commit()
     
     return {"message": "Stock movement deleted and inventory corrected"}
+
+# --- Transfers ---
+@router.post("/transfers/", response_model=schemas.Transfer)
+async def create_transfer(transfer: schemas.TransferCreate, db: AsyncSession = Depends(get_db)):
+    if transfer.from_location_id == transfer.to_location_id:
+        raise HTTPException(status_code=422, detail="Source and destination locations must differ")
+    lines = defaultdict(Decimal)
+    by_lot = defaultdict(Decimal)
+    for line in transfer.lines:
+        if line.quantity <= 0:
+            raise HTTPException(status_code=422, detail="Transfer quantities must be positive")
+        check_serial(await _item_lot(db, line.item_id, line.lot_id), line.quantity)
+        lines[line.item_id] += line.quantity
+        by_lot[(line.item_id, line.lot_id)] += line.quantity
+    if not lines:
+        raise HTTPException(status_code=422, detail="Transfer has no lines")
+    found = await db.scalar(
+        select(func.count(models.Location.location_id))
+        .where(models.Location.location_id.in_([transfer.from_location_id, transfer.to_location_id]))
+    )
+    if found != 2:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    # Source first: a conditional update that only succeeds where stock is available
+    taken = await take_stock(db, transfer.from_location_id, lines)
+    short = sorted(set(lines) - {row["item_id"] for row in taken})
+    if short:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"Not enough stock at source location for items: {short}")
+    received = await apply_stock_delta(db, [(item_id, transfer.to_location_id, qty, qty) for item_id, qty in lines.items()])
+
+    # Paired movements, both sides in one multi-row insert
+    transfer_number = await numbering.next(db, "transfer")
+    when = transfer.date or datetime.utcnow()
+    await ensure_partitions("stock_movements", [when])
+    rows = []
+    for (item_id, lot_id), qty in by_lot.items():
+        for movement_type, location_id in (("transfer_out", transfer.from_location_id), ("transfer_in", transfer.to_location_id)):
+            rows.append({
+                "item_id": item_id,
+                "location_id": location_id,
+                "movement_type": movement_type,
+                "transaction_number": transfer_number,
+                "date": when,
+                "quantity": qty,
+                "employee_id": transfer.employee_id,
+                "lot_id": lot_id,
+            })
+    table = models.StockMovement.__table__
+    result = await db.execute(insert(table).returning(*table.c, sort_by_parameter_order=True), rows)
+    inserted = [dict(row) for row in result.mappings()]
+    costs = await value_movements(db, inserted)
+    movements = [schemas.StockMovement(**{**row, **costs[row["movement_id"]]}) for row in inserted]
+
+    await publish_many(db, "stock_movements", "create", [m.movement_id for m in movements])
+    await publish_levels(db, taken + received)
+    await db.commit()
+    return schemas.Transfer(
+        transfer_number=transfer_number,
+        from_location_id=transfer.from_location_id,
+        to_location_id=transfer.to_location_id,
+        movements=movements,
+    )
+
+# --- Lots ---
+@router.post("/lots/", response_model=schemas.Lot)
+async def create_lot(lot: schemas.LotCreate, db: AsyncSession = Depends(get_db)):
+    if (lot.item_id is None) == (lot.product_id is None):
+        raise HTTPException(status_code=422, detail="A lot belongs to either an item or a product")
+    if lot.tracking not in ("lot", "serial"):
+        raise HTTPException(status_code=422, detail="tracking must be lot or serial")
+    owner = models.Lot.item_id == lot.item_id if lot.item_id is not None else models.Lot.product_id == lot.product_id
+    taken = await db.scalar(select(models.Lot.lot_id).where(owner, models.Lot.lot_number == lot.lot_number))
+    if taken is not None:
+        raise HTTPException(status_code=409, detail=f"Lot {lot.lot_number} already exists")
+    db_lot = models.Lot(**lot.dict())
+    db.add(db_lot)
+    await db.commit()
+    await db.refresh(db_lot)
+    return db_lot
+
+@router.get("/lots/", response_model=List[schemas.Lot])
+async def read_lots(
+    item_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    lot_number: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.Lot).order_by(models.Lot.lot_id)
+    if item_id is not None:
+        query = query.filter(models.Lot.item_id == item_id)
+    if product_id is not None:
+        query = query.filter(models.Lot.product_id == product_id)
+    if lot_number is not None:
+        query = query.filter(models.Lot.lot_number == lot_number)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.get("/lots/{lot_id}/trace", response_model=schemas.TraceResult)
+async def trace_lot(lot_id: int, direction: str = "forward", since: Optional[datetime] = None, db: AsyncSession = Depends(get_db)):
+    """Forward: the lots made from this one and the customers they were
+    shipped to. Backward: the lots that went into it and their suppliers."""
+    if direction not in ("forward", "backward"):
+        raise HTTPException(status_code=422, detail="direction must be forward or backward")
+    if await db.get(models.Lot, lot_id) is None:
+        raise HTTPException(status_code=404, detail="Lot not found")
+    return await trace(db, lot_id, forward=direction == "forward", since=since)
+
+# --- Cycle Counts ---
+@router.post("/counts/", response_model=schemas.CountSession)
+async def create_count_session(request: schemas.CountSessionCreate, db: AsyncSession = Depends(get_db)):
+    session = await open_session(db, request.location_id, item_ids=request.item_ids, note=request.note)
+    await db.commit()
+    await db.refresh(session)
+    return session
+
+@router.get("/counts/", response_model=List[schemas.CountSession])
+async def read_count_sessions(location_id: Optional[int] = None, status: Optional[str] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    query = select(models.CountSession).order_by(models.CountSession.session_id.desc())
+    if location_id is not None:
+        query = query.filter(models.CountSession.location_id == location_id)
+    if status is not None:
+        query = query.filter(models.CountSession.status == status)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.get("/counts/{session_id}/lines", response_model=List[schemas.CountLine])
+async def read_count_lines(session_id: int, variances_only: bool = False, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    line = models.CountLine
+    query = select(line).where(line.session_id == session_id).order_by(line.item_id)
+    if variances_only:
+        query = query.where(line.counted.is_not(None), line.counted != line.expected)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.post("/counts/{session_id}/lines", response_model=schemas.CountEntryResult)
+async def enter_count_lines(session_id: int, entry: schemas.CountEntry, db: AsyncSession = Depends(get_db)):
+    lines = await enter_counts(db, session_id, [(l.item_id, l.counted) for l in entry.lines], add=entry.add)
+    await db.commit()
+    return {"session_id": session_id, "lines": lines}
+
+@router.post("/counts/{session_id}/upload", response_model=schemas.CountEntryResult)
+async def upload_count_lines(session_id: int, request: Request, add: bool = False, db: AsyncSession = Depends(get_db)):
+    """CSV body (text/csv) with a header naming item_code or item_id, and
+    counted; read as it streams in."""
+    lines = await stream_counts(db, session_id, request.stream(), add=add)
+    await db.commit()
+    return {"session_id": session_id, "lines": lines}
+
+@router.post("/counts/{session_id}/post", response_model=schemas.CountPostResult)
+async def post_count_session(session_id: int, zero_uncounted: bool = False, db: AsyncSession = Depends(get_db)):
+    result = await post_session(db, session_id, zero_uncounted=zero_uncounted)
+    await db.commit()
+    return result
+
+@router.post("/counts/{session_id}/cancel", response_model=schemas.CountSession)
+async def cancel_count_session(session_id: int, db: AsyncSession = Depends(get_db)):
+    session = models.CountSession
+    result = await db.execute(
+        update(session)
+        .where(session.session_id == session_id, session.status == "open")
+        .values(status="cancelled")
+        .returning(session.session_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar() is None:
+        if await db.get(session, session_id) is None:
+            raise HTTPException(status_code=404, detail="Count session not found")
+        raise HTTPException(status_code=409, detail="Count session is not open")
+    await db.commit()
+    return await db.get(session, session_id)
+
+# --- Reservations ---
+@router.get("/reservations/", response_model=List[schemas.StockReservation])
+async def read_reservations(order_id: Optional[int] = None, status: Optional[str] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    query = select(models.StockReservation).order_by(models.StockReservation.reservation_id.desc())
+    if order_id is not None:
+        query = query.filter(models.StockReservation.order_id == order_id)
+    if status:
+        query = query.filter(models.StockReservation.status == status)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+# --- Available to Promise ---
+@router.post("/atp", response_model=schemas.ATPResult)
+async def check_available_to_promise(request: schemas.ATPRequest, db: AsyncSession = Depends(get_db)):
+    lines = defaultdict(Decimal)
+    for line in request.lines:
+        lines[line.item_id] += line.quantity
+    rows = await available_to_promise(db, lines, location_id=request.location_id, by_date=request.ship_date)
+    return {"can_promise": all(row["can_promise"] for row in rows), "lines": rows}
+
+# --- Replenishment ---
+@router.post("/replenishment/", response_model=schemas.ReplenishmentResult)
+async def replenish(request: schemas.ReplenishmentRequest, db: AsyncSession = Depends(get_db)):
+    if request.location_id is not None and await db.get(models.Location, request.location_id) is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+    return await run_replenishment(db, location_id=request.location_id, dry_run=request.dry_run)
+
+# --- Demand Forecasts ---
+@router.get("/forecasts/", response_model=List[schemas.DemandForecast])
+async def read_forecasts(item_id: Optional[int] = None, location_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    forecast = models.DemandForecast
+    query = select(forecast).order_by(forecast.item_id, forecast.location_id)
+    if item_id is not None:
+        query = query.filter(forecast.item_id == item_id)
+    if location_id is not None:
+        query = query.filter(forecast.location_id == location_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.post("/forecasts/run", response_model=schemas.ForecastResult)
+async def forecast_demand(request: schemas.ForecastRequest, db: AsyncSession = Depends(get_db)):
+    result = await run_forecast(db, bucket=request.bucket)
+    await db.commit()
+    return result
+
+# --- Valuation ---
+@router.get("/valuation/", response_model=schemas.ValuationReport)
+async def read_valuation(as_of: Optional[datetime] = None, location_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await valuation_as_of(db, as_of=as_of, location_id=location_id)
+
+# --- Stock History ---
+@router.get("/stock-as-of/", response_model=schemas.StockAsOf)
+async def read_stock_as_of(as_of: datetime, location_id: Optional[int] = None, item_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await stock_as_of(db, as_of, location_id=location_id, item_id=item_id)
+
+@router.get("/stock-card/{item_id}", response_model=schemas.StockCard)
+async def read_stock_card(
+    item_id: int,
+    location_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from must not be after date_to")
+    return await stock_card(db, item_id, location_id=location_id, date_from=date_from, date_to=date_to, skip=skip, limit=limit)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import List, Optional
+from database import get_db, SessionLocal
+from models import jobs as models
+from schemas import jobs as schemas
+from schemas.compat import from_orm
+from services.jobs import HANDLERS, TERMINAL_STATUSES, enqueue, get_job, runner
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Background Jobs"],
+)
+
+@router.get("/types", response_model=List[str])
+async def read_job_types():
+    return sorted(HANDLERS)
+
+@router.post("/", response_model=schemas.Job, status_code=202)
+async def create_job(job: schemas.JobCreate, db: AsyncSession = Depends(get_db)):
+    if job.job_type not in HANDLERS:
+        raise HTTPException(status_code=422, detail=f"Unknown job type: {job.job_type}")
+    return await enqueue(db, job.job_type, job.params, max_attempts=job.max_attempts)
+
+@router.get("/", response_model=List[schemas.Job])
+async def read_jobs(status: Optional[str] = None, job_type: Optional[str] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    query = select(models.Job).order_by(models.Job.job_id.desc())
+    if status:
+        query = query.filter(models.Job.status == status)
+    if job_type:
+        query = query.filter(models.Job.job_type == job_type)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.get("/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/result", response_model=schemas.JobResult)
+async def read_job_result(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    return job
+
+@router.post("/{job_id}/cancel", response_model=schemas.Job)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+
+    # Queued jobs are cancelled outright; running ones are flagged and stop
+    # at their next progress report (or right away if they run here)
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.job_id == job_id, models.Job.status == "queued")
+        .values(status="cancelled", cancel_requested=True, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.job_id == job_id, models.Job.status == "running")
+        .values(cancel_requested=True)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    runner.cancel_local(job_id)
+    await db.refresh(job)
+    return job
+
+@router.post("/{job_id}/retry", response_model=schemas.Job)
+async def retry_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled jobs can be retried, job is {job.status}")
+
+    job.status = "queued"
+    job.cancel_requested = False
+    job.progress = 0.0
+    job.message = None
+    job.error = None
+    job.result = None
+    job.finished_at = None
+    job.run_after = datetime.utcnow()
+    job.max_attempts = job.attempts + 1
+    await db.commit()
+    await db.refresh(job)
+    runner.wake()
+    return job
+
+@router.get("/{job_id}/stream")
+async def stream_job(job_id: int):
+    """Server-sent events with the job's progress until it finishes."""
+    # No request session: it would hold a pooled connection for as long as
+    # the stream stays open
+    async with SessionLocal() as db:
+        if not await get_job(db, job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            async with SessionLocal() as session:
+                job = await get_job(session, job_id)
+            payload = json.dumps(jsonable_encoder(from_orm(schemas.Job, job)))
+            if payload != last:
+                last = payload
+                yield f"event: progress\ndata: {payload}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job.status in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
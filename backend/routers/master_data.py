@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import master_data as models
 from schemas import master_data as schemas
+from services.composite import composite_cache
+from services.costing import invalidate as invalidate_costs
+from services.supplier_scoring import SUPPLIER_RATING_WINDOW_DAYS, rank_suppliers, score_suppliers
 
 from sqlalchemy import text
 
@@ -19,6 +22,7 @@ async def create_supplier(supplier: schemas.SupplierCreate, db: AsyncSession = D
     db_supplier = models.Supplier(**supplier.dict())
     db.add(db_supplier)
     await db.commit()
+    composite_cache.invalidate("suppliers")
     await db.refresh(db_supplier)
     return db_supplier
 
@@ -27,6 +31,24 @@ async def read_suppliers(skip: int = 0, limit: int = 100, db: AsyncSession = Dep
     result = await db.execute(select(models.Supplier).offset(skip).limit(limit))
     return result.scalars().all()
 
+@router.get("/suppliers/ranking", response_model=List[schemas.SupplierScore])
+async def rank_suppliers_by_score(
+    category: Optional[str] = None,
+    window_days: int = SUPPLIER_RATING_WINDOW_DAYS,
+    min_deliveries: int = 1,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    """Best suppliers first, over all deliveries or those of one item category."""
+    return await rank_suppliers(db, category=category, window_days=window_days, min_deliveries=min_deliveries, limit=limit)
+
+@router.post("/suppliers/scoring", response_model=schemas.SupplierScoringResult)
+async def run_supplier_scoring(db: AsyncSession = Depends(get_db)):
+    result = await score_suppliers(db)
+    await db.commit()
+    composite_cache.invalidate("suppliers")
+    return result
+
 @router.get("/suppliers/{supplier_id}", response_model=schemas.Supplier)
 async def read_supplier(supplier_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Supplier).filter(models.Supplier.supplier_id == supplier_id))
@@ -44,6 +66,7 @@ async def update_supplier(supplier_id: int, supplier: schemas.SupplierCreate, db
         setattr(db_supplier, key, value)
     
     await db.commit()
+    composite_cache.invalidate("suppliers")
     await db.refresh(db_supplier)
     return db_supplier
 
@@ -56,6 +79,7 @@ async def delete_supplier(supplier_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_supplier)
     await db.commit()
+    composite_cache.invalidate("suppliers")
     return {"message": "Supplier deleted successfully"}
 
 # --- Customers ---
@@ -64,6 +88,7 @@ async def create_customer(customer: schemas.CustomerCreate, db: AsyncSession = D
     db_customer = models.Customer(**customer.dict())
     db.add(db_customer)
     await db.commit()
+    composite_cache.invalidate("customers")
     await db.refresh(db_customer)
     return db_customer
 
@@ -83,6 +108,7 @@ async def update_customer(customer_id: int, customer: schemas.CustomerCreate, db
         setattr(db_customer, key, value)
     
     await db.commit()
+    composite_cache.invalidate("customers")
     await db.refresh(db_customer)
     return db_customer
 
@@ -95,6 +121,7 @@ async def delete_customer(customer_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_customer)
     await db.commit()
+    composite_cache.invalidate("customers")
     return {"message": "Customer deleted successfully"}
 
 # --- Items ---
@@ -103,6 +130,7 @@ async def create_item(item: schemas.ItemCreate, db: AsyncSession = Depends(get_d
     db_item = models.Item(**item.dict())
     db.add(db_item)
     await db.commit()
+    composite_cache.invalidate("items")
     await db.refresh(db_item)
     return db_item
 
@@ -118,10 +146,16 @@ async def update_item(item_id: int, item: schemas.ItemCreate, db: AsyncSession =
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    for key, value in item.dict().items():
+    cost_changed = "standard_cost" in item.__fields_set__ and item.standard_cost != db_item.standard_cost
+    # Fields the client leaves out (the items page sends no preferred
+    # supplier or standard cost) keep their values
+    for key, value in item.dict(exclude_unset=True).items():
         setattr(db_item, key, value)
+    if cost_changed:
+        await invalidate_costs(db, item_ids=[item_id])
     
     await db.commit()
+    composite_cache.invalidate("items")
     await db.refresh(db_item)
     return db_item
 
@@ -134,6 +168,7 @@ async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_item)
     await db.commit()
+    composite_cache.invalidate("items")
     return {"message": "Item deleted successfully"}
 
 # --- Products ---
@@ -142,6 +177,7 @@ async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depe
     db_product = models.Product(**product.dict())
     db.add(db_product)
     await db.commit()
+    composite_cache.invalidate("products")
     await db.refresh(db_product)
     return db_product
 
@@ -161,6 +197,7 @@ async def update_product(product_id: int, product: schemas.ProductCreate, db: As
         setattr(db_product, key, value)
     
     await db.commit()
+    composite_cache.invalidate("products")
     await db.refresh(db_product)
     return db_product
 
@@ -173,4 +210,5 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_product)
     await db.commit()
+    composite_cache.invalidate("products")
     return {"message": "Product deleted successfully"}
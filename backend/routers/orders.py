@@ -1,31 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy.orm import noload, selectinload
+from typing import List, Optional
 from database import get_db
 from models import orders as models
 from models import inventory as inv_models
 from schemas import orders as schemas
+from schemas.compat import from_orm
+from services.pricing import price_orders
+from services.numbering import numbering
+from services.composite import composite_cache
+from services.events import publish, publish_many
+from services.inventory import publish_levels
+from services.lots import resolve_lot
+from services.reservations import RESERVING_STATUSES, consume_orders, release_orders, reserve_orders
+from services.supplier_scoring import score_suppliers
 
 router = APIRouter(
     prefix="/orders",
     tags=["Order Management"],
 )
 
-# --- Orders ---
-@router.post("/", response_model=schemas.Order)
-async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(get_db)):
-    # Calculate totals
-    total_amount = 0
-    db_items = []
-    
-    for item in order.items:
-        line_total = (item.quantity * item.unit_price) - item.discount
-        total_amount += line_total
-        db_item = models.OrderItem(**item.dict(), line_total=line_total)
-        db_items.append(db_item)
-    
+def _order_items(order: schemas.OrderCreate, priced):
+    return [
+        models.OrderItem(
+            item_id=item.item_id,
+            quantity=item.quantity,
+            unit_price=line.unit_price,
+            discount=line.discount,
+            tax_rate=line.tax_rate,
+            tax_amount=line.tax_amount,
+            line_total=line.line_total,
+            lot_id=item.lot_id,
+        )
+        for item, line in zip(order.items, priced.lines)
+    ]
+
+def _apply_totals(db_order: models.Order, priced):
+    db_order.subtotal = priced.subtotal
+    db_order.discount_total = priced.discount_total
+    db_order.tax_total = priced.tax_total
+    db_order.total_amount = priced.total_amount
+
+async def _assign_numbers(db: AsyncSession, orders: List[schemas.OrderCreate]):
+    for order_type in ("sales", "purchase"):
+        unnumbered = [o for o in orders if not o.order_number and o.order_type == order_type]
+        numbers = await numbering.allocate(db, f"{order_type}_order", len(unnumbered))
+        for order, number in zip(unnumbered, numbers):
+            order.order_number = number
+    if any(not o.order_number for o in orders):
+        raise HTTPException(status_code=422, detail="order_number is required for this order type")
+
+def _new_order(order: schemas.OrderCreate, priced):
     db_order = models.Order(
         order_number=order.order_number,
         order_type=order.order_type,
@@ -33,37 +61,90 @@ async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(ge
         supplier_id=order.supplier_id,
         customer_id=order.customer_id,
         status=order.status,
-        total_amount=total_amount
+        location_id=order.location_id,
+        expected_date=order.expected_date,
+        items=_order_items(order, priced),
     )
-    
-    db.add(db_order)
-    await db.commit()
-    await db.refresh(db_order)
-    
-    for db_item in db_items:
-        db_item.order_id = db_order.order_id
-        db.add(db_item)
-    
-    await db.commit()
-    
-    # Reload order with items
+    _apply_totals(db_order, priced)
+    return db_order
+
+async def _hold_stock(db: AsyncSession, orders: List[schemas.OrderCreate], order_ids: List[int]):
+    # Open sales orders reserve their lines; delivered ones reserve and ship at once
+    sales = [(o, order_id) for o, order_id in zip(orders, order_ids) if o.order_type == "sales"]
+    levels = await reserve_orders(db, [
+        (order_id, o.location_id, [(item.item_id, item.quantity, item.lot_id) for item in o.items])
+        for o, order_id in sales
+        if o.status in RESERVING_STATUSES or o.status == "delivered"
+    ])
+    shipped, movement_ids = await consume_orders(db, [order_id for o, order_id in sales if o.status == "delivered"])
+    await publish_levels(db, levels + shipped)
+    await publish_many(db, "stock_movements", "create", movement_ids)
+
+async def _load_orders(db: AsyncSession, order_ids: List[int]):
     result = await db.execute(
         select(models.Order)
         .options(selectinload(models.Order.items))
-        .filter(models.Order.order_id == db_order.order_id)
+        .filter(models.Order.order_id.in_(order_ids))
+        .order_by(models.Order.order_id)
     )
-    return result.scalars().first()
+    return result.scalars().all()
+
+# --- Orders ---
+@router.post("/", response_model=schemas.Order)
+async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(get_db)):
+    # Calculate totals
+    (priced,) = await price_orders(db, [order])
+    await _assign_numbers(db, [order])
+    db_order = _new_order(order, priced)
+
+    db.add(db_order)
+    await db.flush()
+    order_id = db_order.order_id
+    await _hold_stock(db, [order], [order_id])
+    await publish(db, "orders", "create", order_id, from_orm(schemas.Order, db_order))
+    await db.commit()
+
+    # Reload order with items
+    (db_order,) = await _load_orders(db, [order_id])
+    return db_order
+
+@router.post("/bulk", response_model=List[schemas.Order])
+async def create_orders_bulk(orders: List[schemas.OrderCreate], db: AsyncSession = Depends(get_db)):
+    # Price the whole import in one pass and save it in a single transaction
+    priced = await price_orders(db, orders)
+    await _assign_numbers(db, orders)
+    db_orders = [_new_order(order, p) for order, p in zip(orders, priced)]
+
+    db.add_all(db_orders)
+    await db.flush()
+    order_ids = [o.order_id for o in db_orders]
+    await _hold_stock(db, orders, order_ids)
+    await publish_many(db, "orders", "create", order_ids)
+    await db.commit()
+    return await _load_orders(db, order_ids)
 
 @router.get("/", response_model=List[schemas.Order])
-async def read_orders(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_orders(skip: int = 0, limit: int = 100, include: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    # Lines are only embedded on request (?include=items); without it items is []
+    if include and "items" in include.split(","):
+        lines = selectinload(models.Order.items)
+    else:
+        lines = noload(models.Order.items)
     result = await db.execute(
         select(models.Order)
-        .options(selectinload(models.Order.items))
+        .options(lines)
         .offset(skip)
         .limit(limit)
     )
     return result.scalars().all()
 
+@router.get("/{order_id}", response_model=schemas.Order)
+async def read_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    orders = await _load_orders(db, [order_id])
+    if not orders:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return orders[0]
+
 @router.put("/{order_id}", response_model=schemas.Order)
 async def update_order(order_id: int, order: schemas.OrderCreate, db: AsyncSession = Depends(get_db)):
     # 1. Fetch existing order
@@ -72,13 +153,17 @@ async def update_order(order_id: int, order: schemas.OrderCreate, db: AsyncSessi
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    previous_status = db_order.status
+
     # 2. Update basic fields
-    db_order.order_number = order.order_number
+    db_order.order_number = order.order_number or db_order.order_number
     db_order.order_type = order.order_type
     db_order.order_date = order.order_date
     db_order.supplier_id = order.supplier_id
     db_order.customer_id = order.customer_id
     db_order.status = order.status
+    db_order.location_id = order.location_id
+    db_order.expected_date = order.expected_date
 
     # 3. Handle Items (Full Replacement Strategy)
     # Remove existing items
@@ -86,17 +171,20 @@ async def update_order(order_id: int, order: schemas.OrderCreate, db: AsyncSessi
         await db.delete(item)
     
     # Calculate new totals and add items
-    total_amount = 0
-    
-    for item in order.items:
-        line_total = (item.quantity * item.unit_price) - item.discount
-        total_amount += line_total
-        db_item = models.OrderItem(**item.dict(), line_total=line_total)
+    (priced,) = await price_orders(db, [order])
+    for db_item in _order_items(order, priced):
         db_item.order_id = db_order.order_id # Link to existing order
         db.add(db_item)
-    
-    db_order.total_amount = total_amount
-    
+
+    _apply_totals(db_order, priced)
+
+    # 4. Re-reserve stock for the new lines and status. Delivered orders have
+    # already shipped, so their stock is left alone whatever changes.
+    if previous_status != "delivered":
+        await publish_levels(db, await release_orders(db, [order_id]))
+        await _hold_stock(db, [order], [order_id])
+
+    await publish(db, "orders", "update", order_id)
     await db.commit()
     await db.refresh(db_order) # This might not verify the re-added items immediately without re-query, but let's try
     
@@ -118,28 +206,44 @@ async def delete_order(order_id: int, db: AsyncSession = Depends(get_db)):
     # Items should cascade delete if configured in DB, but explicit delete is safer here for SQLAlchemy async
     for item in db_order.items:
         await db.delete(item)
+
+    await publish_levels(db, await release_orders(db, [order_id]))
+    await db.execute(delete(inv_models.StockReservation).where(inv_models.StockReservation.order_id == order_id))
         
     await db.delete(db_order)
+    await publish(db, "orders", "delete", order_id)
     await db.commit()
     return {"message": "Order deleted successfully"}
 
 # --- Receiving Notes ---
 @router.post("/receive/", response_model=schemas.ReceivingNote)
 async def create_receiving_note(note: schemas.ReceivingNoteCreate, db: AsyncSession = Depends(get_db)):
-    db_note = models.ReceivingNote(**note.dict())
+    result = await db.execute(select(models.Order).filter(models.Order.order_id == note.purchase_order_id))
+    order = result.scalars().first()
+    lot_id = note.lot_id
+    if note.lot_number:
+        if note.item_id is None:
+            raise HTTPException(status_code=422, detail="item_id is required with lot_number")
+        db_lot = await resolve_lot(db, note.lot_number, item_id=note.item_id, create=True, supplier_id=order.supplier_id if order else None)
+        lot_id = db_lot.lot_id
+    db_note = models.ReceivingNote(**{**note.dict(exclude={"lot_number"}), "lot_id": lot_id})
     db.add(db_note)
     
     # Update Order Status
-    result = await db.execute(select(models.Order).filter(models.Order.order_id == note.purchase_order_id))
-    order = result.scalars().first()
     if order:
         order.status = "received"
+        await publish(db, "orders", "update", order.order_id, {"status": "received"})
         
         # Auto-create inbound stock movement
         # Note: This is simplified. Ideally we'd loop through order items.
         # For now, assuming receiving note corresponds to order items logic would be more complex
         # Here we just update status. Full implementation would require mapping received qty to items.
+
+        if order.order_type == "purchase" and order.supplier_id is not None:
+            await db.flush()
+            await score_suppliers(db, [order.supplier_id])
     
     await db.commit()
+    composite_cache.invalidate("suppliers")
     await db.refresh(db_note)
     return db_note
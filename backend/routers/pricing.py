@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from typing import List
+from database import get_db
+from models import pricing as models
+from schemas import pricing as schemas
+from services.pricing import price_cache, price_orders
+
+router = APIRouter(
+    prefix="/pricing",
+    tags=["Pricing"],
+)
+
+async def _load_price_list(db: AsyncSession, price_list_id: int):
+    result = await db.execute(
+        select(models.PriceList)
+        .options(selectinload(models.PriceList.items))
+        .filter(models.PriceList.price_list_id == price_list_id)
+    )
+    return result.scalars().first()
+
+# --- Price Lists ---
+@router.post("/price-lists/", response_model=schemas.PriceList)
+async def create_price_list(price_list: schemas.PriceListCreate, db: AsyncSession = Depends(get_db)):
+    db_price_list = models.PriceList(
+        name=price_list.name,
+        customer_id=price_list.customer_id,
+        is_active=price_list.is_active,
+        items=[models.PriceListItem(**item.dict()) for item in price_list.items],
+    )
+    db.add(db_price_list)
+    await db.flush()
+    price_list_id = db_price_list.price_list_id
+    await db.commit()
+    price_cache.invalidate(price_list.customer_id)
+    return await _load_price_list(db, price_list_id)
+
+@router.get("/price-lists/", response_model=List[schemas.PriceList])
+async def read_price_lists(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.PriceList)
+        .options(selectinload(models.PriceList.items))
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+@router.put("/price-lists/{price_list_id}", response_model=schemas.PriceList)
+async def update_price_list(price_list_id: int, price_list: schemas.PriceListCreate, db: AsyncSession = Depends(get_db)):
+    db_price_list = await _load_price_list(db, price_list_id)
+    if not db_price_list:
+        raise HTTPException(status_code=404, detail="Price list not found")
+
+    previous_customer_id = db_price_list.customer_id
+    db_price_list.name = price_list.name
+    db_price_list.customer_id = price_list.customer_id
+    db_price_list.is_active = price_list.is_active
+
+    # Full replacement of lines, as for order items
+    for item in db_price_list.items:
+        await db.delete(item)
+    await db.flush()
+    for item in price_list.items:
+        db.add(models.PriceListItem(**item.dict(), price_list_id=price_list_id))
+
+    await db.commit()
+    price_cache.invalidate(previous_customer_id)
+    price_cache.invalidate(price_list.customer_id)
+    return await _load_price_list(db, price_list_id)
+
+@router.delete("/price-lists/{price_list_id}")
+async def delete_price_list(price_list_id: int, db: AsyncSession = Depends(get_db)):
+    db_price_list = await _load_price_list(db, price_list_id)
+    if not db_price_list:
+        raise HTTPException(status_code=404, detail="Price list not found")
+
+    customer_id = db_price_list.customer_id
+    for item in db_price_list.items:
+        await db.delete(item)
+    await db.delete(db_price_list)
+    await db.commit()
+    price_cache.invalidate(customer_id)
+    return {"message": "Price list deleted successfully"}
+
+# --- Quotes ---
+@router.post("/quote", response_model=List[schemas.QuoteResult])
+async def quote(requests: List[schemas.QuoteRequest], db: AsyncSession = Depends(get_db)):
+    """Price a batch of draft orders without saving anything."""
+    priced = await price_orders(db, requests)
+    return [
+        schemas.QuoteResult(
+            lines=[
+                schemas.QuoteLine(
+                    item_id=item.item_id,
+                    quantity=item.quantity,
+                    unit_price=line.unit_price,
+                    discount=line.discount,
+                    tax_rate=line.tax_rate,
+                    tax_amount=line.tax_amount,
+                    line_total=line.line_total,
+                )
+                for item, line in zip(request.items, order.lines)
+            ],
+            subtotal=order.subtotal,
+            discount_total=order.discount_total,
+            tax_total=order.tax_total,
+            total_amount=order.total_amount,
+        )
+        for request, order in zip(requests, priced)
+    ]
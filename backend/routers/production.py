@@ -1,21 +1,41 @@
+from datetime import date
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import production as models
+from models.inventory import Lot
+from models.master_data import Product
 from schemas import production as schemas
+from schemas.compat import from_orm
+from services.numbering import numbering
+from services.costing import check_component, invalidate, product_costs, rollup_all
+from services.events import publish
+from services.production import complete_orders
+from services.scheduling import reschedule, schedule_all, snapshot
 
 router = APIRouter(
     prefix="/production",
     tags=["Production Management"],
 )
 
+MAX_COMPLETIONS = 1000 # orders per bulk completion
+
 # --- Bill of Materials ---
+async def _check_bom(db: AsyncSession, bom: schemas.BillOfMaterialsCreate):
+    if (bom.item_id is None) == (bom.component_product_id is None):
+        raise HTTPException(status_code=422, detail="A BOM line needs either item_id or component_product_id")
+    await check_component(db, bom.product_id, bom.component_product_id)
+
 @router.post("/bom/", response_model=schemas.BillOfMaterials)
 async def create_bom(bom: schemas.BillOfMaterialsCreate, db: AsyncSession = Depends(get_db)):
+    await _check_bom(db, bom)
     db_bom = models.BillOfMaterials(**bom.dict())
     db.add(db_bom)
+    await db.flush()
+    await invalidate(db, product_ids=[bom.product_id])
+    await publish(db, "bill_of_materials", "create", db_bom.bom_id, from_orm(schemas.BillOfMaterials, db_bom))
     await db.commit()
     await db.refresh(db_bom)
     return db_bom
@@ -25,11 +45,63 @@ async def read_bom(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(g
     result = await db.execute(select(models.BillOfMaterials).offset(skip).limit(limit))
     return result.scalars().all()
 
+@router.put("/bom/{bom_id}", response_model=schemas.BillOfMaterials)
+async def update_bom(bom_id: int, bom: schemas.BillOfMaterialsCreate, db: AsyncSession = Depends(get_db)):
+    db_bom = await db.get(models.BillOfMaterials, bom_id)
+    if not db_bom:
+        raise HTTPException(status_code=404, detail="BOM line not found")
+    await _check_bom(db, bom)
+    previous_product_id = db_bom.product_id
+    for field, value in bom.dict().items():
+        setattr(db_bom, field, value)
+    await db.flush()
+    await invalidate(db, product_ids=[previous_product_id, bom.product_id])
+    await publish(db, "bill_of_materials", "update", bom_id, from_orm(schemas.BillOfMaterials, db_bom))
+    await db.commit()
+    await db.refresh(db_bom)
+    return db_bom
+
+@router.delete("/bom/{bom_id}")
+async def delete_bom(bom_id: int, db: AsyncSession = Depends(get_db)):
+    db_bom = await db.get(models.BillOfMaterials, bom_id)
+    if not db_bom:
+        raise HTTPException(status_code=404, detail="BOM line not found")
+    product_id = db_bom.product_id
+    await db.delete(db_bom)
+    await db.flush()
+    await invalidate(db, product_ids=[product_id])
+    await publish(db, "bill_of_materials", "delete", bom_id)
+    await db.commit()
+    return {"message": "BOM line deleted successfully"}
+
+# --- Standard Costs ---
+@router.get("/costs/{product_id}", response_model=schemas.ProductCost)
+async def read_product_cost(product_id: int, db: AsyncSession = Depends(get_db)):
+    if await db.get(Product, product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    costs = await product_costs(db, [product_id])
+    await db.commit() # keep what was recomputed
+    return {"product_id": product_id, "material_cost": costs[product_id]}
+
+@router.post("/costs/rollup", response_model=schemas.CostRollupResult)
+async def run_cost_rollup(db: AsyncSession = Depends(get_db)):
+    result = await rollup_all(db)
+    await db.commit()
+    return result
+
 # --- Manufacturing Orders ---
 @router.post("/orders/", response_model=schemas.ManufacturingOrder)
 async def create_mo(mo: schemas.ManufacturingOrderCreate, db: AsyncSession = Depends(get_db)):
+    if mo.status == "completed":
+        raise HTTPException(status_code=422, detail="Create the order open and complete it with /production/orders/{mo_id}/complete")
+    if not mo.production_order_number:
+        mo.production_order_number = await numbering.next(db, "manufacturing_order")
     db_mo = models.ManufacturingOrder(**mo.dict())
     db.add(db_mo)
+    await db.flush()
+    await reschedule(db, db_mo.mo_id)
+    await db.refresh(db_mo)
+    await publish(db, "manufacturing_orders", "create", db_mo.mo_id, from_orm(schemas.ManufacturingOrder, db_mo))
     await db.commit()
     await db.refresh(db_mo)
     return db_mo
@@ -46,12 +118,26 @@ async def update_mo(mo_id: int, mo: schemas.ManufacturingOrderCreate, db: AsyncS
     if not db_mo:
         raise HTTPException(status_code=404, detail="Manufacturing order not found")
     
-    db_mo.production_order_number = mo.production_order_number
+    if mo.status == "completed" and db_mo.status != "completed":
+        raise HTTPException(status_code=422, detail=f"Use /production/orders/{mo_id}/complete to complete an order")
+    if db_mo.status == "completed" and mo.status != "completed":
+        raise HTTPException(status_code=409, detail="Completed orders cannot be reopened")
+    previous = snapshot(db_mo)
+    planned = (db_mo.product_id, db_mo.quantity_required, db_mo.status, db_mo.priority, db_mo.due_date)
+    db_mo.production_order_number = mo.production_order_number or db_mo.production_order_number
     db_mo.product_id = mo.product_id
     db_mo.quantity_required = mo.quantity_required
     db_mo.start_date = mo.start_date
+    db_mo.end_date = mo.end_date
     db_mo.status = mo.status
-    
+    db_mo.priority = mo.priority
+    db_mo.due_date = mo.due_date
+
+    if (db_mo.product_id, db_mo.quantity_required, db_mo.status, db_mo.priority, db_mo.due_date) != planned:
+        await db.flush()
+        await reschedule(db, mo_id, previous)
+        await db.refresh(db_mo)
+    await publish(db, "manufacturing_orders", "update", mo_id, from_orm(schemas.ManufacturingOrder, db_mo))
     await db.commit()
     await db.refresh(db_mo)
     return db_mo
@@ -63,20 +149,209 @@ async def delete_mo(mo_id: int, db: AsyncSession = Depends(get_db)):
     if not db_mo:
         raise HTTPException(status_code=404, detail="Manufacturing order not found")
     
+    previous = snapshot(db_mo)
     await db.delete(db_mo)
+    await db.flush()
+    await reschedule(db, mo_id, previous)
+    await publish(db, "manufacturing_orders", "delete", mo_id)
     await db.commit()
     return {"message": "Manufacturing order deleted successfully"}
 
+# --- Completion ---
+@router.post("/orders/complete", response_model=schemas.CompletionResult)
+async def complete_mos(request: schemas.CompletionRequest, db: AsyncSession = Depends(get_db)):
+    if not request.orders:
+        raise HTTPException(status_code=422, detail="No orders given")
+    if len(request.orders) > MAX_COMPLETIONS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_COMPLETIONS} orders per request")
+    result = await complete_orders(db, request.orders, location_id=request.location_id)
+    await db.commit()
+    return result
+
+@router.post("/orders/{mo_id}/complete", response_model=schemas.CompletionResult)
+async def complete_mo(mo_id: int, body: schemas.CompletionBody, db: AsyncSession = Depends(get_db)):
+    order = schemas.CompletionOrder(mo_id=mo_id, quantity=body.quantity, lot_number=body.lot_number, input_lots=body.input_lots)
+    result = await complete_orders(db, [order], location_id=body.location_id)
+    await db.commit()
+    return result
+
+@router.get("/variances/", response_model=List[schemas.ProductionVariance])
+async def read_variances(mo_id: Optional[int] = None, item_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    variance = models.ProductionVariance
+    query = select(variance).order_by(variance.variance_id.desc())
+    if mo_id is not None:
+        query = query.where(variance.mo_id == mo_id)
+    if item_id is not None:
+        query = query.where(variance.item_id == item_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+# --- Work Centers ---
+def _check_working_days(working_days: str):
+    if not set(working_days) <= set("1234567"):
+        raise HTTPException(status_code=422, detail="working_days lists ISO weekdays, 1 (Monday) to 7")
+
+@router.post("/work-centers/", response_model=schemas.WorkCenter)
+async def create_work_center(center: schemas.WorkCenterCreate, db: AsyncSession = Depends(get_db)):
+    _check_working_days(center.working_days)
+    db_center = models.WorkCenter(**center.dict())
+    db.add(db_center)
+    await db.commit()
+    await db.refresh(db_center)
+    return db_center
+
+@router.get("/work-centers/", response_model=List[schemas.WorkCenter])
+async def read_work_centers(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.WorkCenter).order_by(models.WorkCenter.code).offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.put("/work-centers/{work_center_id}", response_model=schemas.WorkCenter)
+async def update_work_center(work_center_id: int, center: schemas.WorkCenterCreate, db: AsyncSession = Depends(get_db)):
+    db_center = await db.get(models.WorkCenter, work_center_id)
+    if not db_center:
+        raise HTTPException(status_code=404, detail="Work center not found")
+    _check_working_days(center.working_days)
+    for field, value in center.dict().items():
+        setattr(db_center, field, value)
+    await db.commit()
+    await db.refresh(db_center)
+    return db_center
+
+@router.post("/work-centers/calendar/", response_model=schemas.WorkCenterCalendar)
+async def set_calendar_day(day: schemas.WorkCenterCalendarCreate, db: AsyncSession = Depends(get_db)):
+    if await db.get(models.WorkCenter, day.work_center_id) is None:
+        raise HTTPException(status_code=404, detail="Work center not found")
+    result = await db.execute(
+        select(models.WorkCenterCalendar)
+        .where(models.WorkCenterCalendar.work_center_id == day.work_center_id, models.WorkCenterCalendar.day == day.day)
+    )
+    db_day = result.scalars().first()
+    if db_day:
+        db_day.hours = day.hours
+    else:
+        db_day = models.WorkCenterCalendar(**day.dict())
+        db.add(db_day)
+    await db.commit()
+    await db.refresh(db_day)
+    return db_day
+
+@router.get("/work-centers/calendar/", response_model=List[schemas.WorkCenterCalendar])
+async def read_calendar(
+    work_center_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    calendar = models.WorkCenterCalendar
+    query = select(calendar).order_by(calendar.day, calendar.work_center_id)
+    if work_center_id is not None:
+        query = query.where(calendar.work_center_id == work_center_id)
+    if date_from is not None:
+        query = query.where(calendar.day >= date_from)
+    if date_to is not None:
+        query = query.where(calendar.day <= date_to)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.delete("/work-centers/calendar/{calendar_id}")
+async def delete_calendar_day(calendar_id: int, db: AsyncSession = Depends(get_db)):
+    db_day = await db.get(models.WorkCenterCalendar, calendar_id)
+    if not db_day:
+        raise HTTPException(status_code=404, detail="Calendar day not found")
+    await db.delete(db_day)
+    await db.commit()
+    return {"message": "Calendar day deleted successfully"}
+
+# --- Routings ---
+@router.post("/routings/", response_model=schemas.Routing)
+async def create_routing(routing: schemas.RoutingCreate, db: AsyncSession = Depends(get_db)):
+    if await db.get(models.WorkCenter, routing.work_center_id) is None:
+        raise HTTPException(status_code=404, detail="Work center not found")
+    db_routing = models.Routing(**routing.dict())
+    db.add(db_routing)
+    await db.commit()
+    await db.refresh(db_routing)
+    return db_routing
+
+@router.get("/routings/", response_model=List[schemas.Routing])
+async def read_routings(product_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    routing = models.Routing
+    query = select(routing).order_by(routing.product_id, routing.sequence, routing.routing_id)
+    if product_id is not None:
+        query = query.where(routing.product_id == product_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.put("/routings/{routing_id}", response_model=schemas.Routing)
+async def update_routing(routing_id: int, routing: schemas.RoutingCreate, db: AsyncSession = Depends(get_db)):
+    db_routing = await db.get(models.Routing, routing_id)
+    if not db_routing:
+        raise HTTPException(status_code=404, detail="Routing not found")
+    for field, value in routing.dict().items():
+        setattr(db_routing, field, value)
+    await db.commit()
+    await db.refresh(db_routing)
+    return db_routing
+
+@router.delete("/routings/{routing_id}")
+async def delete_routing(routing_id: int, db: AsyncSession = Depends(get_db)):
+    db_routing = await db.get(models.Routing, routing_id)
+    if not db_routing:
+        raise HTTPException(status_code=404, detail="Routing not found")
+    await db.delete(db_routing)
+    await db.commit()
+    return {"message": "Routing deleted successfully"}
+
+# --- Scheduling ---
+@router.post("/schedule/", response_model=schemas.ScheduleResult)
+async def run_schedule(db: AsyncSession = Depends(get_db)):
+    result = await schedule_all(db)
+    await db.commit()
+    return result
+
+@router.get("/schedule/", response_model=List[schemas.ScheduledOperation])
+async def read_schedule(
+    work_center_id: Optional[int] = None,
+    mo_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+):
+    slot = models.ScheduledOperation
+    query = select(slot).order_by(slot.day, slot.work_center_id, slot.slot_id)
+    if work_center_id is not None:
+        query = query.where(slot.work_center_id == work_center_id)
+    if mo_id is not None:
+        query = query.where(slot.mo_id == mo_id)
+    if date_from is not None:
+        query = query.where(slot.day >= date_from)
+    if date_to is not None:
+        query = query.where(slot.day <= date_to)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
 # --- Material Consumption ---
 @router.post("/consumption/", response_model=schemas.MaterialConsumption)
 async def create_consumption(cons: schemas.MaterialConsumptionCreate, db: AsyncSession = Depends(get_db)):
+    if cons.lot_id is not None:
+        db_lot = await db.get(Lot, cons.lot_id)
+        if db_lot is None:
+            raise HTTPException(status_code=404, detail="Lot not found")
+        if db_lot.item_id != cons.item_id:
+            raise HTTPException(status_code=422, detail=f"Lot {db_lot.lot_number} is not a lot of item {cons.item_id}")
     db_cons = models.MaterialConsumption(**cons.dict())
     db.add(db_cons)
     
     # Auto-create outbound stock movement
     # Simplified: Assuming consumption triggers stock reduction
     # In a real system, we'd call the inventory service or create a StockMovement record here
-    
+
+    await db.flush()
+    await publish(db, "material_consumption", "create", db_cons.cons_id, from_orm(schemas.MaterialConsumption, db_cons))
     await db.commit()
     await db.refresh(db_cons)
     return db_cons
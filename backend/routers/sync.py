@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_db
+from schemas import sync as schemas
+from services.sync import SYNC_MAX_LIMIT, SYNC_TABLES, changes
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sync"],
+)
+
+@router.get("/", response_model=schemas.SyncResult)
+async def read_changes(
+    tables: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = 500,
+    location_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Rows changed and deleted since `since`, for several tables at once.
+
+    `tables` is a comma-separated list (all tracked tables when omitted);
+    `limit` applies per table. Without `since` every row is sent. Keep the
+    same tables and location_id from one call to the next.
+    """
+    names = [name.strip() for name in tables.split(",") if name.strip()] if tables else list(SYNC_TABLES)
+    unknown = sorted(set(names) - set(SYNC_TABLES))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown tables: {', '.join(unknown)}")
+    if not 1 <= limit <= SYNC_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {SYNC_MAX_LIMIT}")
+    return await changes(db, names, since, limit, location_id)
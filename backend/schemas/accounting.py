@@ -1,20 +1,25 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import date
+from decimal import Decimal
+from typing import Optional, List
+from datetime import date, datetime
 
 # Invoice Schemas
 class InvoiceBase(BaseModel):
     invoice_number: str
     order_id: Optional[int] = None
     issue_date: Optional[date] = None
-    amount: float
-    taxes: Optional[float] = 0.0
-    discount: Optional[float] = 0.0
+    amount: Decimal
+    taxes: Optional[Decimal] = Decimal(0)
+    discount: Optional[Decimal] = Decimal(0)
     payment_method: Optional[str] = None
     status: Optional[str] = "unpaid"
 
 class InvoiceCreate(InvoiceBase):
-    pass
+    invoice_number: Optional[str] = None # assigned by the server when omitted
+    # Left empty, amount, taxes and discount are copied from the linked order
+    amount: Optional[Decimal] = None
+    taxes: Optional[Decimal] = None
+    discount: Optional[Decimal] = None
 
 class Invoice(InvoiceBase):
     invoice_id: int
@@ -22,10 +27,14 @@ class Invoice(InvoiceBase):
     class Config:
         orm_mode = True
 
+class InvoiceBatchResult(BaseModel):
+    invoices_created: int
+    invoice_ids: List[int] = []
+
 # Payment Schemas
 class PaymentBase(BaseModel):
     invoice_id: int
-    amount: float
+    amount: Decimal
     payment_date: Optional[date] = None
     method: Optional[str] = None
 
@@ -43,8 +52,8 @@ class AccountsReceivableBase(BaseModel):
     customer_id: int
     invoice_id: int
     due_date: Optional[date] = None
-    total_amount: float
-    paid_amount: Optional[float] = 0.0
+    total_amount: Decimal
+    paid_amount: Optional[Decimal] = Decimal(0)
     status: Optional[str] = "due"
 
 class AccountsReceivableCreate(AccountsReceivableBase):
@@ -55,3 +64,86 @@ class AccountsReceivable(AccountsReceivableBase):
 
     class Config:
         orm_mode = True
+
+# Account Schemas
+class AccountBase(BaseModel):
+    code: str
+    name: str
+    account_type: str # asset, liability, equity, revenue, expense
+    is_active: Optional[bool] = True
+
+class AccountCreate(AccountBase):
+    pass
+
+class Account(AccountBase):
+    account_id: int
+
+    class Config:
+        orm_mode = True
+
+# Journal Schemas
+class JournalLineBase(BaseModel):
+    account_id: int
+    debit: Decimal = Decimal(0)
+    credit: Decimal = Decimal(0)
+    description: Optional[str] = None
+
+class JournalLineCreate(JournalLineBase):
+    pass
+
+class JournalLine(JournalLineBase):
+    line_id: int
+
+    class Config:
+        orm_mode = True
+
+class JournalEntryCreate(BaseModel):
+    entry_date: Optional[date] = None
+    description: Optional[str] = None
+    lines: List[JournalLineCreate]
+
+class JournalEntry(BaseModel):
+    entry_id: int
+    entry_number: str
+    entry_date: date
+    description: Optional[str] = None
+    source_type: Optional[str] = None
+    source_id: Optional[int] = None
+    reversal_of: Optional[int] = None
+    posted_at: Optional[datetime] = None
+    lines: List[JournalLine] = []
+
+    class Config:
+        orm_mode = True
+
+# Report Schemas
+class AccountBalanceLine(BaseModel):
+    account_id: int
+    code: str
+    name: str
+    account_type: str
+    debit: Decimal
+    credit: Decimal
+    balance: Decimal # in the account's normal direction
+
+class TrialBalance(BaseModel):
+    period: date # through the end of this month
+    total_debit: Decimal
+    total_credit: Decimal
+    lines: List[AccountBalanceLine]
+
+class ProfitAndLoss(BaseModel):
+    from_period: date
+    to_period: date
+    revenue: Decimal
+    expenses: Decimal
+    net_income: Decimal
+    lines: List[AccountBalanceLine]
+
+class BalanceSheet(BaseModel):
+    period: date
+    assets: Decimal
+    liabilities: Decimal
+    equity: Decimal # includes current earnings
+    current_earnings: Decimal
+    lines: List[AccountBalanceLine]
@@ -0,0 +1,6 @@
+# Helpers that work on both Pydantic 1 (orm_mode) and Pydantic 2 (from_attributes)
+
+def from_orm(schema, obj):
+    if hasattr(schema, "model_validate"):
+        return schema.model_validate(obj, from_attributes=True)
+    return schema.from_orm(obj)
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional, Any, Dict, List
+
+# Composite Schemas
+class CompositeQuery(BaseModel):
+    resource: str
+    skip: int = 0
+    limit: Optional[int] = None # capped per resource
+    include: Optional[str] = None # e.g. "items" for orders
+
+class CompositeRequest(BaseModel):
+    # Response key -> query, e.g. {"orders": {"resource": "orders", "limit": 50}}
+    queries: Dict[str, CompositeQuery]
+
+class CompositeResult(BaseModel):
+    status: int
+    data: Optional[List[Any]] = None
+    error: Optional[str] = None
+    cached: bool = False
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from decimal import Decimal
 from typing import Optional
 import datetime
 
@@ -10,7 +11,7 @@ class EmployeeBase(BaseModel):
     phone: Optional[str] = None
     job_position: Optional[str] = None
     department: Optional[str] = None
-    basic_salary: Optional[float] = 0.0
+    basic_salary: Optional[Decimal] = Decimal(0)
     hire_date: Optional[datetime.date] = None
 
 class EmployeeCreate(EmployeeBase):
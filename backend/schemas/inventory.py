@@ -1,15 +1,35 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional, List
+from datetime import date, datetime
+
+# Location Schemas
+class LocationBase(BaseModel):
+    code: str
+    name: str
+    address: Optional[str] = None
+    is_default: Optional[bool] = False
+    is_active: Optional[bool] = True
+
+class LocationCreate(LocationBase):
+    pass
+
+class Location(LocationBase):
+    location_id: int
+
+    class Config:
+        orm_mode = True
 
 # InventoryLevel Schemas
 class InventoryLevelBase(BaseModel):
     item_id: int
-    on_hand: Optional[float] = 0.0
-    available: Optional[float] = 0.0
-    min_level: Optional[float] = 0.0
-    max_level: Optional[float] = 0.0
-    reorder_point: Optional[float] = 0.0
+    location_id: Optional[int] = None # default location when omitted
+    on_hand: Optional[Decimal] = Decimal(0)
+    available: Optional[Decimal] = Decimal(0)
+    min_level: Optional[Decimal] = Decimal(0)
+    max_level: Optional[Decimal] = Decimal(0)
+    reorder_point: Optional[Decimal] = Decimal(0)
+    auto_reorder: Optional[bool] = False # reorder_point and max_level set from the demand forecast
 
 class InventoryLevelCreate(InventoryLevelBase):
     pass
@@ -23,21 +43,266 @@ class InventoryLevel(InventoryLevelBase):
 # StockMovement Schemas
 class StockMovementBase(BaseModel):
     item_id: int
+    location_id: Optional[int] = None # default location when omitted
     movement_type: str
     transaction_number: Optional[str] = None
     date: Optional[datetime] = None
     reference_id: Optional[int] = None
-    quantity: float
+    quantity: Decimal
     condition: Optional[str] = "good"
     beneficiary: Optional[str] = None
     employee_id: Optional[int] = None
     delivery_status: Optional[str] = "completed"
+    unit_cost: Optional[Decimal] = None # inbound only; defaults to the purchase order price
+    lot_id: Optional[int] = None
 
 class StockMovementCreate(StockMovementBase):
-    pass
+    lot_number: Optional[str] = None # inbound creates the lot when new; wins over lot_id
 
 class StockMovement(StockMovementBase):
     movement_id: int
+    total_cost: Optional[Decimal] = None
+
+    class Config:
+        orm_mode = True
+
+# Transfer Schemas
+class TransferLine(BaseModel):
+    item_id: int
+    quantity: Decimal
+    lot_id: Optional[int] = None
+
+class TransferCreate(BaseModel):
+    from_location_id: int
+    to_location_id: int
+    date: Optional[datetime] = None
+    employee_id: Optional[int] = None
+    lines: List[TransferLine]
+
+class Transfer(BaseModel):
+    transfer_number: str
+    from_location_id: int
+    to_location_id: int
+    movements: List[StockMovement]
+
+# Reservation Schemas
+class StockReservation(BaseModel):
+    reservation_id: int
+    order_id: int
+    item_id: int
+    location_id: int
+    quantity: Decimal
+    lot_id: Optional[int] = None
+    status: str
+    created_at: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
+
+# Available-to-promise Schemas
+class ATPLine(BaseModel):
+    item_id: int
+    quantity: Decimal
+
+class ATPRequest(BaseModel):
+    location_id: Optional[int] = None # all locations when omitted
+    ship_date: Optional[date] = None # count purchase orders expected by this date
+    lines: List[ATPLine]
+
+class ATPLineResult(BaseModel):
+    item_id: int
+    requested: Decimal
+    available: Decimal
+    incoming: Decimal
+    atp: Decimal
+    can_promise: bool
+    shortfall: Decimal
+
+class ATPResult(BaseModel):
+    can_promise: bool
+    lines: List[ATPLineResult]
+
+# Replenishment Schemas
+class ReplenishmentRequest(BaseModel):
+    location_id: Optional[int] = None # all locations when omitted
+    dry_run: bool = False
+
+class ReplenishmentLine(BaseModel):
+    item_id: int
+    location_id: int
+    supplier_id: int
+    unit_price: Decimal
+    available: Decimal
+    on_order: Decimal
+    quantity: Decimal
+
+class ReplenishmentResult(BaseModel):
+    dry_run: bool
+    orders_created: int
+    order_ids: List[int]
+    lines: List[ReplenishmentLine]
+    unassigned_items: List[int] # below reorder point but no supplier known
+
+# Valuation Schemas
+class ValuationLine(BaseModel):
+    item_id: int
+    location_id: int
+    quantity: Decimal
+    value: Decimal
+
+class ValuationReport(BaseModel):
+    as_of: datetime
+    method: str # fifo, average
+    snapshot_at: Optional[datetime] = None # snapshot the report started from
+    total_value: Decimal
+    lines: List[ValuationLine]
+
+# Stock History Schemas
+class StockAsOfLine(BaseModel):
+    item_id: int
+    location_id: int
+    on_hand: Decimal
+
+class StockAsOf(BaseModel):
+    as_of: datetime
+    snapshot_at: Optional[datetime] = None
+    lines: List[StockAsOfLine]
+
+class StockCardLine(BaseModel):
+    movement_id: int
+    date: Optional[datetime] = None
+    movement_type: str
+    transaction_number: Optional[str] = None
+    reference_id: Optional[int] = None
+    location_id: Optional[int] = None
+    quantity: Decimal # signed: receipts positive, issues negative
+    unit_cost: Optional[Decimal] = None
+    total_cost: Optional[Decimal] = None
+    balance: Decimal
+    value_balance: Decimal
+
+class StockCard(BaseModel):
+    item_id: int
+    location_id: Optional[int] = None # all locations when omitted
+    date_from: Optional[datetime] = None
+    date_to: datetime
+    opening_balance: Decimal
+    opening_value: Decimal
+    lines: List[StockCardLine]
+
+# Lot Schemas
+class LotBase(BaseModel):
+    lot_number: str
+    item_id: Optional[int] = None
+    product_id: Optional[int] = None
+    tracking: Optional[str] = "lot" # lot, serial
+    supplier_id: Optional[int] = None
+
+class LotCreate(LotBase):
+    pass
+
+class Lot(LotBase):
+    lot_id: int
+    mo_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class TracedLot(Lot):
+    depth: int # links from the traced lot
+
+class TraceMovement(BaseModel):
+    movement_id: int
+    date: datetime
+    movement_type: str
+    item_id: int
+    lot_id: int
+    quantity: Decimal
+    reference_id: Optional[int] = None
+    order_id: Optional[int] = None
+    customer_id: Optional[int] = None
+    supplier_id: Optional[int] = None
+
+class TraceResult(BaseModel):
+    lot_id: int
+    direction: str # forward, backward
+    lots: List[TracedLot]
+    movements: List[TraceMovement] # forward: shipments; backward: receipts
+    customer_ids: List[int]
+    supplier_ids: List[int]
+
+# Count Schemas
+class CountSessionCreate(BaseModel):
+    location_id: Optional[int] = None # default location when omitted
+    item_ids: Optional[List[int]] = None # cycle count of these items; the whole location when omitted
+    note: Optional[str] = None
+
+class CountSession(BaseModel):
+    session_id: int
+    session_number: str
+    location_id: int
+    status: str
+    note: Optional[str] = None
+    created_at: Optional[datetime] = None
+    posted_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class CountLineEntry(BaseModel):
+    item_id: int
+    counted: Decimal
+
+class CountEntry(BaseModel):
+    lines: List[CountLineEntry]
+    add: bool = False # add to earlier counts (one line per scan) instead of replacing them
+
+class CountEntryResult(BaseModel):
+    session_id: int
+    lines: int
+
+class CountLine(BaseModel):
+    line_id: int
+    item_id: int
+    expected: Decimal
+    counted: Optional[Decimal] = None
+    counted_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class CountPostResult(BaseModel):
+    session_id: int
+    session_number: str
+    lines_adjusted: int
+    quantity_gained: Decimal
+    quantity_lost: Decimal
+    value_gained: Decimal
+    value_lost: Decimal
+
+# Forecast Schemas
+class DemandForecast(BaseModel):
+    item_id: int
+    location_id: int
+    bucket: str
+    model: str
+    demand_per_day: Decimal
+    error: Decimal
+    safety_stock: Decimal
+    reorder_point: Decimal
+    max_level: Decimal
+    computed_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class ForecastRequest(BaseModel):
+    bucket: str = "week" # day, week
+
+class ForecastResult(BaseModel):
+    bucket: str
+    series: int # item and location pairs forecast
+    models: Dict[str, int] # series per chosen model
+    levels_updated: int # auto_reorder levels given new reorder points
@@ -0,0 +1,37 @@
+from pydantic import BaseModel
+from typing import Optional, Any, Dict
+from datetime import datetime
+
+# Job Schemas
+class JobCreate(BaseModel):
+    job_type: str
+    params: Optional[Dict[str, Any]] = {}
+    max_attempts: Optional[int] = None
+
+class Job(BaseModel):
+    job_id: int
+    job_type: str
+    status: str
+    params: Optional[Dict[str, Any]] = None
+    progress: float
+    message: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    created_at: Optional[datetime] = None
+    run_after: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class JobResult(BaseModel):
+    job_id: int
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
@@ -1,4 +1,6 @@
 from pydantic import BaseModel
+from decimal import Decimal
+from datetime import datetime
 from typing import Optional
 
 # Supplier Schemas
@@ -22,6 +24,24 @@ class Supplier(SupplierBase):
     class Config:
         orm_mode = True
 
+class SupplierScore(BaseModel):
+    supplier_id: int
+    company_name: str
+    rating: Optional[float] = None
+    window_days: int
+    category: str
+    deliveries: int
+    on_time_rate: Optional[Decimal] = None
+    in_full_rate: Optional[Decimal] = None
+    quality_rate: Optional[Decimal] = None
+    score: Decimal
+    computed_at: datetime
+
+class SupplierScoringResult(BaseModel):
+    suppliers: int
+    scores: int
+    ratings_updated: int
+
 # Customer Schemas
 class CustomerBase(BaseModel):
     full_name: str
@@ -43,6 +63,8 @@ class ItemBase(BaseModel):
     item_name: str
     category: Optional[str] = None
     unit: str
+    preferred_supplier_id: Optional[int] = None
+    standard_cost: Optional[Decimal] = None # average cost is used when unset
 
 class ItemCreate(ItemBase):
     pass
@@ -59,7 +81,7 @@ class ProductBase(BaseModel):
     product_name: str
     product_type: Optional[str] = None
     description: Optional[str] = None
-    price: Optional[float] = 0.0
+    price: Optional[Decimal] = Decimal(0)
     stock_quantity: Optional[int] = 0
 
 class ProductCreate(ProductBase):
@@ -1,20 +1,26 @@
 from pydantic import BaseModel
+from decimal import Decimal
 from typing import Optional, List
 from datetime import date
 
 # Order Item Schemas
 class OrderItemBase(BaseModel):
     item_id: int
-    quantity: float
-    unit_price: float
-    discount: Optional[float] = 0.0
+    quantity: Decimal
+    unit_price: Decimal
+    discount: Optional[Decimal] = Decimal(0)
+    lot_id: Optional[int] = None # sales lines: ship from this lot
 
 class OrderItemCreate(OrderItemBase):
-    pass
+    # Omitted prices and tax rates are resolved from the customer's price list
+    unit_price: Optional[Decimal] = None
+    tax_rate: Optional[Decimal] = None
 
 class OrderItem(OrderItemBase):
     order_item_id: int
-    line_total: float
+    tax_rate: Decimal = Decimal(0)
+    tax_amount: Decimal = Decimal(0)
+    line_total: Decimal
 
     class Config:
         orm_mode = True
@@ -27,13 +33,19 @@ class OrderBase(BaseModel):
     supplier_id: Optional[int] = None
     customer_id: Optional[int] = None
     status: Optional[str] = "pending"
+    location_id: Optional[int] = None
+    expected_date: Optional[date] = None
 
 class OrderCreate(OrderBase):
+    order_number: Optional[str] = None # assigned by the server when omitted
     items: List[OrderItemCreate]
 
 class Order(OrderBase):
     order_id: int
-    total_amount: float
+    subtotal: Decimal = Decimal(0)
+    discount_total: Decimal = Decimal(0)
+    tax_total: Decimal = Decimal(0)
+    total_amount: Decimal
     items: List[OrderItem] = []
 
     class Config:
@@ -43,12 +55,14 @@ class Order(OrderBase):
 class ReceivingNoteBase(BaseModel):
     purchase_order_id: int
     note_number: str
-    quantity_received: float
+    quantity_received: Decimal
     quality_status: Optional[str] = "compliant"
     date_received: Optional[date] = None
+    item_id: Optional[int] = None
+    lot_id: Optional[int] = None
 
 class ReceivingNoteCreate(ReceivingNoteBase):
-    pass
+    lot_number: Optional[str] = None # supplier lot; created when new, needs item_id
 
 class ReceivingNote(ReceivingNoteBase):
     rn_id: int
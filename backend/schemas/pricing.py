@@ -0,0 +1,56 @@
+from pydantic import BaseModel
+from decimal import Decimal
+from typing import Optional, List
+from schemas.orders import OrderItemCreate
+
+# Price List Schemas
+class PriceListItemBase(BaseModel):
+    item_id: int
+    unit_price: Decimal
+    tax_rate: Optional[Decimal] = Decimal(0)
+
+class PriceListItemCreate(PriceListItemBase):
+    pass
+
+class PriceListItem(PriceListItemBase):
+    price_list_item_id: int
+
+    class Config:
+        orm_mode = True
+
+class PriceListBase(BaseModel):
+    name: str
+    customer_id: Optional[int] = None
+    is_active: Optional[bool] = True
+
+class PriceListCreate(PriceListBase):
+    items: List[PriceListItemCreate] = []
+
+class PriceList(PriceListBase):
+    price_list_id: int
+    items: List[PriceListItem] = []
+
+    class Config:
+        orm_mode = True
+
+# Quote Schemas
+class QuoteRequest(BaseModel):
+    order_type: Optional[str] = "sales"
+    customer_id: Optional[int] = None
+    items: List[OrderItemCreate]
+
+class QuoteLine(BaseModel):
+    item_id: int
+    quantity: Decimal
+    unit_price: Decimal
+    discount: Decimal
+    tax_rate: Decimal
+    tax_amount: Decimal
+    line_total: Decimal
+
+class QuoteResult(BaseModel):
+    lines: List[QuoteLine]
+    subtotal: Decimal
+    discount_total: Decimal
+    tax_total: Decimal
+    total_amount: Decimal
@@ -1,12 +1,15 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from decimal import Decimal
+from typing import Dict, Optional, List
 from datetime import date
 
 # BoM Schemas
 class BillOfMaterialsBase(BaseModel):
     product_id: int
-    item_id: int
-    qty_required: float
+    # Exactly one of: a component item, or a product used as a sub-assembly
+    item_id: Optional[int] = None
+    component_product_id: Optional[int] = None
+    qty_required: Decimal
 
 class BillOfMaterialsCreate(BillOfMaterialsBase):
     pass
@@ -17,31 +20,85 @@ class BillOfMaterials(BillOfMaterialsBase):
     class Config:
         orm_mode = True
 
+class ProductCost(BaseModel):
+    product_id: int
+    material_cost: Decimal # per unit, rolled up through the BOM
+
+class CostRollupResult(BaseModel):
+    products: int
+    cyclic: List[int] # on or above a BOM cycle; not costed
+
 # Manufacturing Order Schemas
 class ManufacturingOrderBase(BaseModel):
     production_order_number: str
     product_id: int
-    quantity_required: float
+    quantity_required: Decimal
     start_date: Optional[date] = None
     end_date: Optional[date] = None
     status: Optional[str] = "pending"
+    priority: int = 0 # higher is scheduled first
+    due_date: Optional[date] = None
 
 class ManufacturingOrderCreate(ManufacturingOrderBase):
-    pass
+    production_order_number: Optional[str] = None # assigned by the server when omitted
+    # start_date and end_date are set by the scheduler for routed products
 
 class ManufacturingOrder(ManufacturingOrderBase):
     mo_id: int
+    quantity_completed: Optional[Decimal] = None
 
     class Config:
         orm_mode = True
 
+# Completion Schemas
+class InputLot(BaseModel):
+    lot_id: int
+    quantity: Decimal
+
+class CompletionOrder(BaseModel):
+    mo_id: int
+    quantity: Optional[Decimal] = None # finished quantity; quantity_required when omitted
+    lot_number: Optional[str] = None # output lot; the production order number when omitted
+    input_lots: List[InputLot] = [] # lots used beyond those on recorded consumption
+
+class CompletionBody(BaseModel):
+    quantity: Optional[Decimal] = None # finished quantity; quantity_required when omitted
+    lot_number: Optional[str] = None # output lot; the production order number when omitted
+    input_lots: List[InputLot] = [] # lots used beyond those on recorded consumption
+    location_id: Optional[int] = None # components are issued here; default location when omitted
+
+class CompletionRequest(BaseModel):
+    orders: List[CompletionOrder]
+    location_id: Optional[int] = None # components are issued here; default location when omitted
+
+class ProductionVariance(BaseModel):
+    variance_id: int
+    mo_id: int
+    item_id: int
+    standard_quantity: Decimal
+    actual_quantity: Decimal
+    quantity_variance: Decimal # actual - standard
+    unit_cost: Decimal
+    cost_variance: Decimal
+
+    class Config:
+        orm_mode = True
+
+class CompletionResult(BaseModel):
+    completed: List[int]
+    lot_ids: Dict[int, int] = {} # mo_id -> output lot
+    location_id: int
+    movement_ids: List[int]
+    variances: List[ProductionVariance]
+
 # Material Consumption Schemas
 class MaterialConsumptionBase(BaseModel):
     mo_id: int
     item_id: int
-    actual_quantity: float
-    waste: Optional[float] = 0.0
+    actual_quantity: Decimal
+    waste: Optional[Decimal] = Decimal(0)
     withdrawal_date: Optional[date] = None
+    lot_id: Optional[int] = None
 
 class MaterialConsumptionCreate(MaterialConsumptionBase):
     pass
@@ -51,3 +108,70 @@ class MaterialConsumption(MaterialConsumptionBase):
 
     class Config:
         orm_mode = True
+
+# Work Center Schemas
+class WorkCenterBase(BaseModel):
+    code: str
+    name: str
+    hours_per_day: Decimal = Decimal(8)
+    working_days: str = "12345" # ISO weekdays, 1 = Monday
+    is_active: Optional[bool] = True
+
+class WorkCenterCreate(WorkCenterBase):
+    pass
+
+class WorkCenter(WorkCenterBase):
+    work_center_id: int
+
+    class Config:
+        orm_mode = True
+
+class WorkCenterCalendarBase(BaseModel):
+    work_center_id: int
+    day: date
+    hours: Decimal # 0 for a holiday
+
+class WorkCenterCalendarCreate(WorkCenterCalendarBase):
+    pass
+
+class WorkCenterCalendar(WorkCenterCalendarBase):
+    calendar_id: int
+
+    class Config:
+        orm_mode = True
+
+# Routing Schemas
+class RoutingBase(BaseModel):
+    product_id: int
+    work_center_id: int
+    sequence: int = 10
+    setup_hours: Decimal = Decimal(0)
+    run_hours_per_unit: Decimal = Decimal(0)
+
+class RoutingCreate(RoutingBase):
+    pass
+
+class Routing(RoutingBase):
+    routing_id: int
+
+    class Config:
+        orm_mode = True
+
+# Scheduling Schemas
+class ScheduledOperation(BaseModel):
+    slot_id: int
+    mo_id: int
+    routing_id: int
+    work_center_id: int
+    day: date
+    hours: Decimal
+
+    class Config:
+        orm_mode = True
+
+class ScheduleResult(BaseModel):
+    scheduled: int
+    updated: int # orders whose dates changed
+    unrouted: List[int] # products without a routing; dates left as entered
+    unschedulable: List[int] # routed through a work center with no capacity
+    late: List[int] # planned to finish after their due date
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List
+
+class SyncTableChanges(BaseModel):
+    upserts: List[Dict[str, Any]] = [] # rows as the list endpoints return them, plus updated_at
+    deletes: List[int] = [] # primary keys of deleted rows
+
+class SyncResult(BaseModel):
+    watermark: str # pass back as `since` on the next call
+    full_resync: bool # replace the local copies instead of applying changes
+    has_more: bool # call again with the new watermark right away
+    tables: Dict[str, SyncTableChanges]
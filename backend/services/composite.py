@@ -0,0 +1,34 @@
+import os
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+COMPOSITE_CACHE_TTL = float(os.getenv("COMPOSITE_CACHE_TTL", 30))
+
+class ResponseCache:
+    """Per-worker TTL cache of serialized composite sub-results.
+
+    Keys start with the resource name so writes can drop everything cached
+    for that resource; other workers catch up when the TTL runs out.
+    """
+
+    def __init__(self, ttl: float = COMPOSITE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[Hashable, ...], Tuple[float, Any]] = {}
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    def set(self, key: Tuple[Hashable, ...], value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, resource: str):
+        for key in [k for k in self._entries if k[0] == resource]:
+            self._entries.pop(key, None)
+
+composite_cache = ResponseCache()
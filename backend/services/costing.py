@@ -0,0 +1,236 @@
+import os
+from collections import defaultdict, deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, case, func, literal, or_, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as inv_models
+from models import master_data as master_models
+from models import production as models
+from services.jobs import job_handler, schedule_daily
+from services.pricing import ZERO
+
+# Standard cost rollup over multi-level bills of materials.
+#
+# A product's material cost per unit is the sum over its BOM lines of
+# qty_required x the component's cost: an item's standard_cost (its
+# current average cost when it has none) or a sub-assembly's own rolled-up
+# cost. Costs are cached in product_costs. Changing a BOM line or an item's
+# standard cost marks every product above it stale with one recursive
+# where-used query. Reading a cost recomputes only the stale or missing
+# products under it: the BOM is fetched one level per query, stopping at
+# fresh cached costs. The full rollup loads all BOM lines at once and costs
+# every product in one pass in topological order, components first.
+# Products on a BOM cycle get no cost and are reported; lines that would
+# close a cycle are refused when written.
+#
+# Average costs move with every receipt without invalidating anything;
+# the nightly rollup (COST_ROLLUP_SCHEDULE) picks them up.
+
+COST_ROLLUP_SCHEDULE = os.getenv("COST_ROLLUP_SCHEDULE", "04:15") # UTC, empty to disable
+COSTING_LOCK_KEY = 7_340_005 # pg advisory lock id
+
+UNIT_COST = Decimal("0.0001")
+
+# product_id -> [(item_id, component_product_id, qty_required)]
+Lines = Dict[int, List[Tuple[Optional[int], Optional[int], Decimal]]]
+
+def _ids(values: Iterable[int]):
+    return literal(sorted(set(values)), ARRAY(Integer))
+
+async def _lock(db: AsyncSession):
+    # BOM writes and cost writes take turns, so a rollup never stores a
+    # cost computed from a BOM that changed underneath it
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": COSTING_LOCK_KEY})
+
+async def check_component(db: AsyncSession, product_id: int, component_product_id: Optional[int]):
+    """Refuse a BOM line that would make `product_id` its own component."""
+    await _lock(db)
+    if component_product_id is None:
+        return
+    if component_product_id == product_id:
+        raise HTTPException(status_code=422, detail="A product cannot be a component of itself")
+    bom = models.BillOfMaterials
+    below = (
+        select(bom.component_product_id.label("product_id"))
+        .where(bom.product_id == component_product_id, bom.component_product_id.is_not(None))
+        .cte("below", recursive=True)
+    )
+    below = below.union(
+        select(bom.component_product_id)
+        .join(below, bom.product_id == below.c.product_id)
+        .where(bom.component_product_id.is_not(None))
+    )
+    if await db.scalar(select(below.c.product_id).where(below.c.product_id == product_id).limit(1)) is not None:
+        raise HTTPException(status_code=422, detail=f"Product {component_product_id} already contains product {product_id}")
+
+async def invalidate(db: AsyncSession, product_ids: Iterable[int] = (), item_ids: Iterable[int] = ()) -> int:
+    """Mark `product_ids`, the products using `item_ids`, and everything
+    above them stale. Returns the number of cached costs marked."""
+    product_ids, item_ids = list(product_ids), list(item_ids)
+    if not product_ids and not item_ids:
+        return 0
+    await _lock(db)
+    bom, product = models.BillOfMaterials, master_models.Product
+    affected = (
+        select(product.product_id)
+        .where(or_(
+            product.product_id == any_(_ids(product_ids)),
+            product.product_id.in_(select(bom.product_id).where(bom.item_id == any_(_ids(item_ids)))),
+        ))
+        .cte("affected", recursive=True)
+    )
+    affected = affected.union(
+        select(bom.product_id).join(affected, bom.component_product_id == affected.c.product_id)
+    )
+    cost = models.ProductCost
+    result = await db.execute(
+        update(cost)
+        .where(cost.product_id.in_(select(affected.c.product_id)), cost.stale.is_(False))
+        .values(stale=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def _add_lines(lines: Lines, rows):
+    for product_id, item_id, component_product_id, qty_required in rows:
+        lines[product_id].append((item_id, component_product_id, Decimal(qty_required)))
+
+def _topological(lines: Lines, known: Dict[int, Decimal]) -> Tuple[List[int], List[int]]:
+    """Products of `lines` with components first, and those left on or above a cycle."""
+    waiting: Dict[int, int] = {}
+    users: Dict[int, Set[int]] = defaultdict(set)
+    for product_id, components in lines.items():
+        children = {child for _, child, _ in components if child is not None and child not in known}
+        waiting[product_id] = len(children)
+        for child in children:
+            users[child].add(product_id)
+    ready = deque(sorted(product_id for product_id, count in waiting.items() if count == 0))
+    order = []
+    while ready:
+        product_id = ready.popleft()
+        order.append(product_id)
+        for user in users.pop(product_id, ()):
+            waiting[user] -= 1
+            if waiting[user] == 0:
+                ready.append(user)
+    done = set(order)
+    return order, sorted(product_id for product_id in lines if product_id not in done)
+
+async def _item_costs(db: AsyncSession, item_ids: Optional[Set[int]] = None) -> Dict[int, Decimal]:
+    item, valuation = master_models.Item, inv_models.ItemValuation
+    average = case((valuation.quantity > 0, valuation.value / valuation.quantity), else_=None)
+    query = (
+        select(item.item_id, func.coalesce(item.standard_cost, average, 0))
+        .outerjoin(valuation, valuation.item_id == item.item_id)
+    )
+    if item_ids is not None:
+        if not item_ids:
+            return {}
+        query = query.where(item.item_id == any_(_ids(item_ids)))
+    return {item_id: Decimal(cost) for item_id, cost in await db.execute(query)}
+
+async def _roll(db: AsyncSession, lines: Lines, known: Dict[int, Decimal], item_ids: Optional[Set[int]]) -> Tuple[Dict[int, Decimal], List[int]]:
+    """Cost every product of `lines` and cache the results. Returns (costs, products on cycles)."""
+    order, cyclic = _topological(lines, known)
+    item_costs = await _item_costs(db, item_ids)
+    costs = dict(known)
+    for product_id in order:
+        total = ZERO
+        for item_id, child, qty_required in lines[product_id]:
+            total += qty_required * (costs[child] if child is not None else item_costs.get(item_id, ZERO))
+        costs[product_id] = total.quantize(UNIT_COST)
+    computed = {product_id: costs[product_id] for product_id in order}
+    if computed:
+        now = datetime.utcnow()
+        table = models.ProductCost.__table__
+        statement = pg_insert(table)
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["product_id"],
+                set_={"material_cost": statement.excluded.material_cost, "stale": False, "computed_at": statement.excluded.computed_at},
+            ),
+            [{"product_id": product_id, "material_cost": cost, "stale": False, "computed_at": now} for product_id, cost in computed.items()],
+        )
+    if cyclic:
+        # Drop stale costs that can no longer be computed
+        await db.execute(
+            update(models.ProductCost)
+            .where(models.ProductCost.product_id == any_(_ids(cyclic)))
+            .values(stale=True)
+            .execution_options(synchronize_session=False)
+        )
+    return computed, cyclic
+
+async def _fresh(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Decimal]:
+    cost = models.ProductCost
+    result = await db.execute(
+        select(cost.product_id, cost.material_cost)
+        .where(cost.product_id == any_(_ids(product_ids)), cost.stale.is_(False))
+    )
+    return {product_id: Decimal(material_cost) for product_id, material_cost in result}
+
+async def product_costs(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Decimal]:
+    """Material cost per unit of each product, from the cache where fresh.
+    Raises 422 when one sits on a BOM cycle."""
+    product_ids = set(product_ids)
+    costs = await _fresh(db, product_ids)
+    if len(costs) == len(product_ids):
+        return costs
+
+    await _lock(db)
+    bom = models.BillOfMaterials
+    lines: Lines = defaultdict(list)
+    known: Dict[int, Decimal] = {}
+    item_ids: Set[int] = set()
+    todo = product_ids - set(costs)
+    while todo:
+        for product_id in todo:
+            lines.setdefault(product_id, [])
+        result = await db.execute(
+            select(bom.product_id, bom.item_id, bom.component_product_id, bom.qty_required)
+            .where(bom.product_id == any_(_ids(todo)))
+        )
+        rows = result.all()
+        _add_lines(lines, rows)
+        item_ids |= {row.item_id for row in rows if row.item_id is not None}
+        children = {row.component_product_id for row in rows if row.component_product_id is not None}
+        children -= set(lines) | set(known)
+        if children:
+            known.update(await _fresh(db, children))
+        todo = children - set(known)
+
+    computed, cyclic = await _roll(db, lines, known, item_ids)
+    if cyclic:
+        raise HTTPException(status_code=422, detail=f"Bill of materials cycle through products: {cyclic}")
+    return {**costs, **{product_id: computed[product_id] for product_id in product_ids if product_id in computed}}
+
+async def rollup_all(db: AsyncSession) -> dict:
+    """Cost every product in one pass."""
+    await _lock(db)
+    bom = models.BillOfMaterials
+    lines: Lines = defaultdict(list)
+    for (product_id,) in await db.execute(select(master_models.Product.product_id)):
+        lines[product_id] = []
+    result = await db.execute(
+        select(bom.product_id, bom.item_id, bom.component_product_id, bom.qty_required)
+        .where(bom.product_id.is_not(None))
+    )
+    _add_lines(lines, result)
+    computed, cyclic = await _roll(db, lines, {}, None)
+    return {"products": len(computed), "cyclic": cyclic}
+
+@job_handler("cost_rollup", max_attempts=2)
+async def cost_rollup_job(ctx):
+    await ctx.progress(0, "Rolling up standard costs", force=True)
+    result = await rollup_all(ctx.db)
+    await ctx.db.commit()
+    return result
+
+if COST_ROLLUP_SCHEDULE:
+    schedule_daily("cost_rollup", COST_ROLLUP_SCHEDULE)
@@ -0,0 +1,251 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, func, insert, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models import master_data as master_models
+from services.events import publish_many
+from services.inventory import lines_table, resolve_location
+from services.numbering import numbering
+from services.partitions import ensure_partitions
+from services.pricing import ZERO
+from services.valuation import value_movements
+
+# Cycle and physical counts.
+#
+# Opening a session freezes on_hand of the location (or of the items to
+# count) into count_lines with one INSERT ... SELECT. Counts are entered in
+# bulk: each batch of lines is one upsert over an unnest() of two arrays,
+# so a scanner upload or a CSV stream of any size costs one statement per
+# COUNT_BATCH_SIZE lines. Posting is set-based too: one query computes
+# counted - expected for every line, one upsert adds the differences to
+# inventory_levels, one multi-row insert writes the adjustment movements
+# (inbound for gains, outbound for losses, beneficiary "cycle_count"),
+# which value_movements costs and posts against the inventory adjustments
+# account. Movements posted at the location while the count ran stay in
+# on_hand: only the difference from the frozen quantity is adjusted.
+
+COUNT_BATCH_SIZE = 5000 # lines per upsert when streaming
+COUNT_BENEFICIARY = "cycle_count"
+
+def _ids(values: Iterable[int]):
+    return literal(sorted(set(values)), ARRAY(Integer))
+
+async def open_session(db: AsyncSession, location_id: Optional[int], item_ids: Optional[List[int]] = None, note: Optional[str] = None) -> models.CountSession:
+    location_id = await resolve_location(db, location_id)
+    if await db.get(models.Location, location_id) is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+    session = models.CountSession(
+        session_number=await numbering.next(db, "cycle_count"),
+        location_id=location_id,
+        status="open",
+        note=note,
+    )
+    db.add(session)
+    await db.flush()
+
+    level = models.InventoryLevel
+    frozen = select(literal(session.session_id), level.item_id, level.on_hand).where(level.location_id == location_id)
+    if item_ids is not None:
+        frozen = frozen.where(level.item_id == any_(_ids(item_ids)))
+    await db.execute(insert(models.CountLine).from_select(["session_id", "item_id", "expected"], frozen))
+    return session
+
+async def _open(db: AsyncSession, session_id: int) -> models.CountSession:
+    # Row lock: entry and posting of one session take turns
+    session = (await db.execute(
+        select(models.CountSession).where(models.CountSession.session_id == session_id).with_for_update()
+    )).scalars().first()
+    if session is None:
+        raise HTTPException(status_code=404, detail="Count session not found")
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Count session {session.session_number} is {session.status}")
+    return session
+
+async def _check_items(db: AsyncSession, item_ids: Iterable[int]):
+    item_ids = set(item_ids)
+    item = master_models.Item
+    found = set((await db.execute(select(item.item_id).where(item.item_id == any_(_ids(item_ids))))).scalars())
+    if len(found) < len(item_ids):
+        raise HTTPException(status_code=404, detail=f"Items not found: {sorted(item_ids - found)[:20]}")
+
+async def _upsert_counts(db: AsyncSession, session_id: int, counts: Dict[int, Decimal], add: bool) -> int:
+    if not counts:
+        return 0
+    await _check_items(db, counts)
+    table = models.CountLine.__table__
+    lines = lines_table(counts, "counts")
+    now = datetime.utcnow()
+    # Items not frozen were not expected here
+    statement = pg_insert(table).from_select(
+        ["session_id", "item_id", "expected", "counted", "counted_at"],
+        select(literal(session_id), lines.c.item_id, literal(ZERO), lines.c.qty, literal(now)),
+    )
+    counted = func.coalesce(table.c.counted, 0) + statement.excluded.counted if add else statement.excluded.counted
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=["session_id", "item_id"],
+        set_={"counted": counted, "counted_at": statement.excluded.counted_at},
+    ))
+    return len(counts)
+
+def _merge(counts: Dict[int, Decimal], item_id: int, quantity: Decimal, add: bool):
+    if quantity < 0:
+        raise HTTPException(status_code=422, detail=f"Counted quantity of item {item_id} is negative")
+    counts[item_id] = counts.get(item_id, ZERO) + quantity if add else quantity
+
+async def enter_counts(db: AsyncSession, session_id: int, lines: Iterable[Tuple[int, Decimal]], add: bool = False) -> int:
+    """Record (item_id, counted) lines; `add` sums them into earlier counts
+    (one line per scan) instead of replacing them. Returns the lines taken."""
+    await _open(db, session_id)
+    counts: Dict[int, Decimal] = {}
+    for item_id, quantity in lines:
+        _merge(counts, item_id, Decimal(quantity), add)
+    return await _upsert_counts(db, session_id, counts, add)
+
+async def _item_ids_by_code(db: AsyncSession, codes: Iterable[str]) -> Dict[str, int]:
+    codes = set(codes)
+    item = master_models.Item
+    result = await db.execute(select(item.item_code, item.item_id).where(item.item_code.in_(sorted(codes))))
+    found = dict(result.all())
+    missing = sorted(codes - set(found))
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Unknown item codes: {missing[:20]}")
+    return found
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    rest = b""
+    async for chunk in chunks:
+        rest += chunk
+        *complete, rest = rest.split(b"\n")
+        for line in complete:
+            yield line.decode("utf-8-sig")
+    if rest:
+        yield rest.decode("utf-8-sig")
+
+async def stream_counts(db: AsyncSession, session_id: int, chunks: AsyncIterator[bytes], add: bool = False) -> int:
+    """Record counts from a CSV stream with an item_code (or item_id) and a
+    counted column, COUNT_BATCH_SIZE lines per statement."""
+    await _open(db, session_id)
+    header: Optional[List[str]] = None
+    total = 0
+    batch: List[Tuple[Any, Decimal]] = []
+
+    async def flush():
+        nonlocal total
+        if by_code:
+            ids = await _item_ids_by_code(db, (key for key, _ in batch))
+            keyed = [(ids[key], quantity) for key, quantity in batch]
+        else:
+            keyed = batch
+        counts: Dict[int, Decimal] = {}
+        for item_id, quantity in keyed:
+            _merge(counts, item_id, quantity, add)
+        total += await _upsert_counts(db, session_id, counts, add)
+        batch.clear()
+
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        fields = [field.strip() for field in next(csv.reader([line]), [])]
+        if not any(fields):
+            continue
+        if header is None:
+            header = [field.lower() for field in fields]
+            by_code = "item_code" in header
+            if "counted" not in header or not (by_code or "item_id" in header):
+                raise HTTPException(status_code=422, detail="CSV header needs item_code or item_id, and counted")
+            key_at, counted_at = header.index("item_code" if by_code else "item_id"), header.index("counted")
+            continue
+        try:
+            key = fields[key_at] if by_code else int(fields[key_at])
+            batch.append((key, Decimal(fields[counted_at])))
+        except (IndexError, ArithmeticError, ValueError):
+            raise HTTPException(status_code=422, detail=f"Invalid count on CSV line {number}")
+        if len(batch) >= COUNT_BATCH_SIZE:
+            await flush()
+    if header is None:
+        raise HTTPException(status_code=422, detail="Empty CSV")
+    if batch:
+        await flush()
+    return total
+
+async def post_session(db: AsyncSession, session_id: int, zero_uncounted: bool = False) -> dict:
+    """Adjust stock to the counts. Uncounted lines are left alone unless
+    `zero_uncounted` (a full count: what was not found is gone)."""
+    session = await _open(db, session_id)
+    line = models.CountLine
+    counted = func.coalesce(line.counted, 0) if zero_uncounted else line.counted
+    result = await db.execute(
+        select(line.item_id, counted - line.expected)
+        .where(line.session_id == session_id, counted.is_not(None), counted != line.expected)
+    )
+    differences = {item_id: Decimal(difference) for item_id, difference in result}
+
+    now = datetime.utcnow()
+    session.status = "posted"
+    session.posted_at = now
+    if zero_uncounted:
+        await db.execute(
+            update(line)
+            .where(line.session_id == session_id, line.counted.is_(None))
+            .values(counted=0, counted_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    summary = {
+        "session_id": session.session_id,
+        "session_number": session.session_number,
+        "lines_adjusted": len(differences),
+        "quantity_gained": sum((d for d in differences.values() if d > 0), ZERO),
+        "quantity_lost": sum((-d for d in differences.values() if d < 0), ZERO),
+        "value_gained": ZERO,
+        "value_lost": ZERO,
+    }
+    if not differences:
+        return summary
+
+    # One upsert for all levels; an item found where none was expected gets a row
+    level = models.InventoryLevel.__table__
+    wanted = lines_table(differences, "adjusted")
+    statement = pg_insert(level).from_select(
+        ["item_id", "location_id", "on_hand", "available"],
+        select(wanted.c.item_id, literal(session.location_id), wanted.c.qty, wanted.c.qty),
+    )
+    result = await db.execute(statement.on_conflict_do_update(
+        index_elements=["item_id", "location_id"],
+        set_={"on_hand": level.c.on_hand + statement.excluded.on_hand, "available": level.c.available + statement.excluded.available},
+    ).returning(level.c.inventory_id))
+    level_ids = list(result.scalars())
+
+    await ensure_partitions("stock_movements", [now])
+    table = models.StockMovement.__table__
+    result = await db.execute(
+        insert(table).returning(*table.c, sort_by_parameter_order=True),
+        [
+            {
+                "item_id": item_id,
+                "location_id": session.location_id,
+                "movement_type": "inbound" if difference > 0 else "outbound",
+                "transaction_number": session.session_number,
+                "date": now,
+                "quantity": abs(difference),
+                "beneficiary": COUNT_BENEFICIARY,
+            }
+            for item_id, difference in sorted(differences.items())
+        ],
+    )
+    movements = [dict(row) for row in result.mappings()]
+    # Gains come in at the item's current cost: no unit_cost, no purchase order
+    costs = await value_movements(db, movements)
+    for m in movements:
+        key = "value_gained" if m["movement_type"] == "inbound" else "value_lost"
+        summary[key] += costs[m["movement_id"]]["total_cost"]
+
+    await publish_many(db, "inventory_levels", "update", level_ids)
+    await publish_many(db, "stock_movements", "create", [m["movement_id"] for m in movements])
+    return summary
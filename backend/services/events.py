@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import DATABASE_URL
+
+# Change events for live screens.
+#
+# Write handlers call publish() inside their transaction; pg_notify only
+# delivers on commit, so rolled-back writes never reach clients. Each API
+# worker holds ONE dedicated LISTEN connection (outside the SQLAlchemy pool)
+# and fans notifications out to its SSE subscribers through in-memory
+# queues. A short replay buffer serves reconnects that send Last-Event-ID.
+
+logger = logging.getLogger("orliterp.events")
+
+CHANNEL = "orliterp_events"
+NOTIFY_PAYLOAD_LIMIT = 7900 # Postgres caps NOTIFY payloads at 8000 bytes
+REPLAY_BUFFER_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 500
+RECONNECT_DELAY = 5
+
+# Topics clients can subscribe to
+TOPICS = ("inventory_levels", "stock_movements", "orders", "manufacturing_orders", "bill_of_materials", "material_consumption")
+
+async def publish(db: AsyncSession, topic: str, op: str, row_id: Any, data: Any = None):
+    """Queue a change event on the current transaction (sent on commit)."""
+    event = {"topic": topic, "op": op, "id": row_id}
+    if data is not None:
+        event["data"] = jsonable_encoder(data)
+    payload = json.dumps(event, separators=(",", ":"))
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        # Too big to push; clients re-read the row by id
+        payload = json.dumps({"topic": topic, "op": op, "id": row_id}, separators=(",", ":"))
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+async def publish_many(db: AsyncSession, topic: str, op: str, row_ids: Iterable[Any]):
+    """Id-only events for bulk writes, sent with a single statement."""
+    payloads = [json.dumps({"topic": topic, "op": op, "id": row_id}, separators=(",", ":")) for row_id in row_ids]
+    if payloads:
+        await db.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": CHANNEL, "payloads": payloads},
+        )
+
+def _listen_dsn() -> str:
+    return DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+class EventBroker:
+    def __init__(self):
+        # Event ids are "<boot id>-<sequence>", so a client reconnecting to a
+        # different worker is told to resync instead of getting a bad replay
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._buffer: Deque[Tuple[int, str, str]] = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self._subscribers: Dict[asyncio.Queue, Set[str]] = {}
+        self._connection: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+    async def _supervise(self):
+        while not self._stopping:
+            try:
+                self._connection = await asyncpg.connect(_listen_dsn())
+                await self._connection.add_listener(CHANNEL, self._on_notify)
+                while not self._connection.is_closed():
+                    await asyncio.sleep(RECONNECT_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event listener connection failed")
+            # Events may have been missed while disconnected
+            self._broadcast("resync", "{}", None)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            topic = json.loads(payload)["topic"]
+        except (ValueError, KeyError):
+            return
+        self._broadcast(topic, payload, topic)
+
+    def _broadcast(self, event: str, payload: str, topic: Optional[str]):
+        self._sequence += 1
+        message = (self._sequence, event, payload)
+        if topic is not None:
+            self._buffer.append(message)
+        for queue, topics in list(self._subscribers.items()):
+            if topic is not None and topic not in topics:
+                continue
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: unsubscribe it; its stream notices and asks it to resync
+                self._subscribers.pop(queue, None)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self._subscribers
+
+    def event_id(self, sequence: int) -> str:
+        return f"{self.boot_id}-{sequence}"
+
+    def replay(self, last_event_id: Optional[str], topics: Set[str]):
+        """Buffered events after last_event_id, or None if they can't be served."""
+        if not last_event_id:
+            return []
+        boot_id, _, sequence = last_event_id.partition("-")
+        if boot_id != self.boot_id or not sequence.isdigit():
+            return None
+        after = int(sequence)
+        if self._buffer and self._buffer[0][0] > after + 1:
+            return None # fell out of the buffer
+        return [m for m in self._buffer if m[0] > after and m[1] in topics]
+
+    @asynccontextmanager
+    async def subscribe(self, topics: Iterable[str]):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[queue] = set(topics)
+        try:
+            yield queue
+        finally:
+            self._subscribers.pop(queue, None)
+
+broker = EventBroker()
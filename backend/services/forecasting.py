@@ -0,0 +1,211 @@
+import math
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+from typing import Dict, Optional, Tuple
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import Date, Integer, cast, delete, func, insert, literal, or_, text, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models import orders as order_models
+from services.events import publish_many
+from services.inventory import resolve_location
+from services.jobs import job_handler, schedule_daily
+from services.partitions import with_archive
+
+# Demand forecasting and forecast-driven reorder points.
+#
+# Demand per (item, location) is what sales orders asked for (by order
+# date, whether shipped yet or not) plus every other outbound movement
+# (production issues, manual issues); customer shipments are already
+# counted through their orders, count adjustments and transfers are not
+# demand. One grouped query sums it into day or week buckets over
+# FORECAST_HISTORY_DAYS and the rows become a series x bucket NumPy matrix.
+#
+# Three models are fitted to every series at once with array math: moving
+# average over FORECAST_WINDOW_DAYS, simple exponential smoothing (a dot
+# product with the decaying weights) and seasonal naive (the last week of
+# days, or the last year of weeks). Each is backtested on the last
+# FORECAST_HOLDOUT_DAYS and every series keeps the one with the lowest
+# mean absolute error; its error sets the safety stock for
+# FORECAST_SERVICE_LEVEL over FORECAST_LEAD_TIME_DAYS:
+#   reorder point = lead time demand + z x RMSE x sqrt(lead time buckets)
+#   max level     = reorder point + demand over FORECAST_REVIEW_DAYS
+# Forecasts replace the previous run's in demand_forecasts; inventory
+# levels flagged auto_reorder take the reorder point and max level, so
+# replenishment (which runs after the nightly forecast) orders by them.
+
+FORECAST_SCHEDULE = os.getenv("FORECAST_SCHEDULE", "01:00") # UTC, empty to disable
+FORECAST_BUCKET = os.getenv("FORECAST_BUCKET", "week")
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", 728))
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", 56))
+FORECAST_HOLDOUT_DAYS = int(os.getenv("FORECAST_HOLDOUT_DAYS", 56))
+FORECAST_SMOOTHING = float(os.getenv("FORECAST_SMOOTHING", 0.3)) # alpha
+FORECAST_LEAD_TIME_DAYS = int(os.getenv("FORECAST_LEAD_TIME_DAYS", 14))
+FORECAST_REVIEW_DAYS = int(os.getenv("FORECAST_REVIEW_DAYS", 7))
+FORECAST_SERVICE_LEVEL = float(os.getenv("FORECAST_SERVICE_LEVEL", 0.95))
+FORECAST_LOCK_KEY = 7_340_006 # pg advisory lock id
+
+# Bucket length and season, in days and buckets
+BUCKETS = {"day": (1, 7), "week": (7, 52)}
+MODELS = ("moving_average", "exponential_smoothing", "seasonal_naive")
+
+# Outbound movements that are not demand of their own
+NOT_DEMAND = ("customer", "cycle_count")
+
+async def demand_matrix(db: AsyncSession, bucket: str, today: date) -> Tuple[np.ndarray, np.ndarray]:
+    """(keys, demand): keys is an (n, 2) array of (item_id, location_id),
+    demand an (n, buckets) matrix, oldest bucket first, ending yesterday."""
+    period, _ = BUCKETS[bucket]
+    buckets = FORECAST_HISTORY_DAYS // period
+    start = today - timedelta(days=buckets * period)
+    default_id = await resolve_location(db, None)
+
+    movement = with_archive(models.StockMovement, start)
+    issues = (
+        select(movement.item_id, movement.location_id, cast(movement.date, Date).label("day"), movement.quantity)
+        .where(
+            movement.movement_type == "outbound",
+            or_(movement.beneficiary.is_(None), movement.beneficiary.not_in(NOT_DEMAND)),
+            movement.date >= start,
+            movement.date < today,
+        )
+    )
+    order, line = order_models.Order, order_models.OrderItem
+    ordered = (
+        select(line.item_id, func.coalesce(order.location_id, default_id), order.order_date, line.quantity)
+        .join(order, order.order_id == line.order_id)
+        .where(
+            order.order_type == "sales",
+            order.status != "cancelled",
+            order.order_date >= start,
+            order.order_date < today,
+        )
+    )
+    demand = union_all(issues, ordered).subquery("demand")
+    index = (cast(demand.c.day - literal(start, Date), Integer) // period).label("bucket")
+    result = await db.execute(
+        select(demand.c.item_id, demand.c.location_id, index, func.sum(demand.c.quantity))
+        .group_by(demand.c.item_id, demand.c.location_id, index)
+    )
+    rows = result.all()
+    if not rows:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, buckets))
+    data = np.array([(item_id, location_id, index) for item_id, location_id, index, _ in rows], dtype=np.int64)
+    quantities = np.array([float(quantity) for *_, quantity in rows])
+    keys, series = np.unique(data[:, :2], axis=0, return_inverse=True)
+    matrix = np.zeros((len(keys), buckets))
+    np.add.at(matrix, (series.reshape(-1), data[:, 2]), quantities)
+    return keys, matrix
+
+def _forecasts(history: np.ndarray, horizon: int, bucket: str) -> np.ndarray:
+    """(models, series, horizon) forecasts of every model for every series."""
+    period, season = BUCKETS[bucket]
+    n, length = history.shape
+    window = max(1, min(FORECAST_WINDOW_DAYS // period, length))
+    moving_average = history[:, -window:].mean(axis=1)
+
+    alpha = FORECAST_SMOOTHING
+    weights = alpha * (1 - alpha) ** np.arange(length - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (length - 1) # the first observation seeds the level
+    smoothed = history @ weights
+
+    season = min(season, length)
+    seasonal = history[:, -season:][:, np.arange(horizon) % season]
+
+    flat = np.stack([moving_average, smoothed])[:, :, None].repeat(horizon, axis=2)
+    return np.concatenate([flat, seasonal[None]], axis=0)
+
+def fit(history: np.ndarray, bucket: str) -> Dict[str, np.ndarray]:
+    """Choose a model per series by backtest and forecast with it."""
+    period, season = BUCKETS[bucket]
+    n, length = history.shape
+    holdout = max(1, FORECAST_HOLDOUT_DAYS // period)
+    if length - holdout < season:
+        raise HTTPException(status_code=422, detail="FORECAST_HISTORY_DAYS is too short for the holdout and the season")
+    backtest = _forecasts(history[:, :-holdout], holdout, bucket)
+    errors = backtest - history[None, :, -holdout:]
+    choice = np.abs(errors).mean(axis=2).argmin(axis=0)
+    rows = np.arange(n)
+    rmse = np.sqrt((errors[choice, rows] ** 2).mean(axis=1))
+
+    lead_buckets = FORECAST_LEAD_TIME_DAYS / period
+    horizon = max(1, math.ceil(lead_buckets))
+    forecast = _forecasts(history, horizon, bucket)[choice, rows]
+    per_day = np.maximum(forecast.mean(axis=1), 0) / period
+    z = NormalDist().inv_cdf(FORECAST_SERVICE_LEVEL)
+    safety = z * rmse * math.sqrt(lead_buckets)
+    reorder_point = per_day * FORECAST_LEAD_TIME_DAYS + safety
+    return {
+        "model": choice,
+        "demand_per_day": per_day,
+        "error": rmse,
+        "safety_stock": safety,
+        "reorder_point": reorder_point,
+        "max_level": reorder_point + per_day * FORECAST_REVIEW_DAYS,
+    }
+
+def _quantity(value: float) -> Decimal:
+    return Decimal(f"{value:.3f}")
+
+async def run_forecast(db: AsyncSession, bucket: str = FORECAST_BUCKET, today: Optional[date] = None) -> dict:
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=422, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": FORECAST_LOCK_KEY})
+    keys, history = await demand_matrix(db, bucket, today or datetime.utcnow().date())
+    fitted = fit(history, bucket) if len(keys) else {"model": np.zeros(0, dtype=np.int64)}
+
+    forecast = models.DemandForecast
+    await db.execute(delete(forecast))
+    now = datetime.utcnow()
+    if len(keys):
+        columns = ("demand_per_day", "error", "safety_stock", "reorder_point", "max_level")
+        values = {column: np.round(fitted[column], 3).tolist() for column in columns}
+        await db.execute(insert(forecast), [
+            {
+                "item_id": int(item_id),
+                "location_id": int(location_id),
+                "bucket": bucket,
+                "model": MODELS[fitted["model"][i]],
+                **{column: _quantity(values[column][i]) for column in columns},
+                "computed_at": now,
+            }
+            for i, (item_id, location_id) in enumerate(keys.tolist())
+        ])
+
+    # Levels on forecast-driven reordering follow the new forecasts
+    level = models.InventoryLevel
+    result = await db.execute(
+        update(level)
+        .where(
+            level.auto_reorder.is_(True),
+            forecast.item_id == level.item_id,
+            forecast.location_id == level.location_id,
+            or_(level.reorder_point != forecast.reorder_point, level.max_level != forecast.max_level),
+        )
+        .values(reorder_point=forecast.reorder_point, max_level=forecast.max_level)
+        .returning(level.inventory_id)
+        .execution_options(synchronize_session=False)
+    )
+    level_ids = list(result.scalars())
+    await publish_many(db, "inventory_levels", "update", level_ids)
+    counts = np.bincount(fitted["model"], minlength=len(MODELS))
+    return {
+        "bucket": bucket,
+        "series": len(keys),
+        "models": {name: int(count) for name, count in zip(MODELS, counts)},
+        "levels_updated": len(level_ids),
+    }
+
+@job_handler("demand_forecast", max_attempts=2)
+async def forecast_job(ctx):
+    await ctx.progress(0, "Forecasting demand", force=True)
+    result = await run_forecast(ctx.db, bucket=ctx.params.get("bucket", FORECAST_BUCKET))
+    await ctx.db.commit()
+    return result
+
+if FORECAST_SCHEDULE:
+    schedule_daily("demand_forecast", FORECAST_SCHEDULE)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from database import SessionLocal
+from models import idempotency as models
+from services.jobs import job_handler, schedule_daily
+
+# Idempotency-Key store.
+#
+# One row per (caller, key), claimed with INSERT ... ON CONFLICT DO NOTHING
+# so exactly one request per key runs, in whichever worker receives it.
+# The first response is stored and replayed to every retry until the row
+# expires after IDEMPOTENCY_TTL seconds. Rows are keyed by fixed-size
+# hashes, so the store stays compact whatever the keys and payloads look
+# like; expired rows are taken over by the next claim and purged daily.
+# An in-progress claim only lives for IDEMPOTENCY_LEASE seconds, so a
+# request whose worker died does not block its key for the whole TTL.
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE", 300)) # longer than the client timeout
+IDEMPOTENCY_PURGE_SCHEDULE = os.getenv("IDEMPOTENCY_PURGE_SCHEDULE", "03:30") # UTC, empty to disable
+
+def digest(*parts: bytes) -> bytes:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.digest()
+
+async def claim(key_hash: bytes, request_hash: bytes) -> Optional[models.IdempotencyKey]:
+    """Claim a key for this request. Returns None when claimed, else the
+    existing row (in progress or completed) for the caller to act on."""
+    table = models.IdempotencyKey.__table__
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=IDEMPOTENCY_LEASE)
+    async with SessionLocal() as session:
+        claimed = await session.scalar(
+            pg_insert(table)
+            .values(key_hash=key_hash, request_hash=request_hash, status="in_progress", created_at=now, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=["key_hash"],
+                set_={"request_hash": request_hash, "status": "in_progress", "status_code": None,
+                      "headers": None, "body": None, "created_at": now, "expires_at": expires_at},
+                where=table.c.expires_at < now, # take over expired keys only
+            )
+            .returning(table.c.key_hash)
+        )
+        await session.commit()
+        if claimed is not None:
+            return None
+        return await lookup(key_hash, session)
+
+async def lookup(key_hash: bytes, session=None) -> Optional[models.IdempotencyKey]:
+    if session is None:
+        async with SessionLocal() as session:
+            return await lookup(key_hash, session)
+    result = await session.execute(select(models.IdempotencyKey).where(models.IdempotencyKey.key_hash == key_hash))
+    return result.scalars().first()
+
+async def complete(key_hash: bytes, status_code: int, headers: List[Tuple[str, str]], body: bytes):
+    async with SessionLocal() as session:
+        await session.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key_hash == key_hash)
+            .values(
+                status="completed",
+                status_code=status_code,
+                headers=headers,
+                body=body,
+                expires_at=datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL),
+            )
+        )
+        await session.commit()
+
+async def release(key_hash: bytes):
+    """Forget a claim whose request failed, so a retry runs it again."""
+    async with SessionLocal() as session:
+        await session.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.key_hash == key_hash))
+        await session.commit()
+
+@job_handler("idempotency_purge", max_attempts=2)
+async def purge_job(ctx):
+    await ctx.progress(0, "Purging expired idempotency keys", force=True)
+    result = await ctx.db.execute(
+        delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < datetime.utcnow())
+    )
+    await ctx.db.commit()
+    return {"deleted": result.rowcount}
+
+if IDEMPOTENCY_PURGE_SCHEDULE:
+    schedule_daily("idempotency_purge", IDEMPOTENCY_PURGE_SCHEDULE)
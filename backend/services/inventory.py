@@ -0,0 +1,130 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Integer, and_, column, func, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models.types import Quantity
+from services.events import publish
+
+# Stock levels are kept per (item, location). All level changes go through
+# apply_stock_delta, which folds any number of deltas into one upsert, so a
+# movement, a transfer or a bulk posting is a single statement against
+# inventory_levels whatever its size.
+
+# Effect of each movement type on on_hand / available
+MOVEMENT_SIGNS = {"inbound": 1, "transfer_in": 1, "outbound": -1, "transfer_out": -1}
+
+_default_location_id: Optional[int] = None
+
+async def default_location_id(db: AsyncSession) -> int:
+    global _default_location_id
+    if _default_location_id is None:
+        location_id = await db.scalar(
+            select(models.Location.location_id)
+            .where(models.Location.is_default.is_(True))
+            .order_by(models.Location.location_id)
+            .limit(1)
+        )
+        if location_id is None:
+            raise HTTPException(status_code=422, detail="No default location configured")
+        _default_location_id = location_id
+    return _default_location_id
+
+def reset_default_location():
+    global _default_location_id
+    _default_location_id = None
+
+async def resolve_location(db: AsyncSession, location_id: Optional[int]) -> int:
+    return location_id if location_id is not None else await default_location_id(db)
+
+def lines_table(lines: Dict[int, Decimal], name: str = "wanted", key: str = "item_id"):
+    """(item_id, qty) pairs as a FROM clause: unnest() over two typed arrays,
+    so any number of lines costs two bind parameters."""
+    item_ids, quantities = zip(*sorted(lines.items()))
+    return func.unnest(
+        literal(list(item_ids), ARRAY(Integer)),
+        literal(list(quantities), ARRAY(Quantity)),
+    ).table_valued(column(key, Integer), column("qty", Quantity)).render_derived(name=name)
+
+def movement_delta(movement_type: str, quantity) -> Decimal:
+    sign = MOVEMENT_SIGNS.get(movement_type)
+    if sign is None:
+        raise HTTPException(status_code=422, detail=f"Unknown movement type: {movement_type}")
+    return sign * Decimal(quantity)
+
+async def apply_stock_delta(
+    db: AsyncSession,
+    deltas: Iterable[Tuple[int, int, Decimal, Decimal]],
+) -> List[dict]:
+    """Add (item_id, location_id, on_hand delta, available delta) to stock levels.
+
+    Missing level rows are created. Returns the updated rows as dicts.
+    """
+    merged: Dict[Tuple[int, int], List[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for item_id, location_id, on_hand, available in deltas:
+        totals = merged[(item_id, location_id)]
+        totals[0] += on_hand
+        totals[1] += available
+    if not merged:
+        return []
+
+    table = models.InventoryLevel.__table__
+    statement = pg_insert(table).values([
+        {"item_id": item_id, "location_id": location_id, "on_hand": on_hand, "available": available}
+        for (item_id, location_id), (on_hand, available) in sorted(merged.items())
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=["item_id", "location_id"],
+        set_={
+            "on_hand": table.c.on_hand + statement.excluded.on_hand,
+            "available": table.c.available + statement.excluded.available,
+        },
+    ).returning(*table.c)
+    result = await db.execute(statement)
+    return [dict(row) for row in result.mappings()]
+
+async def publish_levels(db: AsyncSession, rows: Iterable[dict]):
+    for row in rows:
+        await publish(db, "inventory_levels", "update", row["inventory_id"], row)
+
+async def take_stock(db: AsyncSession, location_id: int, lines: Dict[int, Decimal], on_hand: bool = True) -> List[dict]:
+    """Decrement available (and on_hand unless on_hand=False, as for
+    reservations) at a location where enough is available.
+
+    One conditional UPDATE for all lines, so concurrent takers can never
+    drive a level negative. Items missing from the returned rows could NOT
+    be taken (they are left untouched); callers roll back in that case.
+    """
+    if not lines:
+        return []
+    wanted = lines_table(lines)
+    level = models.InventoryLevel
+    qty = wanted.c.qty
+    result = await db.execute(
+        update(level)
+        .where(
+            level.location_id == location_id,
+            level.item_id == wanted.c.item_id,
+            level.available >= qty,
+        )
+        .values(available=level.available - qty, **({"on_hand": level.on_hand - qty} if on_hand else {}))
+        .returning(*level.__table__.c)
+        .execution_options(synchronize_session=False)
+    )
+    return [dict(row) for row in result.mappings()]
+
+async def low_stock_by_location(db: AsyncSession) -> List[dict]:
+    level = models.InventoryLevel
+    location = models.Location
+    result = await db.execute(
+        select(location.location_id, location.code, func.count(level.inventory_id).label("low_stock_items"))
+        .outerjoin(level, and_(level.location_id == location.location_id, level.available <= level.reorder_point))
+        .group_by(location.location_id, location.code)
+        .order_by(location.code)
+    )
+    return [dict(row) for row in result.mappings()]
@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import exists, func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import accounting as models
+from models import orders as order_models
+from services.numbering import numbering
+from services.jobs import job_handler
+from services.ledger import post_invoices
+
+def _uninvoiced_delivered_orders():
+    return (
+        order_models.Order.order_type == "sales",
+        order_models.Order.status == "delivered",
+        ~exists().where(models.Invoice.order_id == order_models.Order.order_id),
+    )
+
+async def invoice_delivered_orders(
+    db: AsyncSession,
+    issue_date: Optional[date] = None,
+    due_days: int = 30,
+    batch_size: int = 1000,
+    on_batch: Optional[Callable[[int], Awaitable[None]]] = None,
+):
+    """Invoice every delivered sales order that has no invoice yet.
+
+    Works in batches: one locking SELECT, one multi-row INSERT into invoices
+    and one into accounts_receivable per batch, committed batch by batch.
+    Orders are locked with SKIP LOCKED, so two concurrent runs split the
+    work. The lock alone does not recheck the no-invoice condition (a run
+    can lock orders another run has just invoiced), so the insert skips
+    orders that already have one through the unique order_id index.
+    """
+    issue_date = issue_date or date.today()
+    due_date = issue_date + timedelta(days=due_days)
+    invoice_ids = []
+
+    while True:
+        result = await db.execute(
+            select(
+                order_models.Order.order_id,
+                order_models.Order.customer_id,
+                order_models.Order.total_amount,
+                order_models.Order.tax_total,
+                order_models.Order.discount_total,
+            )
+            .where(*_uninvoiced_delivered_orders())
+            .order_by(order_models.Order.order_id)
+            .limit(batch_size)
+            .with_for_update(of=order_models.Order, skip_locked=True)
+        )
+        orders = result.all()
+        if not orders:
+            break
+
+        numbers = await numbering.allocate(db, "invoice", len(orders))
+        result = await db.execute(
+            pg_insert(models.Invoice)
+            .on_conflict_do_nothing(index_elements=["order_id"])
+            .returning(models.Invoice.order_id, models.Invoice.invoice_id),
+            [
+                {
+                    "invoice_number": number,
+                    "order_id": order.order_id,
+                    "issue_date": issue_date,
+                    "amount": order.total_amount,
+                    "taxes": order.tax_total or 0,
+                    "discount": order.discount_total or 0,
+                    "status": "unpaid",
+                }
+                for order, number in zip(orders, numbers)
+            ],
+        )
+        created = dict(result.all())
+        # Orders a concurrent run invoiced first are skipped; their numbers stay unused
+        kept = [(order, number) for order, number in zip(orders, numbers) if order.order_id in created]
+        if not kept:
+            await db.commit()
+            continue
+        orders, numbers = zip(*kept)
+        batch_ids = [created[order.order_id] for order in orders]
+        await post_invoices(db, [
+            {
+                "invoice_id": invoice_id,
+                "invoice_number": number,
+                "issue_date": issue_date,
+                "amount": order.total_amount,
+                "taxes": order.tax_total or 0,
+                "order_type": "sales",
+            }
+            for order, number, invoice_id in zip(orders, numbers, batch_ids)
+        ])
+        await db.execute(
+            insert(models.AccountsReceivable),
+            [
+                {
+                    "customer_id": order.customer_id,
+                    "invoice_id": invoice_id,
+                    "due_date": due_date,
+                    "total_amount": order.total_amount,
+                    "paid_amount": 0,
+                    "status": "due",
+                }
+                for order, invoice_id in zip(orders, batch_ids)
+            ],
+        )
+        await db.commit()
+        invoice_ids.extend(batch_ids)
+        if on_batch is not None:
+            await on_batch(len(invoice_ids))
+
+    return {"invoices_created": len(invoice_ids), "invoice_ids": invoice_ids}
+
+@job_handler("invoice_delivered_orders", max_attempts=3)
+async def invoice_delivered_orders_job(ctx):
+    params = ctx.params
+    issue_date = date.fromisoformat(params["issue_date"]) if params.get("issue_date") else None
+    total = await ctx.db.scalar(select(func.count(order_models.Order.order_id)).where(*_uninvoiced_delivered_orders()))
+    await ctx.progress(0, f"{total} orders to invoice", force=True)
+
+    async def report(done):
+        await ctx.progress(100.0 * done / max(total, 1), f"{done} of {total} orders invoiced")
+
+    return await invoice_delivered_orders(
+        ctx.db,
+        issue_date=issue_date,
+        due_days=int(params.get("due_days", 30)),
+        on_batch=report,
+    )
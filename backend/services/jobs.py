@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+import time
+import traceback
+from datetime import datetime, time as dtime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database import SessionLocal
+from models import jobs as models
+
+# In-process background jobs backed by the jobs table.
+#
+# Every API worker runs a JobRunner. Runners claim queued jobs with
+# FOR UPDATE SKIP LOCKED, so several workers share one queue without
+# double-running a job, and each runner executes at most JOB_CONCURRENCY
+# jobs at a time. Handlers report progress through their JobContext, which
+# also makes cancellation cooperative: a cancel request is noticed at the
+# next progress() call. Jobs whose worker died are re-queued once their
+# heartbeat is older than JOB_STALE_AFTER seconds.
+#
+# Daily schedules (schedule_daily) are checked during maintenance. The
+# check holds a transaction-level advisory lock, so however many workers
+# run, each scheduled job is enqueued once per day; a run missed while
+# the app was down is enqueued as soon as a worker is up again.
+
+logger = logging.getLogger("orliterp.jobs")
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 120))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", 30))
+PROGRESS_WRITE_INTERVAL = 0.5
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+SCHEDULER_LOCK_KEY = 7_340_001 # pg advisory lock id
+SCHEDULER_USER = "scheduler"
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    def __init__(self, job_id: int, params: Dict[str, Any], db: AsyncSession):
+        self.job_id = job_id
+        self.params = params or {}
+        self.db = db
+        self._last_write = 0.0
+
+    async def progress(self, percent: float, message: Optional[str] = None, force: bool = False):
+        """Record progress and raise JobCancelled if a cancel was requested.
+
+        Uses its own short session so progress is visible while the
+        handler's transaction is still open. Writes are throttled.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_WRITE_INTERVAL:
+            return
+        self._last_write = now
+        async with SessionLocal() as session:
+            result = await session.execute(
+                update(models.Job)
+                .where(models.Job.job_id == self.job_id)
+                .values(progress=min(max(percent, 0.0), 100.0), message=message, heartbeat_at=datetime.utcnow())
+                .returning(models.Job.cancel_requested)
+            )
+            cancel_requested = result.scalar()
+            await session.commit()
+        if cancel_requested:
+            raise JobCancelled()
+
+Handler = Callable[[JobContext], Awaitable[Any]]
+
+# job type -> (handler, default max attempts)
+HANDLERS: Dict[str, tuple] = {}
+
+def job_handler(job_type: str, max_attempts: int = 1):
+    def register(func: Handler):
+        HANDLERS[job_type] = (func, max_attempts)
+        return func
+    return register
+
+# job type -> (UTC time of day, params)
+SCHEDULES: Dict[str, Tuple[dtime, Dict[str, Any]]] = {}
+
+def schedule_daily(job_type: str, at: str, params: Optional[Dict[str, Any]] = None):
+    """Run job_type every day at `at` ("HH:MM", UTC)."""
+    hour, minute = (int(part) for part in at.split(":"))
+    SCHEDULES[job_type] = (dtime(hour, minute), params or {})
+
+async def enqueue(db: AsyncSession, job_type: str, params: Optional[Dict[str, Any]] = None,
+                  max_attempts: Optional[int] = None, created_by: Optional[str] = None,
+                  run_after: Optional[datetime] = None) -> models.Job:
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    job = models.Job(
+        job_type=job_type,
+        params=params or {},
+        max_attempts=max_attempts or HANDLERS[job_type][1],
+        created_by=created_by,
+        run_after=run_after or datetime.utcnow(),
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    runner.wake()
+    return job
+
+class JobRunner:
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        # Built in start(), inside the server's event loop (see numbering.py)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._loop_task is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        self.wake()
+        if self._loop_task is not None:
+            await self._loop_task
+            self._loop_task = None
+        # Interrupted jobs go back to the queue for the next worker
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def cancel_local(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def _run(self):
+        last_maintenance = 0.0
+        while not self._stopping:
+            try:
+                if time.monotonic() - last_maintenance >= JOB_POLL_INTERVAL:
+                    await self._maintain()
+                    last_maintenance = time.monotonic()
+                claimed = False
+                if not self._semaphore.locked():
+                    claimed = await self._claim_one()
+                if claimed:
+                    continue
+            except Exception:
+                logger.exception("Job runner iteration failed")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _maintain(self):
+        async with SessionLocal() as session:
+            now = datetime.utcnow()
+            if self._tasks:
+                await session.execute(
+                    update(models.Job)
+                    .where(models.Job.job_id.in_(list(self._tasks)))
+                    .values(heartbeat_at=now)
+                )
+            await session.execute(
+                update(models.Job)
+                .where(
+                    models.Job.status == "running",
+                    models.Job.heartbeat_at < now - timedelta(seconds=JOB_STALE_AFTER),
+                )
+                .values(status="queued", run_after=now, message="Re-queued after worker loss")
+            )
+            await session.commit()
+        if SCHEDULES:
+            await self._enqueue_scheduled()
+
+    async def _enqueue_scheduled(self):
+        async with SessionLocal() as session:
+            locked = await session.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SCHEDULER_LOCK_KEY})
+            if not locked:
+                return # another worker is on it
+            now = datetime.utcnow()
+            for job_type, (at, params) in SCHEDULES.items():
+                due = datetime.combine(now.date(), at)
+                if now < due:
+                    continue
+                already = await session.scalar(
+                    select(models.Job.job_id)
+                    .where(
+                        models.Job.job_type == job_type,
+                        models.Job.created_by == SCHEDULER_USER,
+                        models.Job.created_at >= due,
+                    )
+                    .limit(1)
+                )
+                if already is None:
+                    session.add(models.Job(
+                        job_type=job_type,
+                        params=params,
+                        max_attempts=HANDLERS[job_type][1],
+                        created_by=SCHEDULER_USER,
+                        created_at=now,
+                        run_after=now,
+                    ))
+            await session.commit()
+
+    async def _claim_one(self) -> bool:
+        async with SessionLocal() as session:
+            now = datetime.utcnow()
+            next_job = (
+                select(models.Job.job_id)
+                .where(models.Job.status == "queued", models.Job.run_after <= now)
+                .order_by(models.Job.run_after, models.Job.job_id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(models.Job)
+                .where(models.Job.job_id == next_job)
+                .values(status="running", attempts=models.Job.attempts + 1, started_at=now, heartbeat_at=now, error=None)
+                .returning(models.Job.job_id, models.Job.job_type, models.Job.params, models.Job.attempts, models.Job.max_attempts)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            await session.commit()
+        if row is None:
+            return False
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._execute(row.job_id, row.job_type, row.params, row.attempts, row.max_attempts))
+        self._tasks[row.job_id] = task
+        return True
+
+    async def _execute(self, job_id, job_type, params, attempts, max_attempts):
+        values: Dict[str, Any]
+        try:
+            handler = HANDLERS.get(job_type)
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type {job_type}")
+            async with SessionLocal() as db:
+                ctx = JobContext(job_id, params, db)
+                result = await handler[0](ctx)
+            values = {"status": "succeeded", "result": result, "progress": 100.0}
+        except (JobCancelled, asyncio.CancelledError):
+            if self._stopping:
+                values = {"status": "queued", "run_after": datetime.utcnow(), "message": "Interrupted by shutdown"}
+            else:
+                values = {"status": "cancelled", "message": "Cancelled"}
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job_id, job_type)
+            error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+            if attempts < max_attempts:
+                delay = JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+                values = {"status": "queued", "error": error, "run_after": datetime.utcnow() + timedelta(seconds=delay)}
+            else:
+                values = {"status": "failed", "error": error}
+        finally:
+            self._tasks.pop(job_id, None)
+            self._semaphore.release()
+            self.wake()
+
+        if values["status"] in TERMINAL_STATUSES:
+            values["finished_at"] = datetime.utcnow()
+        async with SessionLocal() as session:
+            await session.execute(update(models.Job).where(models.Job.job_id == job_id).values(**values))
+            await session.commit()
+
+runner = JobRunner()
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[models.Job]:
+    result = await db.execute(select(models.Job).filter(models.Job.job_id == job_id))
+    return result.scalars().first()
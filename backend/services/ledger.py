@@ -0,0 +1,277 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, insert, not_, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from models import accounting as models
+from services.numbering import numbering
+from services.pricing import ZERO, to_decimal
+
+# General ledger posting engine.
+#
+# Business documents post balanced journal entries in the transaction
+# that writes them, through post_entries: one multi-row insert for the
+# entries, one for their lines, and one upsert that adds the lines to
+# account_balances, the debit/credit totals per account and month. Reports
+# read account_balances (accounts x months rows), never the journal.
+# Posted entries are never edited; corrections are reversing entries.
+
+# Accounts the engine posts to, by role
+POSTING_ACCOUNTS = {
+    "cash": "1000",
+    "receivables": "1200",
+    "inventory": "1300",
+    "vat_receivable": "1400",
+    "payables": "2000",
+    "grni": "2100", # goods received not invoiced
+    "vat_payable": "2200",
+    "revenue": "4000",
+    "cogs": "5000",
+    "inventory_adjustments": "5100", # count gains and losses
+}
+
+ACCOUNT_TYPES = ("asset", "liability", "equity", "revenue", "expense")
+DEBIT_NORMAL = ("asset", "expense")
+
+# (account role, debit, credit)
+Line = Tuple[str, Decimal, Decimal]
+
+_account_ids: Dict[str, int] = {}
+
+def reset_account_cache():
+    _account_ids.clear()
+
+def period_of(day: date) -> date:
+    return day.replace(day=1)
+
+async def _posting_account_ids(db: AsyncSession) -> Dict[str, int]:
+    if len(_account_ids) < len(POSTING_ACCOUNTS):
+        result = await db.execute(
+            select(models.Account.code, models.Account.account_id)
+            .where(models.Account.code.in_(list(POSTING_ACCOUNTS.values())))
+        )
+        codes = dict(result.all())
+        missing = sorted(set(POSTING_ACCOUNTS.values()) - set(codes))
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Accounts missing from the chart of accounts: {', '.join(missing)}")
+        _account_ids.update({role: codes[code] for role, code in POSTING_ACCOUNTS.items()})
+    return _account_ids
+
+async def post_entries(db: AsyncSession, entries: Sequence[dict]) -> List[int]:
+    """Post journal entries: dicts with entry_date, description, source_type,
+    source_id, reversal_of and lines [(account_id, debit, credit[, description])].
+    Zero lines are dropped and entries left empty are skipped."""
+    rows, line_sets = [], []
+    for entry in entries:
+        lines = [
+            (account_id, to_decimal(debit), to_decimal(credit), note[0] if note else None)
+            for account_id, debit, credit, *note in entry["lines"]
+            if debit or credit
+        ]
+        if not lines:
+            continue
+        if sum(line[1] for line in lines) != sum(line[2] for line in lines):
+            raise HTTPException(status_code=422, detail="Journal entry is not balanced")
+        rows.append({key: entry.get(key) for key in ("entry_date", "description", "source_type", "source_id", "reversal_of")})
+        line_sets.append(lines)
+    if not rows:
+        return []
+
+    numbers = await numbering.allocate(db, "journal_entry", len(rows))
+    for row, number in zip(rows, numbers):
+        row["entry_number"] = number
+    result = await db.execute(
+        insert(models.JournalEntry).returning(models.JournalEntry.entry_id, sort_by_parameter_order=True),
+        rows,
+    )
+    entry_ids = result.scalars().all()
+    await db.execute(insert(models.JournalLine), [
+        {"entry_id": entry_id, "account_id": account_id, "debit": debit, "credit": credit, "description": description}
+        for entry_id, lines in zip(entry_ids, line_sets)
+        for account_id, debit, credit, description in lines
+    ])
+
+    totals: Dict[Tuple[int, date], List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+    for row, lines in zip(rows, line_sets):
+        for account_id, debit, credit, _ in lines:
+            total = totals[(account_id, period_of(row["entry_date"]))]
+            total[0] += debit
+            total[1] += credit
+    table = models.AccountBalance.__table__
+    statement = pg_insert(table).values([
+        {"account_id": account_id, "period": period, "debit": debit, "credit": credit}
+        for (account_id, period), (debit, credit) in sorted(totals.items())
+    ])
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=["account_id", "period"],
+        set_={"debit": table.c.debit + statement.excluded.debit, "credit": table.c.credit + statement.excluded.credit},
+    ))
+    return entry_ids
+
+async def _post(db: AsyncSession, documents: Iterable[Tuple[str, int, date, str, List[Line]]]) -> List[int]:
+    """Post (source_type, source_id, date, description, lines by role)."""
+    documents = list(documents)
+    if not documents:
+        return []
+    accounts = await _posting_account_ids(db)
+    return await post_entries(db, [
+        {
+            "entry_date": entry_date,
+            "description": description,
+            "source_type": source_type,
+            "source_id": source_id,
+            "lines": [(accounts[role], debit, credit) for role, debit, credit in lines],
+        }
+        for source_type, source_id, entry_date, description, lines in documents
+    ])
+
+def _invoice_lines(amount: Decimal, taxes: Decimal, purchase: bool) -> List[Line]:
+    net = amount - taxes
+    if purchase:
+        return [("grni", net, ZERO), ("vat_receivable", taxes, ZERO), ("payables", ZERO, amount)]
+    return [("receivables", amount, ZERO), ("revenue", ZERO, net), ("vat_payable", ZERO, taxes)]
+
+async def post_invoices(db: AsyncSession, invoices: Sequence[dict]) -> List[int]:
+    """invoices: dicts with invoice_id, invoice_number, issue_date, amount,
+    taxes and order_type (sales when not linked to a purchase order)."""
+    return await _post(db, [
+        (
+            "invoice",
+            invoice["invoice_id"],
+            invoice["issue_date"] or date.today(),
+            f"Invoice {invoice['invoice_number']}",
+            _invoice_lines(to_decimal(invoice["amount"]), to_decimal(invoice["taxes"]), invoice.get("order_type") == "purchase"),
+        )
+        for invoice in invoices
+    ])
+
+async def post_payment(db: AsyncSession, payment_id: int, payment_date: Optional[date], amount, purchase: bool) -> List[int]:
+    amount = to_decimal(amount)
+    if purchase:
+        lines = [("payables", amount, ZERO), ("cash", ZERO, amount)]
+    else:
+        lines = [("cash", amount, ZERO), ("receivables", ZERO, amount)]
+    return await _post(db, [("payment", payment_id, payment_date or date.today(), f"Payment {payment_id}", lines)])
+
+async def post_stock_movements(db: AsyncSession, movements: Sequence[dict]) -> List[int]:
+    """Receipts: inventory against goods received not invoiced. Issues:
+    cost of goods sold against inventory. Count adjustments: inventory
+    against inventory adjustments. Transfers do not post."""
+    documents = []
+    for m in movements:
+        cost = to_decimal(m.get("total_cost"))
+        counted = m.get("beneficiary") == "cycle_count"
+        if m["movement_type"] == "inbound":
+            lines = [("inventory", cost, ZERO), ("inventory_adjustments" if counted else "grni", ZERO, cost)]
+        elif m["movement_type"] == "outbound":
+            lines = [("inventory_adjustments" if counted else "cogs", cost, ZERO), ("inventory", ZERO, cost)]
+        else:
+            continue
+        when = m.get("date")
+        documents.append((
+            "stock_movement",
+            m["movement_id"],
+            when.date() if when else date.today(),
+            f"Stock {m['movement_type']} {m['movement_id']}",
+            lines,
+        ))
+    return await _post(db, documents)
+
+async def reverse_source(db: AsyncSession, source_type: str, source_id: int, entry_date: Optional[date] = None) -> List[int]:
+    """Post reversing entries for everything a document posted that is not reversed yet."""
+    entry, line = models.JournalEntry, models.JournalLine
+    reversal = aliased(models.JournalEntry)
+    result = await db.execute(
+        select(entry.entry_id, entry.entry_number, line.account_id, line.debit, line.credit, line.description)
+        .join(line, line.entry_id == entry.entry_id)
+        .where(
+            entry.source_type == source_type,
+            entry.source_id == source_id,
+            entry.reversal_of.is_(None),
+            not_(exists().where(reversal.reversal_of == entry.entry_id)),
+        )
+        .order_by(entry.entry_id, line.line_id)
+    )
+    reversed_entries: Dict[int, dict] = {}
+    for entry_id, entry_number, account_id, debit, credit, description in result:
+        reversed_entry = reversed_entries.setdefault(entry_id, {
+            "entry_date": entry_date or date.today(),
+            "description": f"Reversal of {entry_number}",
+            "source_type": source_type,
+            "source_id": source_id,
+            "reversal_of": entry_id,
+            "lines": [],
+        })
+        reversed_entry["lines"].append((account_id, credit, debit, description))
+    return await post_entries(db, list(reversed_entries.values()))
+
+def _balance(account_type: str, debit: Decimal, credit: Decimal) -> Decimal:
+    return debit - credit if account_type in DEBIT_NORMAL else credit - debit
+
+async def _balances(db: AsyncSession, through: date, since: Optional[date] = None, account_types: Sequence[str] = ACCOUNT_TYPES) -> List[dict]:
+    account, balance = models.Account, models.AccountBalance
+    query = (
+        select(
+            account.account_id,
+            account.code,
+            account.name,
+            account.account_type,
+            func.sum(balance.debit).label("debit"),
+            func.sum(balance.credit).label("credit"),
+        )
+        .join(balance, balance.account_id == account.account_id)
+        .where(balance.period <= period_of(through), account.account_type.in_(list(account_types)))
+        .group_by(account.account_id, account.code, account.name, account.account_type)
+        .order_by(account.code)
+    )
+    if since is not None:
+        query = query.where(balance.period >= period_of(since))
+    rows = []
+    for row in (await db.execute(query)).mappings():
+        row = dict(row)
+        row["balance"] = _balance(row["account_type"], Decimal(row["debit"]), Decimal(row["credit"]))
+        rows.append(row)
+    return rows
+
+async def trial_balance(db: AsyncSession, period: date) -> dict:
+    lines = await _balances(db, period)
+    return {
+        "period": period_of(period),
+        "total_debit": sum((Decimal(l["debit"]) for l in lines), ZERO),
+        "total_credit": sum((Decimal(l["credit"]) for l in lines), ZERO),
+        "lines": lines,
+    }
+
+async def profit_and_loss(db: AsyncSession, from_period: date, to_period: date) -> dict:
+    lines = await _balances(db, to_period, since=from_period, account_types=("revenue", "expense"))
+    revenue = sum((l["balance"] for l in lines if l["account_type"] == "revenue"), ZERO)
+    expenses = sum((l["balance"] for l in lines if l["account_type"] == "expense"), ZERO)
+    return {
+        "from_period": period_of(from_period),
+        "to_period": period_of(to_period),
+        "revenue": revenue,
+        "expenses": expenses,
+        "net_income": revenue - expenses,
+        "lines": lines,
+    }
+
+async def balance_sheet(db: AsyncSession, period: date) -> dict:
+    lines = await _balances(db, period)
+    totals = defaultdict(Decimal)
+    for l in lines:
+        totals[l["account_type"]] += l["balance"]
+    # Profit not yet closed into equity
+    earnings = totals["revenue"] - totals["expense"]
+    return {
+        "period": period_of(period),
+        "assets": totals["asset"],
+        "liabilities": totals["liability"],
+        "equity": totals["equity"] + earnings,
+        "current_earnings": earnings,
+        "lines": [l for l in lines if l["account_type"] in ("asset", "liability", "equity")],
+    }
@@ -0,0 +1,159 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, func, insert, literal, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models import orders as order_models
+from services.partitions import with_archive
+
+# Lot and serial number traceability.
+#
+# Receipts, movements, reservations, consumption and manufacturing output
+# carry a lot_id. Completing a manufacturing order creates a lot of its
+# product and links every lot consumed into it (lot_links: parent went
+# into child), so lot_links is the genealogy graph. A trace is one
+# statement: a recursive CTE walks lot_links through the (parent, child)
+# or (child, parent) index, at most MAX_TRACE_DEPTH levels, and the lots
+# found are joined to stock movements through ix_stock_movements_lot:
+# forward to the sales shipments that left with them (recalls: which
+# customers got it), backward to the purchase receipts they came from.
+# Traces read archived movements unless `since` is within the open years.
+#
+# Sales lines and stock movements are of items, not products: a product
+# lot made by a manufacturing order is reached through lot_links (listed in
+# `lots`) but cannot be shipped, so a forward trace from a supplier lot
+# ends at the finished lots and reports only shipments of the item lots
+# themselves.
+
+MAX_TRACE_DEPTH = 50
+
+# Outbound movements that are not shipments: production issues stay inside
+# the genealogy, count losses never left the building
+NOT_SHIPPED = ("production", "cycle_count")
+
+async def resolve_lot(
+    db: AsyncSession,
+    lot_number: str,
+    item_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    create: bool = False,
+    supplier_id: Optional[int] = None,
+) -> models.Lot:
+    """The lot `lot_number` of an item or product, created when `create`."""
+    lot = models.Lot
+    owner = lot.item_id == item_id if item_id is not None else lot.product_id == product_id
+    db_lot = (await db.execute(select(lot).where(owner, lot.lot_number == lot_number))).scalars().first()
+    if db_lot is None:
+        if not create:
+            raise HTTPException(status_code=404, detail=f"Lot {lot_number} not found")
+        db_lot = models.Lot(lot_number=lot_number, item_id=item_id, product_id=product_id, supplier_id=supplier_id)
+        db.add(db_lot)
+        await db.flush()
+    return db_lot
+
+def check_serial(db_lot: Optional[models.Lot], quantity: Decimal):
+    if db_lot is not None and db_lot.tracking == "serial" and Decimal(quantity) != 1:
+        raise HTTPException(status_code=422, detail=f"Serial {db_lot.lot_number} moves one unit at a time")
+
+async def create_output_lots(db: AsyncSession, lots: Sequence[Tuple[int, int, str]]) -> dict:
+    """Create (mo_id, product_id, lot_number) lots for finished output.
+    Returns {mo_id: lot_id}; 409 when a lot number is taken."""
+    if not lots:
+        return {}
+    table = models.Lot.__table__
+    now = datetime.utcnow()
+    result = await db.execute(
+        pg_insert(table)
+        .on_conflict_do_nothing(index_elements=["product_id", "lot_number"])
+        .returning(table.c.mo_id, table.c.lot_id),
+        [
+            {"mo_id": mo_id, "product_id": product_id, "lot_number": lot_number, "tracking": "lot", "created_at": now}
+            for mo_id, product_id, lot_number in lots
+        ],
+    )
+    created = dict(result.all())
+    taken = sorted(lot_number for mo_id, _, lot_number in lots if mo_id not in created)
+    if taken:
+        raise HTTPException(status_code=409, detail=f"Lot numbers already used for these products: {taken}")
+    return created
+
+async def link_lots(db: AsyncSession, links: Iterable[Tuple[int, int, Optional[int], Decimal]]):
+    """Record (parent_lot_id, child_lot_id, mo_id, quantity) genealogy links."""
+    rows = [
+        {"parent_lot_id": parent, "child_lot_id": child, "mo_id": mo_id, "quantity": quantity}
+        for parent, child, mo_id, quantity in links
+    ]
+    if rows:
+        await db.execute(insert(models.LotLink), rows)
+
+def _genealogy(lot_id: int, forward: bool):
+    """(lot_id, depth) of every lot reachable from `lot_id`, itself at depth 0."""
+    link = models.LotLink
+    source, target = (link.parent_lot_id, link.child_lot_id) if forward else (link.child_lot_id, link.parent_lot_id)
+    traced = select(literal(lot_id).label("lot_id"), literal(0).label("depth")).cte("traced", recursive=True)
+    traced = traced.union(
+        select(target, traced.c.depth + 1)
+        .join(traced, source == traced.c.lot_id)
+        .where(traced.c.depth < MAX_TRACE_DEPTH)
+    )
+    return (
+        select(traced.c.lot_id, func.min(traced.c.depth).label("depth"))
+        .group_by(traced.c.lot_id)
+        .subquery("genealogy")
+    )
+
+async def trace(db: AsyncSession, lot_id: int, forward: bool = True, since: Optional[datetime] = None) -> dict:
+    genealogy = _genealogy(lot_id, forward)
+    lot = models.Lot
+    result = await db.execute(
+        select(lot, genealogy.c.depth)
+        .join(genealogy, genealogy.c.lot_id == lot.lot_id)
+        .order_by(genealogy.c.depth, lot.lot_id)
+    )
+    lots = [{**{c.key: getattr(row, c.key) for c in lot.__table__.c}, "depth": depth} for row, depth in result]
+
+    movement = with_archive(models.StockMovement, since)
+    order = order_models.Order
+    if forward:
+        kind = and_(movement.movement_type == "outbound", or_(movement.beneficiary.is_(None), movement.beneficiary.not_in(NOT_SHIPPED)))
+        order_type = "sales"
+    else:
+        kind = movement.movement_type == "inbound"
+        order_type = "purchase"
+    query = (
+        select(
+            movement.movement_id,
+            movement.date,
+            movement.movement_type,
+            movement.item_id,
+            movement.lot_id,
+            movement.quantity,
+            movement.reference_id,
+            order.order_id,
+            order.customer_id,
+            order.supplier_id,
+        )
+        .join(genealogy, genealogy.c.lot_id == movement.lot_id)
+        .outerjoin(order, and_(order.order_id == movement.reference_id, order.order_type == order_type))
+        .where(kind)
+        .order_by(movement.date, movement.movement_id)
+    )
+    if since is not None:
+        query = query.where(movement.date >= since)
+    movements = [dict(row) for row in (await db.execute(query)).mappings()]
+
+    return {
+        "lot_id": lot_id,
+        "direction": "forward" if forward else "backward",
+        "lots": lots,
+        "movements": movements,
+        "customer_ids": sorted({m["customer_id"] for m in movements if m["customer_id"] is not None}),
+        "supplier_ids": sorted(
+            {m["supplier_id"] for m in movements if m["supplier_id"] is not None}
+            | {l["supplier_id"] for l in lots if l["supplier_id"] is not None}
+        ),
+    }
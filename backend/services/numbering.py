@@ -0,0 +1,103 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Sequence, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Base
+
+# Server-side document numbers.
+#
+# Each document type has its own Postgres sequence whose INCREMENT is the
+# block size, so one nextval() reserves BLOCK_SIZE consecutive numbers for
+# this worker. Numbers are then handed out from memory: no row or table
+# locks, no MAX()+1 scans, and nextval() never blocks other sessions.
+# Numbers are unique and increase within a worker, but they are not
+# gapless: a restart drops the unused rest of the current block.
+
+BLOCK_SIZE = 50
+
+DOCUMENT_TYPES = {
+    # doc type: (prefix, table, column)
+    "sales_order": ("SO-", "orders", "order_number"),
+    "purchase_order": ("PO-", "orders", "order_number"),
+    "invoice": ("INV-", "invoices", "invoice_number"),
+    "manufacturing_order": ("MO-", "manufacturing_orders", "production_order_number"),
+    # Always server-assigned, so there is nothing to sync (table None)
+    "transfer": ("TR-", None, None),
+    "journal_entry": ("JE-", None, None),
+    "cycle_count": ("CC-", None, None),
+}
+NUMBER_WIDTH = 6
+
+SEQUENCES = {
+    doc_type: Sequence(f"{doc_type}_number_seq", increment=BLOCK_SIZE, metadata=Base.metadata)
+    for doc_type in DOCUMENT_TYPES
+}
+
+def format_number(doc_type: str, value: int) -> str:
+    prefix = DOCUMENT_TYPES[doc_type][0]
+    return f"{prefix}{value:0{NUMBER_WIDTH}d}"
+
+class DocumentNumbering:
+    def __init__(self):
+        # doc type -> (next value, end of block exclusive)
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        # Created lazily: on Python 3.9 asyncio primitives bind to the loop
+        # that exists when they are built, which at import time is not uvicorn's
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def allocate(self, db: AsyncSession, doc_type: str, count: int = 1) -> List[str]:
+        if count <= 0:
+            return []
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            values = []
+            start, end = self._blocks.get(doc_type, (0, 0))
+            take = min(count, end - start)
+            values.extend(range(start, start + take))
+            start += take
+
+            missing = count - len(values)
+            if missing:
+                # Fetch every block we still need in one round trip
+                blocks = -(-missing // BLOCK_SIZE)
+                result = await db.execute(
+                    text("SELECT nextval(:seq) FROM generate_series(1, :n)"),
+                    {"seq": SEQUENCES[doc_type].name, "n": blocks},
+                )
+                for (block_start,) in result:
+                    take = min(missing, BLOCK_SIZE)
+                    values.extend(range(block_start, block_start + take))
+                    missing -= take
+                    start, end = block_start + take, block_start + BLOCK_SIZE
+            self._blocks[doc_type] = (start, end)
+        return [format_number(doc_type, v) for v in values]
+
+    async def next(self, db: AsyncSession, doc_type: str) -> str:
+        (number,) = await self.allocate(db, doc_type)
+        return number
+
+    def reset(self):
+        self._blocks.clear()
+
+numbering = DocumentNumbering()
+
+async def sync_sequences(engine):
+    """Move sequences past numbers that clients typed in before numbering
+    was server-side. Runs once at startup, never on the allocation path."""
+    async with engine.begin() as conn:
+        for doc_type, (prefix, table, column) in DOCUMENT_TYPES.items():
+            if table is None:
+                continue
+            highest = await conn.scalar(text(
+                f"SELECT max(substring({column} from :pattern)::bigint) FROM {table}"
+            ), {"pattern": f"^{prefix}([0-9]{{1,18}})$"})
+            if highest is None:
+                continue
+            sequence = SEQUENCES[doc_type].name
+            # last_value is the start of the latest block handed out
+            current = await conn.scalar(text(
+                f"SELECT CASE WHEN is_called THEN last_value + {BLOCK_SIZE} - 1 ELSE 0 END FROM {sequence}"
+            ))
+            if current < highest:
+                await conn.execute(text("SELECT setval(:seq, :value)"), {"seq": sequence, "value": highest})
@@ -0,0 +1,213 @@
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from database import engine
+from models import hr as hr_models
+from models import inventory as inventory_models
+from services.jobs import job_handler, schedule_daily
+
+# Monthly range partitions for the append-only tables.
+#
+# stock_movements and attendance are partitioned on `date`, one partition
+# per month (<table>_pYYYY_MM), so date-filtered queries only scan the
+# months they ask for. Partitions are made PARTITION_PREMAKE_MONTHS ahead
+# by the daily partition_maintenance job, and on the first write into a
+# month that has none (backdated entries).
+#
+# A fiscal year closes ARCHIVE_AFTER_MONTHS after it ends. Writes dated in
+# a closed year are refused, and the job moves its partitions to
+# <table>_archive by detach/attach: catalog changes, no rows are copied.
+# List and report queries only read the live table unless their date range
+# starts before the first open fiscal year (with_archive). Archived years
+# older than PARTITION_RETENTION_YEARS are dropped; 0 keeps them forever.
+
+FISCAL_YEAR_START_MONTH = int(os.getenv("FISCAL_YEAR_START_MONTH", 1))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 3))
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", 3))
+PARTITION_RETENTION_YEARS = int(os.getenv("PARTITION_RETENTION_YEARS", 0))
+PARTITION_MAINTENANCE_SCHEDULE = os.getenv("PARTITION_MAINTENANCE_SCHEDULE", "00:15") # UTC, empty to disable
+
+PARTITION_LOCK_KEY = 7_340_003 # pg advisory lock id
+
+# live model -> archive table
+ARCHIVES = {
+    inventory_models.StockMovement: inventory_models.stock_movements_archive,
+    hr_models.Attendance: hr_models.attendance_archive,
+}
+PARTITIONED = {model.__tablename__: model for model in ARCHIVES}
+
+# (lower bound or None for MINVALUE, upper bound) of a partition
+Bounds = Tuple[Optional[date], date]
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+# table -> bounds of its live partitions, loaded on first use per worker
+_live: Dict[str, List[Bounds]] = {}
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+def month_start(day) -> date:
+    return _day(day).replace(day=1)
+
+def fiscal_year_start(day) -> date:
+    day = _day(day)
+    year = day.year if day.month >= FISCAL_YEAR_START_MONTH else day.year - 1
+    return date(year, FISCAL_YEAR_START_MONTH, 1)
+
+def open_from(today: Optional[date] = None) -> date:
+    """First day of the oldest fiscal year that is still open."""
+    return fiscal_year_start(add_months(today or datetime.utcnow().date(), -ARCHIVE_AFTER_MONTHS))
+
+def check_open(day):
+    """Refuse writes dated in a closed fiscal year."""
+    if day is not None and _day(day) < open_from():
+        raise HTTPException(status_code=409, detail=f"The fiscal year of {_day(day).isoformat()} is closed")
+
+def with_archive(model, since=None):
+    """`model`, or an alias over the live and archive tables when `since`
+    (None = all history) reaches into closed fiscal years."""
+    if since is not None and _day(since) >= open_from():
+        return model
+    rows = union_all(select(model.__table__), select(ARCHIVES[model])).subquery(f"{model.__tablename__}_all")
+    return aliased(model, rows, adapt_on_names=True)
+
+async def archived(db: AsyncSession, model, key: int) -> bool:
+    """Whether the row with primary key `key` has been moved to the archive."""
+    archive = ARCHIVES[model]
+    column = archive.c[model.__mapper__.primary_key[0].name]
+    return await db.scalar(select(column).where(column == key).limit(1)) is not None
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+def _literal(bound: Optional[date]) -> str:
+    return "MINVALUE" if bound is None else f"'{bound.isoformat()}'"
+
+def _parse_bound(value: str) -> Optional[date]:
+    return None if value == "MINVALUE" else date.fromisoformat(value.strip("'")[:10])
+
+async def partitions(conn, table: str) -> Dict[str, Bounds]:
+    """Partitions of `table` by name, with their bounds."""
+    result = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": table})
+    found = {}
+    for name, bound in result:
+        match = _BOUND.search(bound or "")
+        if match:
+            found[name] = (_parse_bound(match.group(1)), _parse_bound(match.group(2)))
+    return found
+
+def _covered(ranges: List[Bounds], month: date) -> bool:
+    return any((lower is None or lower <= month) and month < upper for lower, upper in ranges)
+
+async def create_partitions(conn, table: str, first, last) -> List[str]:
+    """Create the monthly partitions of `table` from `first` through `last`
+    that no existing partition covers."""
+    ranges = list((await partitions(conn, table)).values())
+    created = []
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        if not _covered(ranges, month):
+            name = _partition_name(table, month)
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ({_literal(month)}) TO ({_literal(add_months(month, 1))})"
+            ))
+            ranges.append((month, add_months(month, 1)))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+async def ensure_partitions(table: str, days: Iterable):
+    """Make sure rows dated `days` can be written to `table`.
+
+    Missing months are created in a short transaction of their own, so the
+    parent table is only locked for the DDL and not for the caller's
+    whole transaction.
+    """
+    months = {month_start(day) for day in days if day is not None}
+    for month in months:
+        check_open(month)
+    if engine.dialect.name != "postgresql":
+        return
+    if table not in _live:
+        async with engine.connect() as conn:
+            _live[table] = list((await partitions(conn, table)).values())
+    missing = sorted(month for month in months if not _covered(_live[table], month))
+    if not missing:
+        return
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        for month in missing:
+            await create_partitions(conn, table, month, month)
+        _live[table] = list((await partitions(conn, table)).values())
+
+async def _archive_closed(conn, table: str, boundary: date) -> List[str]:
+    """Move live partitions that end on or before `boundary` to the archive."""
+    closed = sorted(
+        ((name, bounds) for name, bounds in (await partitions(conn, table)).items() if bounds[1] <= boundary),
+        key=lambda partition: partition[1][1],
+    )
+    # A validated check matching the bounds lets ATTACH skip scanning the
+    # partition. Validation only takes a weak lock, so it runs before the
+    # detaches lock the parent.
+    for name, (lower, upper) in closed:
+        condition = f"date < {_literal(upper)}" + ("" if lower is None else f" AND date >= {_literal(lower)}")
+        await conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK ({condition}) NOT VALID"))
+        await conn.execute(text(f"ALTER TABLE {name} VALIDATE CONSTRAINT {name}_range"))
+    for name, (lower, upper) in closed:
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        await conn.execute(text(
+            f"ALTER TABLE {table}_archive ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ({_literal(lower)}) TO ({_literal(upper)})"
+        ))
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range"))
+    return [name for name, _ in closed]
+
+async def _drop_expired(conn, table: str, cutoff: date) -> List[str]:
+    dropped = []
+    for name, (_, upper) in (await partitions(conn, f"{table}_archive")).items():
+        if upper <= cutoff:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+async def maintain(conn, today: Optional[date] = None) -> dict:
+    """Premake partitions, archive closed fiscal years and drop expired archives."""
+    today = today or datetime.utcnow().date()
+    boundary = open_from(today)
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    report = {}
+    for table in PARTITIONED:
+        report[table] = {
+            "created": await create_partitions(conn, table, today, add_months(today, PARTITION_PREMAKE_MONTHS)),
+            "archived": await _archive_closed(conn, table, boundary),
+            "dropped": (
+                await _drop_expired(conn, table, add_months(boundary, -12 * PARTITION_RETENTION_YEARS))
+                if PARTITION_RETENTION_YEARS else []
+            ),
+        }
+    _live.clear()
+    return report
+
+@job_handler("partition_maintenance", max_attempts=3)
+async def partition_maintenance_job(ctx):
+    await ctx.progress(0, "Maintaining partitions", force=True)
+    report = await maintain(ctx.db)
+    await ctx.db.commit()
+    return {"open_from": open_from().isoformat(), "tables": report}
+
+if PARTITION_MAINTENANCE_SCHEDULE:
+    schedule_daily("partition_maintenance", PARTITION_MAINTENANCE_SCHEDULE)
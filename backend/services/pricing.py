@@ -0,0 +1,178 @@
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import accumulate
+from operator import mul, sub
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import os
+import time
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import pricing as models
+
+CURRENCY_DECIMALS = int(os.getenv("CURRENCY_DECIMALS", 2))
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", 300))
+
+MONEY_QUANTUM = Decimal(1).scaleb(-CURRENCY_DECIMALS)
+ZERO = Decimal(0)
+
+def to_decimal(value) -> Decimal:
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        # repr() gives the shortest round-tripping form, so 0.1 stays 0.1
+        return Decimal(repr(value))
+    return Decimal(value)
+
+def round_money(value: Decimal) -> Decimal:
+    return value.quantize(MONEY_QUANTUM, rounding=ROUND_HALF_UP)
+
+@dataclass
+class PricedLine:
+    unit_price: Decimal
+    discount: Decimal
+    tax_rate: Decimal
+    line_total: Decimal
+    tax_amount: Decimal
+
+@dataclass
+class PricedOrder:
+    lines: List[PricedLine] = field(default_factory=list)
+    subtotal: Decimal = ZERO
+    discount_total: Decimal = ZERO
+    tax_total: Decimal = ZERO
+    total_amount: Decimal = ZERO
+
+# A resolved line: (quantity, unit_price, discount, tax_rate)
+LineInput = Tuple[Decimal, Decimal, Decimal, Decimal]
+
+def compute_totals(orders: Sequence[Sequence[LineInput]]) -> List[PricedOrder]:
+    """Price every line of every order in one columnar pass.
+
+    Lines are flattened into parallel columns and combined with map(), so the
+    per-line arithmetic runs in C over whole columns; header totals are
+    sliced back out of running sums. Tax is rounded per line, which keeps
+    line tax amounts adding up exactly to the header tax.
+    """
+    counts = [len(lines) for lines in orders]
+    flat = [line for lines in orders for line in lines]
+    if not flat:
+        return [PricedOrder() for _ in orders]
+
+    quantity, unit_price, discount, tax_rate = (list(column) for column in zip(*flat))
+    gross = list(map(round_money, map(mul, quantity, unit_price)))
+    discount = list(map(round_money, discount))
+    net = list(map(sub, gross, discount))
+    tax = list(map(round_money, map(mul, net, tax_rate)))
+
+    gross_sums = [ZERO, *accumulate(gross)]
+    discount_sums = [ZERO, *accumulate(discount)]
+    tax_sums = [ZERO, *accumulate(tax)]
+
+    priced = []
+    start = 0
+    for count in counts:
+        end = start + count
+        subtotal = gross_sums[end] - gross_sums[start]
+        discount_total = discount_sums[end] - discount_sums[start]
+        tax_total = tax_sums[end] - tax_sums[start]
+        priced.append(PricedOrder(
+            lines=[
+                PricedLine(unit_price[i], discount[i], tax_rate[i], net[i], tax[i])
+                for i in range(start, end)
+            ],
+            subtotal=subtotal,
+            discount_total=discount_total,
+            tax_total=tax_total,
+            total_amount=subtotal - discount_total + tax_total,
+        ))
+        start = end
+    return priced
+
+# --- Price list cache ---
+# item_id -> (unit_price, tax_rate)
+PriceMap = Dict[int, Tuple[Decimal, Decimal]]
+
+class PriceListCache:
+    """In-process cache of active price lists keyed by customer_id (None = default list).
+
+    Entries are loaded on demand, all missing customers in one query, and
+    dropped either explicitly by the price list endpoints or after
+    PRICE_CACHE_TTL seconds so other workers pick up changes too.
+    """
+
+    def __init__(self, ttl: float = PRICE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Optional[int], Tuple[float, PriceMap]] = {}
+
+    def invalidate(self, customer_id: Optional[int] = None, everything: bool = False):
+        if everything or customer_id is None:
+            # The default list backs every customer, so drop it all
+            self._entries.clear()
+        else:
+            self._entries.pop(customer_id, None)
+
+    async def get(self, db: AsyncSession, customer_ids: Iterable[Optional[int]]) -> Dict[Optional[int], PriceMap]:
+        now = time.monotonic()
+        wanted = set(customer_ids) | {None}
+        missing = [c for c in wanted if c not in self._entries or self._entries[c][0] < now]
+        if missing:
+            loaded: Dict[Optional[int], PriceMap] = {c: {} for c in missing}
+            customer_filter = models.PriceList.customer_id.in_([c for c in missing if c is not None])
+            if None in missing:
+                customer_filter = customer_filter | models.PriceList.customer_id.is_(None)
+            result = await db.execute(
+                select(
+                    models.PriceList.customer_id,
+                    models.PriceListItem.item_id,
+                    models.PriceListItem.unit_price,
+                    models.PriceListItem.tax_rate,
+                )
+                .join(models.PriceListItem, models.PriceListItem.price_list_id == models.PriceList.price_list_id)
+                .where(models.PriceList.is_active.is_(True), customer_filter)
+                # Later lists win when a customer has more than one active list
+                .order_by(models.PriceList.price_list_id)
+            )
+            for customer_id, item_id, price, rate in result:
+                loaded[customer_id][item_id] = (to_decimal(price), to_decimal(rate))
+            expires = now + self.ttl
+            for customer_id, prices in loaded.items():
+                self._entries[customer_id] = (expires, prices)
+        return {c: self._entries[c][1] for c in wanted}
+
+price_cache = PriceListCache()
+
+async def price_orders(db: AsyncSession, orders: Sequence) -> List[PricedOrder]:
+    """Resolve prices and compute totals for a batch of OrderCreate-like objects.
+
+    Explicit unit_price / tax_rate on a line win; otherwise sales orders fall
+    back to the customer's price list, then the default list.
+    """
+    customers = {o.customer_id for o in orders if o.order_type == "sales"}
+    books = await price_cache.get(db, customers)
+    default_book = books[None]
+
+    resolved = []
+    for order in orders:
+        book = books.get(order.customer_id, {}) if order.order_type == "sales" else {}
+        lines = []
+        for item in order.items:
+            listed = book.get(item.item_id)
+            if listed is None and order.order_type == "sales":
+                listed = default_book.get(item.item_id)
+            if item.unit_price is not None:
+                unit_price = to_decimal(item.unit_price)
+            elif listed is not None:
+                unit_price = listed[0]
+            else:
+                raise HTTPException(status_code=422, detail=f"No price found for item {item.item_id}")
+            if item.tax_rate is not None:
+                tax_rate = to_decimal(item.tax_rate)
+            else:
+                tax_rate = listed[1] if listed is not None else ZERO
+            lines.append((to_decimal(item.quantity), unit_price, to_decimal(item.discount), tax_rate))
+        resolved.append(lines)
+    return compute_totals(resolved)
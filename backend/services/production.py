@@ -0,0 +1,264 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as inv_models
+from models import master_data as master_models
+from models import production as models
+from services.events import publish_many
+from services.inventory import lines_table, resolve_location, take_stock
+from services.lots import create_output_lots, link_lots
+from services.partitions import ensure_partitions
+from services.pricing import ZERO, round_money
+from services.scheduling import SCHEDULED_STATUSES, unschedule
+from services.valuation import UNIT_COST_QUANTUM, value_movements
+
+# Manufacturing order completion.
+#
+# Completing orders is one set-based posting, whatever the number of
+# orders: a conditional UPDATE closes the open ones (so an order completes
+# exactly once), the finished quantity is added to product stock, and the
+# components are backflushed from one location: one conditional UPDATE
+# takes them from inventory_levels (409 when any is short), one multi-row
+# insert writes the outbound movements, which are costed and posted by
+# value_movements like any other issue.
+#
+# Components with consumption recorded against an order (material_consumption,
+# actual + waste) are issued at that quantity; the others at standard, BOM
+# qty_required x finished quantity, and recorded as consumption. Actual
+# against standard is kept per order and component in production_variances,
+# in quantity and at the cost the issue was valued at. Sub-assembly lines
+# take their products from product stock, in the same UPDATE that adds the
+# finished products.
+#
+# Each completed order makes one lot of its product (the production order
+# number unless given) and links into it the lots on its recorded
+# consumption and any further input lots given, for traceability
+# (services/lots.py). Issues of recorded consumption carry its lot.
+
+async def _close_orders(db: AsyncSession, quantities: Dict[int, Optional[Decimal]]) -> list:
+    mo = models.ManufacturingOrder.__table__
+    wanted = lines_table(quantities, "completed", key="mo_id")
+    result = await db.execute(
+        update(mo)
+        .where(mo.c.mo_id == wanted.c.mo_id, mo.c.status.in_(SCHEDULED_STATUSES))
+        .values(
+            status="completed",
+            end_date=datetime.utcnow().date(),
+            quantity_completed=func.coalesce(wanted.c.qty, mo.c.quantity_required),
+        )
+        .returning(mo.c.mo_id, mo.c.production_order_number, mo.c.product_id, mo.c.quantity_completed)
+    )
+    closed = result.all()
+    if len(closed) < len(quantities):
+        missing = sorted(set(quantities) - {row.mo_id for row in closed})
+        found = set((await db.execute(select(mo.c.mo_id).where(mo.c.mo_id.in_(missing)))).scalars())
+        if len(found) < len(missing):
+            raise HTTPException(status_code=404, detail=f"Manufacturing orders not found: {sorted(set(missing) - found)}")
+        raise HTTPException(status_code=409, detail=f"Manufacturing orders are not open: {missing}")
+    fractional = [row.mo_id for row in closed if Decimal(row.quantity_completed) % 1]
+    if fractional:
+        # Product stock is kept in whole units
+        raise HTTPException(status_code=422, detail=f"Finished quantity must be whole units: {fractional}")
+    return closed
+
+async def _check_lots(db: AsyncSession, lot_ids):
+    lot = inv_models.Lot
+    lot_ids = set(lot_ids)
+    if lot_ids:
+        found = set((await db.execute(select(lot.lot_id).where(lot.lot_id.in_(sorted(lot_ids))))).scalars())
+        if len(found) < len(lot_ids):
+            raise HTTPException(status_code=404, detail=f"Lots not found: {sorted(lot_ids - found)}")
+
+async def complete_orders(
+    db: AsyncSession,
+    orders: Sequence,
+    location_id: Optional[int] = None,
+) -> dict:
+    """Complete orders (schemas.production.CompletionOrder: mo_id, finished
+    quantity or None for quantity_required, output lot number, input lots),
+    issuing components from `location_id` (default location when None)."""
+    quantities = {order.mo_id: order.quantity for order in orders}
+    if len(quantities) < len(orders):
+        raise HTTPException(status_code=422, detail="An order can only be completed once per request")
+    if any(quantity is not None and quantity <= 0 for quantity in quantities.values()):
+        raise HTTPException(status_code=422, detail="Finished quantity must be positive")
+    if any(lot.quantity <= 0 for order in orders for lot in order.input_lots):
+        raise HTTPException(status_code=422, detail="Input lot quantity must be positive")
+    location_id = await resolve_location(db, location_id)
+    await _check_lots(db, (lot.lot_id for order in orders for lot in order.input_lots))
+
+    # 1. Close the orders
+    closed = await _close_orders(db, quantities)
+    mo_ids = [row.mo_id for row in closed]
+
+    # 2. Standard usage from the BOMs, actual from recorded consumption
+    bom = models.BillOfMaterials
+    result = await db.execute(
+        select(bom.product_id, bom.item_id, bom.component_product_id, bom.qty_required)
+        .where(bom.product_id.in_(sorted({row.product_id for row in closed})))
+    )
+    components = defaultdict(list)
+    for product_id, item_id, component_product_id, qty_required in result:
+        components[product_id].append((item_id, component_product_id, Decimal(qty_required)))
+    standard: Dict[Tuple[int, int], Decimal] = defaultdict(Decimal)
+    # Product stock: + finished, - sub-assemblies used
+    finished: Dict[int, Decimal] = defaultdict(Decimal)
+    for row in closed:
+        finished[row.product_id] += Decimal(row.quantity_completed)
+        for item_id, component_product_id, qty_required in components[row.product_id]:
+            if item_id is not None:
+                standard[(row.mo_id, item_id)] += qty_required * Decimal(row.quantity_completed)
+            else:
+                finished[component_product_id] -= qty_required * Decimal(row.quantity_completed)
+
+    consumption = models.MaterialConsumption
+    result = await db.execute(
+        select(
+            consumption.mo_id,
+            consumption.item_id,
+            consumption.lot_id,
+            func.sum(consumption.actual_quantity + func.coalesce(consumption.waste, 0)),
+        )
+        .where(consumption.mo_id.in_(mo_ids))
+        .group_by(consumption.mo_id, consumption.item_id, consumption.lot_id)
+    )
+    # (mo_id, item_id) -> {lot_id or None: quantity}
+    recorded_lots: Dict[Tuple[int, int], Dict[Optional[int], Decimal]] = defaultdict(dict)
+    for mo_id, item_id, lot_id, quantity in result:
+        recorded_lots[(mo_id, item_id)][lot_id] = Decimal(quantity)
+    recorded = {key: sum(lots.values(), ZERO) for key, lots in recorded_lots.items()}
+    actual = {**standard, **recorded}
+
+    # 3. Backflush the components, recorded consumption from its lots
+    issues = []
+    for key, quantity in sorted(actual.items()):
+        if quantity <= 0:
+            continue
+        if key in recorded:
+            issues.extend((key, lot_id, lot_quantity) for lot_id, lot_quantity in recorded_lots[key].items() if lot_quantity > 0)
+        else:
+            issues.append((key, None, quantity))
+    wanted: Dict[int, Decimal] = defaultdict(Decimal)
+    for (_, item_id), _, quantity in issues:
+        wanted[item_id] += quantity
+    levels = await take_stock(db, location_id, wanted)
+    short = sorted(set(wanted) - {row["item_id"] for row in levels})
+    if short:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Not enough available stock at location {location_id} for items: {short}",
+        )
+
+    movements = []
+    if issues:
+        numbers = {row.mo_id: row.production_order_number for row in closed}
+        now = datetime.utcnow()
+        await ensure_partitions("stock_movements", [now])
+        table = inv_models.StockMovement.__table__
+        result = await db.execute(
+            insert(table).returning(*table.c, sort_by_parameter_order=True),
+            [
+                {
+                    "item_id": item_id,
+                    "location_id": location_id,
+                    "movement_type": "outbound",
+                    "transaction_number": numbers[mo_id],
+                    "date": now,
+                    "reference_id": mo_id,
+                    "quantity": quantity,
+                    "beneficiary": "production",
+                    "lot_id": lot_id,
+                }
+                for (mo_id, item_id), lot_id, quantity in issues
+            ],
+        )
+        movements = [dict(row) for row in result.mappings()]
+    costs = await value_movements(db, movements)
+    # Issues from several lots are valued apart; variances use their average
+    issued: Dict[Tuple[int, int], List[Decimal]] = defaultdict(lambda: [ZERO, ZERO])
+    for m in movements:
+        total = issued[(m["reference_id"], m["item_id"])]
+        total[0] += Decimal(m["quantity"])
+        total[1] += Decimal(costs[m["movement_id"]]["total_cost"] or ZERO)
+    unit_costs = {key: (value / quantity).quantize(UNIT_COST_QUANTUM) for key, (quantity, value) in issued.items() if quantity}
+
+    backflushed = [(key, quantity) for key, _, quantity in issues if key not in recorded]
+    if backflushed:
+        today = datetime.utcnow().date()
+        await db.execute(insert(consumption), [
+            {"mo_id": mo_id, "item_id": item_id, "actual_quantity": quantity, "waste": ZERO, "withdrawal_date": today}
+            for (mo_id, item_id), quantity in backflushed
+        ])
+
+    # 4. Variances
+    variances = []
+    keys = sorted(set(standard) | set(recorded))
+    if keys:
+        rows = []
+        for key in keys:
+            mo_id, item_id = key
+            planned, used = standard.get(key, ZERO), actual.get(key, ZERO)
+            unit_cost = unit_costs.get(key, ZERO)
+            rows.append({
+                "mo_id": mo_id,
+                "item_id": item_id,
+                "standard_quantity": planned,
+                "actual_quantity": used,
+                "quantity_variance": used - planned,
+                "unit_cost": unit_cost,
+                "cost_variance": round_money((used - planned) * unit_cost),
+            })
+        table = models.ProductionVariance.__table__
+        result = await db.execute(insert(table).returning(*table.c, sort_by_parameter_order=True), rows)
+        variances = [dict(row) for row in result.mappings()]
+
+    # 5. Finished goods in, sub-assemblies out; never below zero
+    fractional = sorted(product_id for product_id, quantity in finished.items() if quantity % 1)
+    if fractional:
+        raise HTTPException(status_code=422, detail=f"Sub-assemblies are used in whole units: products {fractional}")
+    product = master_models.Product.__table__
+    made = lines_table(finished, "finished", key="product_id")
+    stock = func.coalesce(product.c.stock_quantity, 0)
+    result = await db.execute(
+        update(product)
+        .where(product.c.product_id == made.c.product_id, stock + made.c.qty >= 0)
+        .values(stock_quantity=stock + made.c.qty)
+        .returning(product.c.product_id)
+    )
+    short = sorted(set(finished) - set(result.scalars()))
+    if short:
+        raise HTTPException(status_code=409, detail=f"Not enough stock of sub-assembly products: {short}")
+
+    # 6. Output lots and their genealogy
+    lot_numbers = {order.mo_id: order.lot_number for order in orders}
+    lot_ids = await create_output_lots(db, [
+        (row.mo_id, row.product_id, lot_numbers[row.mo_id] or row.production_order_number) for row in closed
+    ])
+    links = [
+        (lot_id, lot_ids[mo_id], mo_id, quantity)
+        for (mo_id, _), lots in sorted(recorded_lots.items())
+        for lot_id, quantity in lots.items()
+        if lot_id is not None and quantity > 0
+    ]
+    links += [(lot.lot_id, lot_ids[order.mo_id], order.mo_id, lot.quantity) for order in orders for lot in order.input_lots]
+    await link_lots(db, links)
+
+    # Their capacity is free again; the next run of the scheduler uses it
+    await unschedule(db, mo_ids)
+
+    await publish_many(db, "manufacturing_orders", "update", mo_ids)
+    await publish_many(db, "products", "update", sorted(finished))
+    await publish_many(db, "inventory_levels", "update", [row["inventory_id"] for row in levels])
+    await publish_many(db, "stock_movements", "create", [m["movement_id"] for m in movements])
+    return {
+        "completed": mo_ids,
+        "lot_ids": lot_ids,
+        "location_id": location_id,
+        "movement_ids": [m["movement_id"] for m in movements],
+        "variances": variances,
+    }
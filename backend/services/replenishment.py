@@ -0,0 +1,185 @@
+import os
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as inv_models
+from models import master_data as master_models
+from models import orders as order_models
+from services.events import publish_many
+from services.inventory import resolve_location
+from services.jobs import job_handler, schedule_daily
+from services.numbering import numbering
+from services.pricing import round_money, to_decimal
+
+# Reorder-point replenishment.
+#
+# One query finds every (item, location) at or below its reorder point
+# (through the expression index on available - reorder_point), nets the
+# order-up-to quantity against open purchase orders and picks a supplier:
+# the item's preferred supplier, else the supplier of its latest purchase
+# order. Lines are grouped per (supplier, location) into draft purchase
+# orders written with two multi-row inserts. Runs are serialized with an
+# advisory lock so a second run sees the first one's drafts as on order.
+
+REPLENISHMENT_SCHEDULE = os.getenv("REPLENISHMENT_SCHEDULE", "02:00") # UTC, empty to disable
+REPLENISHMENT_LOCK_KEY = 7_340_002
+
+# Purchase orders in these statuses count as already on order
+OPEN_PURCHASE_STATUSES = ("draft", "pending", "in_progress")
+
+async def plan_replenishment(db: AsyncSession, location_id: Optional[int] = None) -> List[dict]:
+    default_id = await resolve_location(db, None)
+    level = inv_models.InventoryLevel
+    order, line = order_models.Order, order_models.OrderItem
+    item = master_models.Item
+
+    below = select(
+        level.item_id,
+        level.location_id,
+        level.available,
+        func.greatest(level.max_level, level.reorder_point).label("target"),
+    ).where(level.available - level.reorder_point <= 0)
+    if location_id is not None:
+        below = below.where(level.location_id == location_id)
+    below = below.cte("below")
+
+    po_location = func.coalesce(order.location_id, default_id)
+    open_po = (
+        select(line.item_id, po_location.label("location_id"), func.sum(line.quantity).label("on_order"))
+        .join(order, order.order_id == line.order_id)
+        .where(
+            order.order_type == "purchase",
+            order.status.in_(OPEN_PURCHASE_STATUSES),
+            line.item_id.in_(select(below.c.item_id)),
+        )
+        .group_by(line.item_id, po_location)
+        .cte("open_po")
+    )
+
+    last_po = (
+        select(line.item_id, order.supplier_id, line.unit_price)
+        .join(order, order.order_id == line.order_id)
+        .where(
+            order.order_type == "purchase",
+            order.supplier_id.is_not(None),
+            order.status != "cancelled",
+            line.item_id.in_(select(below.c.item_id)),
+        )
+        .distinct(line.item_id)
+        .order_by(line.item_id, order.order_date.desc(), order.order_id.desc())
+        .cte("last_po")
+    )
+
+    on_order = func.coalesce(open_po.c.on_order, 0)
+    quantity = below.c.target - below.c.available - on_order
+    result = await db.execute(
+        select(
+            below.c.item_id,
+            below.c.location_id,
+            func.coalesce(item.preferred_supplier_id, last_po.c.supplier_id).label("supplier_id"),
+            func.coalesce(last_po.c.unit_price, 0).label("unit_price"),
+            below.c.available,
+            on_order.label("on_order"),
+            quantity.label("quantity"),
+        )
+        .select_from(below)
+        .join(item, item.item_id == below.c.item_id)
+        .outerjoin(open_po, and_(open_po.c.item_id == below.c.item_id, open_po.c.location_id == below.c.location_id))
+        .outerjoin(last_po, last_po.c.item_id == below.c.item_id)
+        .where(quantity > 0)
+        .order_by(below.c.location_id, below.c.item_id)
+    )
+    return [dict(row) for row in result.mappings()]
+
+async def create_draft_purchase_orders(db: AsyncSession, lines: List[dict]) -> List[int]:
+    groups: Dict[Tuple[int, int], List[dict]] = defaultdict(list)
+    for planned in lines:
+        groups[(planned["supplier_id"], planned["location_id"])].append(planned)
+    if not groups:
+        return []
+
+    numbers = await numbering.allocate(db, "purchase_order", len(groups))
+    today = date.today()
+    order_rows = []
+    line_rows = []
+    for ((supplier_id, location_id), group), number in zip(groups.items(), numbers):
+        priced = []
+        for planned in group:
+            unit_price = to_decimal(planned["unit_price"])
+            priced.append((planned, unit_price, round_money(to_decimal(planned["quantity"]) * unit_price)))
+        subtotal = sum((total for _, _, total in priced), Decimal(0))
+        order_rows.append({
+            "order_number": number,
+            "order_type": "purchase",
+            "order_date": today,
+            "supplier_id": supplier_id,
+            "location_id": location_id,
+            "status": "draft",
+            "subtotal": subtotal,
+            "discount_total": 0,
+            "tax_total": 0,
+            "total_amount": subtotal,
+        })
+        line_rows.append(priced)
+
+    result = await db.execute(
+        insert(order_models.Order).returning(order_models.Order.order_id, sort_by_parameter_order=True),
+        order_rows,
+    )
+    order_ids = result.scalars().all()
+    await db.execute(insert(order_models.OrderItem), [
+        {
+            "order_id": order_id,
+            "item_id": planned["item_id"],
+            "quantity": planned["quantity"],
+            "unit_price": unit_price,
+            "discount": 0,
+            "tax_rate": 0,
+            "tax_amount": 0,
+            "line_total": total,
+        }
+        for order_id, priced in zip(order_ids, line_rows)
+        for planned, unit_price, total in priced
+    ])
+    await publish_many(db, "orders", "create", order_ids)
+    return order_ids
+
+async def run_replenishment(db: AsyncSession, location_id: Optional[int] = None, dry_run: bool = False) -> dict:
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REPLENISHMENT_LOCK_KEY})
+    lines = await plan_replenishment(db, location_id)
+    assigned = [planned for planned in lines if planned["supplier_id"] is not None]
+    unassigned = sorted({planned["item_id"] for planned in lines if planned["supplier_id"] is None})
+    order_ids = []
+    if not dry_run:
+        order_ids = await create_draft_purchase_orders(db, assigned)
+    await db.commit()
+    return {
+        "dry_run": dry_run,
+        "orders_created": len(order_ids),
+        "order_ids": order_ids,
+        "lines": assigned,
+        "unassigned_items": unassigned, # no preferred supplier and never purchased
+    }
+
+@job_handler("replenishment", max_attempts=2)
+async def replenishment_job(ctx):
+    await ctx.progress(0, "Planning replenishment", force=True)
+    result = await run_replenishment(
+        ctx.db,
+        location_id=ctx.params.get("location_id"),
+        dry_run=bool(ctx.params.get("dry_run", False)),
+    )
+    # Job results are stored as JSON; keep them small
+    return {
+        "orders_created": result["orders_created"],
+        "order_ids": result["order_ids"],
+        "lines": len(result["lines"]),
+        "unassigned_items": result["unassigned_items"],
+    }
+
+if REPLENISHMENT_SCHEDULE:
+    schedule_daily("replenishment", REPLENISHMENT_SCHEDULE)
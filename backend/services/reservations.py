@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models import orders as order_models
+from services.inventory import apply_stock_delta, lines_table, resolve_location, take_stock
+from services.partitions import ensure_partitions
+from services.valuation import value_movements
+
+# Stock reservations for sales orders.
+#
+# Reserving takes quantity from inventory_levels.available with one
+# conditional UPDATE per location (available >= qty), so concurrent orders
+# can never reserve the same units: the loser's UPDATE matches no row and
+# the order is rejected with 409 instead of being oversold. on_hand only
+# moves when a reservation is consumed, i.e. the order is delivered.
+# Reservation rows change status with conditional UPDATEs too, so a
+# reservation is released or consumed exactly once.
+
+# Sales order statuses that hold stock
+RESERVING_STATUSES = ("pending", "in_progress")
+# Purchase order statuses whose lines count as incoming stock
+INCOMING_STATUSES = ("pending", "in_progress")
+
+async def _check_lots(db: AsyncSession, lots: Set[Tuple[int, int]]):
+    if not lots:
+        return
+    lot = models.Lot
+    result = await db.execute(select(lot.lot_id, lot.item_id).where(lot.lot_id.in_(sorted({lot_id for lot_id, _ in lots}))))
+    found = dict(result.all())
+    missing = sorted({lot_id for lot_id, _ in lots} - set(found))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Lots not found: {missing}")
+    wrong = sorted(lot_id for lot_id, item_id in lots if found[lot_id] != item_id)
+    if wrong:
+        raise HTTPException(status_code=422, detail=f"Lots of other items: {wrong}")
+
+async def reserve_orders(
+    db: AsyncSession,
+    orders: Sequence[Tuple[int, Optional[int], Iterable[Tuple[int, Decimal, Optional[int]]]]],
+) -> List[dict]:
+    """Reserve (order_id, location_id, [(item_id, quantity, lot_id)]) for
+    sales orders; lot_id (None for any) is the lot the line ships from.
+
+    Returns the touched level rows; raises 409 when any line is short.
+    """
+    wanted: Dict[int, Dict[int, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+    rows = []
+    for order_id, location_id, lines in orders:
+        location_id = await resolve_location(db, location_id)
+        for item_id, quantity, lot_id in lines:
+            wanted[location_id][item_id] += Decimal(quantity)
+            rows.append({
+                "order_id": order_id,
+                "item_id": item_id,
+                "location_id": location_id,
+                "quantity": quantity,
+                "lot_id": lot_id,
+                "status": "active",
+            })
+    if not rows:
+        return []
+    await _check_lots(db, {(row["lot_id"], row["item_id"]) for row in rows if row["lot_id"] is not None})
+
+    levels = []
+    for location_id, lines in sorted(wanted.items()):
+        taken = await take_stock(db, location_id, lines, on_hand=False)
+        short = sorted(set(lines) - {row["item_id"] for row in taken})
+        if short:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Not enough available stock at location {location_id} for items: {short}",
+            )
+        levels.extend(taken)
+    await db.execute(insert(models.StockReservation), rows)
+    return levels
+
+async def _close_reservations(db: AsyncSession, order_ids: Iterable[int], status: str):
+    reservation = models.StockReservation
+    result = await db.execute(
+        update(reservation)
+        .where(reservation.order_id.in_(list(order_ids)), reservation.status == "active")
+        .values(status=status, closed_at=datetime.utcnow())
+        .returning(reservation.order_id, reservation.item_id, reservation.location_id, reservation.quantity, reservation.lot_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+async def release_orders(db: AsyncSession, order_ids: Iterable[int]) -> List[dict]:
+    """Give reserved quantities back to available (cancel, edit, delete)."""
+    closed = await _close_reservations(db, order_ids, "released")
+    return await apply_stock_delta(db, [(r.item_id, r.location_id, Decimal(0), r.quantity) for r in closed])
+
+async def consume_orders(db: AsyncSession, order_ids: Iterable[int]) -> Tuple[List[dict], List[int]]:
+    """Ship reserved quantities: on_hand goes down and an outbound movement
+    is written per line. Returns (level rows, movement ids)."""
+    closed = await _close_reservations(db, order_ids, "consumed")
+    if not closed:
+        return [], []
+    levels = await apply_stock_delta(db, [(r.item_id, r.location_id, -r.quantity, Decimal(0)) for r in closed])
+    now = datetime.utcnow()
+    await ensure_partitions("stock_movements", [now])
+    table = models.StockMovement.__table__
+    result = await db.execute(
+        insert(table).returning(*table.c, sort_by_parameter_order=True),
+        [
+            {
+                "item_id": r.item_id,
+                "location_id": r.location_id,
+                "movement_type": "outbound",
+                "date": now,
+                "reference_id": r.order_id,
+                "quantity": r.quantity,
+                "beneficiary": "customer",
+                "lot_id": r.lot_id,
+            }
+            for r in closed
+        ],
+    )
+    movements = [dict(row) for row in result.mappings()]
+    await value_movements(db, movements)
+    return levels, [m["movement_id"] for m in movements]
+
+async def available_to_promise(
+    db: AsyncSession,
+    lines: Dict[int, Decimal],
+    location_id: Optional[int] = None,
+    by_date: Optional[date] = None,
+) -> List[dict]:
+    """ATP per requested item: unreserved stock plus open purchase order
+    lines expected by `by_date` (all open ones when no date is given).
+
+    One statement for any number of items: the requested lines are a
+    unnest() of arrays joined to pre-aggregated stock and incoming quantities.
+    """
+    if not lines:
+        return []
+    wanted = lines_table(lines)
+
+    level = models.InventoryLevel
+    stock = select(level.item_id, func.sum(level.available).label("available")).where(
+        level.item_id.in_(list(lines))
+    )
+    if location_id is not None:
+        stock = stock.where(level.location_id == location_id)
+    stock = stock.group_by(level.item_id).subquery("stock")
+
+    order, line = order_models.Order, order_models.OrderItem
+    incoming = (
+        select(line.item_id, func.sum(line.quantity).label("incoming"))
+        .join(order, order.order_id == line.order_id)
+        .where(
+            order.order_type == "purchase",
+            order.status.in_(INCOMING_STATUSES),
+            line.item_id.in_(list(lines)),
+        )
+    )
+    if by_date is not None:
+        incoming = incoming.where(order.expected_date.is_not(None), order.expected_date <= by_date)
+    if location_id is not None:
+        default_id = await resolve_location(db, None)
+        incoming = incoming.where(func.coalesce(order.location_id, default_id) == location_id)
+    incoming = incoming.group_by(line.item_id).subquery("incoming")
+
+    available = func.coalesce(stock.c.available, 0)
+    expected = func.coalesce(incoming.c.incoming, 0)
+    result = await db.execute(
+        select(
+            wanted.c.item_id,
+            wanted.c.qty.label("requested"),
+            available.label("available"),
+            expected.label("incoming"),
+        )
+        .select_from(wanted)
+        .outerjoin(stock, stock.c.item_id == wanted.c.item_id)
+        .outerjoin(incoming, incoming.c.item_id == wanted.c.item_id)
+        .order_by(wanted.c.item_id)
+    )
+    rows = []
+    for item_id, requested, on_shelf, expected_qty in result:
+        atp = Decimal(on_shelf) + Decimal(expected_qty)
+        rows.append({
+            "item_id": item_id,
+            "requested": requested,
+            "available": on_shelf,
+            "incoming": expected_qty,
+            "atp": atp,
+            "can_promise": atp >= requested,
+            "shortfall": max(Decimal(requested) - atp, Decimal(0)),
+        })
+    return rows
@@ -0,0 +1,295 @@
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import ROUND_CEILING, Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, bindparam, delete, func, insert, literal, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import production as models
+from services.events import publish_many
+from services.jobs import job_handler, schedule_daily
+from services.pricing import ZERO
+
+# Finite-capacity scheduling of manufacturing orders.
+#
+# A product's routing is a sequence of operations on work centers, each
+# taking setup_hours + run_hours_per_unit * quantity. A work center has
+# hours_per_day on its working_days, overridden per day by
+# work_center_calendar. Open orders are placed in one forward pass in rank
+# order (in progress first, then higher priority, earlier due date, older
+# order): every operation takes the earliest free hours on its work center
+# from the day the previous operation ended. A work center's timeline keeps,
+# for each day found full, a pointer to the next day with free hours, so a
+# pass costs about one step per booked day. Bookings are stored per day in
+# scheduled_operations; orders get their first and last day as start and
+# end date. Orders without a routing keep the dates they were given.
+#
+# When one order changes, only the orders ranked after it (or after where
+# it was) that share a work center with it, directly or through other such
+# orders, are placed again; all others keep their bookings. An order never
+# sees the orders ranked after it, so the result is the plan a full run
+# would make. Routing and calendar changes apply from the next full run:
+# nightly (PRODUCTION_SCHEDULE) or POST /production/schedule/.
+
+PRODUCTION_SCHEDULE = os.getenv("PRODUCTION_SCHEDULE", "01:30") # UTC, empty to disable
+SCHEDULE_HORIZON_DAYS = int(os.getenv("SCHEDULE_HORIZON_DAYS", 730))
+SCHEDULING_LOCK_KEY = 7_340_004 # pg advisory lock id
+
+SCHEDULED_STATUSES = ("pending", "in_progress")
+
+HOURS = Decimal("0.0001")
+ONE_DAY = timedelta(days=1)
+
+Rank = Tuple[bool, int, date, int]
+
+class Snapshot(NamedTuple):
+    """Where an order was in the plan before a change."""
+    rank: Rank
+    product_id: Optional[int]
+
+def rank(mo) -> Rank:
+    return (mo.status != "in_progress", -(mo.priority or 0), mo.due_date or date.max, mo.mo_id)
+
+def snapshot(mo) -> Optional[Snapshot]:
+    if mo.status not in SCHEDULED_STATUSES:
+        return None
+    return Snapshot(rank(mo), mo.product_id)
+
+def _ids(values: Iterable[int]):
+    return literal(sorted(set(values)), ARRAY(Integer))
+
+class _Timeline:
+    """Free hours per day of one work center."""
+
+    def __init__(self, center, exceptions: Dict[date, Decimal], horizon: date):
+        self.code = center.code
+        self.hours = Decimal(center.hours_per_day) if center.is_active else ZERO
+        self.weekdays = {int(d) for d in center.working_days or "" if d.isdigit()}
+        self.exceptions = exceptions
+        self.horizon = horizon
+        self.free: Dict[date, Decimal] = {}
+        self.skip: Dict[date, date] = {} # full day -> a later day to look from
+
+    @property
+    def available(self) -> bool:
+        return (self.hours > 0 and bool(self.weekdays)) or any(hours > 0 for hours in self.exceptions.values())
+
+    def _free(self, day: date) -> Decimal:
+        if day not in self.free:
+            hours = self.exceptions.get(day)
+            if hours is None:
+                hours = self.hours if day.isoweekday() in self.weekdays else ZERO
+            self.free[day] = Decimal(hours)
+        return self.free[day]
+
+    def load(self, day: date, hours: Decimal):
+        self.free[day] = self._free(day) - Decimal(hours)
+
+    def next_free(self, day: date) -> date:
+        full = []
+        while self._free(day) <= 0:
+            full.append(day)
+            day = self.skip.get(day, day + ONE_DAY)
+            if day > self.horizon:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Work center {self.code} has no free capacity within {SCHEDULE_HORIZON_DAYS} days",
+                )
+        for seen in full:
+            self.skip[seen] = day
+        return day
+
+    def book(self, day: date, hours: Decimal) -> List[Tuple[date, Decimal]]:
+        booked = []
+        while hours > 0:
+            day = self.next_free(day)
+            take = min(hours, self.free[day])
+            self.free[day] -= take
+            hours -= take
+            booked.append((day, take))
+        return booked
+
+async def _open_orders(db: AsyncSession) -> list:
+    mo = models.ManufacturingOrder
+    result = await db.execute(
+        select(mo.mo_id, mo.product_id, mo.quantity_required, mo.status, mo.priority, mo.due_date, mo.start_date, mo.end_date)
+        .where(mo.status.in_(SCHEDULED_STATUSES))
+    )
+    return sorted(result.all(), key=rank)
+
+async def _routings(db: AsyncSession) -> Dict[int, list]:
+    routing = models.Routing
+    result = await db.execute(
+        select(routing.routing_id, routing.product_id, routing.work_center_id, routing.setup_hours, routing.run_hours_per_unit)
+        .order_by(routing.product_id, routing.sequence, routing.routing_id)
+    )
+    routings = defaultdict(list)
+    for row in result:
+        routings[row.product_id].append(row)
+    return routings
+
+def _centers_of(routings: Dict[int, list], product_id) -> set:
+    return {operation.work_center_id for operation in routings.get(product_id, ())}
+
+async def _timelines(db: AsyncSession, center_ids: set, start: date) -> Dict[int, _Timeline]:
+    if not center_ids:
+        return {}
+    horizon = start + timedelta(days=SCHEDULE_HORIZON_DAYS)
+    calendar = models.WorkCenterCalendar
+    result = await db.execute(
+        select(calendar.work_center_id, calendar.day, calendar.hours)
+        .where(calendar.work_center_id == any_(_ids(center_ids)), calendar.day >= start, calendar.day <= horizon)
+    )
+    exceptions: Dict[int, Dict[date, Decimal]] = defaultdict(dict)
+    for center_id, day, hours in result:
+        exceptions[center_id][day] = hours
+    result = await db.execute(select(models.WorkCenter).where(models.WorkCenter.work_center_id == any_(_ids(center_ids))))
+    return {
+        center.work_center_id: _Timeline(center, exceptions[center.work_center_id], horizon)
+        for center in result.scalars()
+    }
+
+def _place(order, operations: Sequence, timelines: Dict[int, _Timeline], start: date) -> List[tuple]:
+    """Book an order's operations in sequence; (routing_id, work_center_id, day, hours) slots."""
+    slots, day = [], start
+    for operation in operations:
+        hours = (
+            Decimal(operation.setup_hours) + Decimal(operation.run_hours_per_unit) * Decimal(order.quantity_required)
+        ).quantize(HOURS, rounding=ROUND_CEILING)
+        booked = timelines[operation.work_center_id].book(day, hours)
+        if booked:
+            day = booked[-1][0]
+        slots.extend((operation.routing_id, operation.work_center_id, d, h) for d, h in booked)
+    return slots
+
+async def _place_orders(db: AsyncSession, orders: Sequence, routings: Dict[int, list], start: date) -> dict:
+    """Place `orders`, in rank order, around the bookings already stored."""
+    center_ids = set()
+    for order in orders:
+        center_ids |= _centers_of(routings, order.product_id)
+    timelines = await _timelines(db, center_ids, start)
+    if timelines:
+        slot = models.ScheduledOperation
+        result = await db.execute(
+            select(slot.work_center_id, slot.day, func.sum(slot.hours))
+            .where(slot.work_center_id == any_(_ids(timelines)), slot.day >= start)
+            .group_by(slot.work_center_id, slot.day)
+        )
+        for center_id, day, hours in result:
+            timelines[center_id].load(day, hours)
+    unavailable = {center_id for center_id, timeline in timelines.items() if not timeline.available}
+    unavailable |= center_ids - set(timelines)
+
+    rows, dates = [], []
+    unrouted, unschedulable, late = [], [], []
+    for order in orders:
+        operations = routings.get(order.product_id)
+        if not operations:
+            unrouted.append(order.mo_id)
+            continue
+        if _centers_of(routings, order.product_id) & unavailable:
+            unschedulable.append(order.mo_id)
+            continue
+        slots = _place(order, operations, timelines, start)
+        rows.extend(
+            {"mo_id": order.mo_id, "routing_id": routing_id, "work_center_id": center_id, "day": day, "hours": hours}
+            for routing_id, center_id, day, hours in slots
+        )
+        first = slots[0][2] if slots else start
+        last = slots[-1][2] if slots else start
+        if order.status == "in_progress" and order.start_date is not None:
+            first = order.start_date # already started; only the rest is planned
+        if order.due_date is not None and last > order.due_date:
+            late.append(order.mo_id)
+        if (first, last) != (order.start_date, order.end_date):
+            dates.append({"b_mo_id": order.mo_id, "b_start_date": first, "b_end_date": last})
+
+    if rows:
+        await db.execute(insert(models.ScheduledOperation), rows)
+    if dates:
+        table = models.ManufacturingOrder.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.mo_id == bindparam("b_mo_id"))
+            .values(start_date=bindparam("b_start_date"), end_date=bindparam("b_end_date")),
+            dates,
+        )
+        await publish_many(db, "manufacturing_orders", "update", [d["b_mo_id"] for d in dates])
+    return {
+        "scheduled": len(orders) - len(unrouted) - len(unschedulable),
+        "updated": len(dates),
+        "unrouted": unrouted,
+        "unschedulable": unschedulable, # routed through a work center with no capacity
+        "late": late, # planned to finish after their due date
+    }
+
+async def schedule_all(db: AsyncSession, today: Optional[date] = None) -> dict:
+    """Replan every open order from `today`."""
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULING_LOCK_KEY})
+    start = today or datetime.utcnow().date()
+    orders = await _open_orders(db)
+    routings = await _routings(db)
+    await db.execute(delete(models.ScheduledOperation))
+    return await _place_orders(db, orders, routings, start)
+
+async def reschedule(db: AsyncSession, mo_id: int, previous: Optional[Snapshot] = None, today: Optional[date] = None) -> dict:
+    """Replan what a change to one order affects. `previous` is the order's
+    snapshot() before the change, None for new or previously closed orders."""
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULING_LOCK_KEY})
+    start = today or datetime.utcnow().date()
+    slot = models.ScheduledOperation
+    orders = await _open_orders(db)
+    routings = await _routings(db)
+    changed = next((order for order in orders if order.mo_id == mo_id), None)
+
+    # Work centers the order uses now, used before, or still has bookings on
+    centers = set((await db.execute(select(slot.work_center_id).where(slot.mo_id == mo_id).distinct())).scalars())
+    ranks = []
+    if changed is not None:
+        centers |= _centers_of(routings, changed.product_id)
+        ranks.append(rank(changed))
+    if previous is not None:
+        centers |= _centers_of(routings, previous.product_id)
+        ranks.append(previous.rank)
+    if not ranks:
+        await db.execute(delete(slot).where(slot.mo_id == mo_id))
+        return await _place_orders(db, [], routings, start)
+
+    first = min(ranks)
+    affected = []
+    for order in orders:
+        if order.mo_id != mo_id and rank(order) < first:
+            continue
+        used = _centers_of(routings, order.product_id)
+        if order.mo_id == mo_id or used & centers:
+            affected.append(order)
+            centers |= used
+    await db.execute(delete(slot).where(slot.mo_id == any_(_ids([mo_id] + [order.mo_id for order in affected]))))
+    return await _place_orders(db, affected, routings, start)
+
+async def unschedule(db: AsyncSession, mo_ids: Sequence[int]):
+    """Drop the bookings of closed orders. Later orders keep their dates
+    until they are replanned."""
+    if mo_ids:
+        slot = models.ScheduledOperation
+        await db.execute(delete(slot).where(slot.mo_id == any_(_ids(mo_ids))))
+
+@job_handler("production_schedule", max_attempts=2)
+async def production_schedule_job(ctx):
+    await ctx.progress(0, "Scheduling manufacturing orders", force=True)
+    result = await schedule_all(ctx.db)
+    await ctx.db.commit()
+    # Job results are stored as JSON; keep them small
+    return {
+        "scheduled": result["scheduled"],
+        "updated": result["updated"],
+        "unrouted": len(result["unrouted"]),
+        "unschedulable": result["unschedulable"],
+        "late": len(result["late"]),
+    }
+
+if PRODUCTION_SCHEDULE:
+    schedule_daily("production_schedule", PRODUCTION_SCHEDULE)
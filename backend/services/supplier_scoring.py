@@ -0,0 +1,217 @@
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Date, Integer, and_, any_, bindparam, case, delete, func, insert, literal, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import master_data as models
+from models import orders as order_models
+from services.jobs import job_handler, schedule_daily
+
+# Supplier performance scoring.
+#
+# A delivery is a purchase order line as received: the receiving notes of
+# one order and item (or of the whole order when notes name no item). It
+# is on time when its last note is dated no later than the order's
+# expected date (order date + SUPPLIER_LEAD_TIME_DAYS when none was given),
+# in full when the notes add up to the ordered quantity. Quality is the
+# share of compliant notes. One grouped query per breakdown computes the
+# rates for every supplier and rolling window in SUPPLIER_SCORE_WINDOWS,
+# overall and per item category, into supplier_scores; the score weighs
+# the three rates by SUPPLIER_SCORE_WEIGHTS. Supplier.rating is the
+# overall score over SUPPLIER_RATING_WINDOW_DAYS on a 0-5 scale.
+#
+# A new receiving note rescores its supplier only, in the same
+# transaction; the nightly job rescores everyone as the windows move on.
+# A full run holds SUPPLIER_SCORING_LOCK_KEY exclusively; a run for some
+# suppliers holds it shared plus a lock per supplier, so notes of different
+# suppliers score side by side and only wait for the nightly run.
+
+SUPPLIER_SCORING_SCHEDULE = os.getenv("SUPPLIER_SCORING_SCHEDULE", "03:15") # UTC, empty to disable
+SUPPLIER_SCORE_WINDOWS = [int(days) for days in os.getenv("SUPPLIER_SCORE_WINDOWS", "90,365").split(",")]
+SUPPLIER_RATING_WINDOW_DAYS = int(os.getenv("SUPPLIER_RATING_WINDOW_DAYS", 365))
+SUPPLIER_LEAD_TIME_DAYS = int(os.getenv("SUPPLIER_LEAD_TIME_DAYS", 14))
+# on time, in full, quality
+SUPPLIER_SCORE_WEIGHTS = [float(weight) for weight in os.getenv("SUPPLIER_SCORE_WEIGHTS", "0.4,0.3,0.3").split(",")]
+SUPPLIER_SCORING_LOCK_KEY = 7_340_007 # pg advisory lock id
+
+RATE = Decimal("0.0001")
+MAX_RATING = 5
+
+def _deliveries(today: date, supplier_ids: Optional[List[int]]):
+    note = order_models.ReceivingNote
+    order, line = order_models.Order, order_models.OrderItem
+    due = func.coalesce(order.expected_date, order.order_date + SUPPLIER_LEAD_TIME_DAYS)
+    received = (
+        select(
+            order.supplier_id,
+            note.purchase_order_id.label("order_id"),
+            note.item_id,
+            func.max(note.date_received).label("received_on"),
+            func.min(due).label("due"),
+            func.sum(note.quantity_received).label("received"),
+            func.count().label("notes"),
+            func.count().filter(note.quality_status == "compliant").label("compliant"),
+        )
+        .join(order, order.order_id == note.purchase_order_id)
+        .where(order.order_type == "purchase", order.supplier_id.is_not(None))
+        .group_by(order.supplier_id, note.purchase_order_id, note.item_id)
+        .having(func.max(note.date_received) >= literal(today, Date) - max(SUPPLIER_SCORE_WINDOWS))
+    )
+    if supplier_ids is not None:
+        received = received.where(order.supplier_id == any_(literal(sorted(set(supplier_ids)), ARRAY(Integer))))
+    received = received.cte("received")
+
+    ordered = (
+        select(line.order_id, line.item_id, func.sum(line.quantity).label("quantity"))
+        .where(line.order_id.in_(select(received.c.order_id)))
+        .group_by(line.order_id, line.item_id)
+        .cte("ordered")
+    )
+    ordered_total = (
+        select(ordered.c.order_id, func.sum(ordered.c.quantity).label("quantity"))
+        .group_by(ordered.c.order_id)
+        .cte("ordered_total")
+    )
+    quantity = case((received.c.item_id.is_(None), ordered_total.c.quantity), else_=ordered.c.quantity)
+    return (
+        select(
+            received,
+            case((received.c.received_on <= received.c.due, 1), else_=0).label("on_time"),
+            case((quantity.is_(None), None), (received.c.received >= quantity, 1), else_=0).label("in_full"),
+        )
+        .outerjoin(ordered, and_(ordered.c.order_id == received.c.order_id, ordered.c.item_id == received.c.item_id))
+        .outerjoin(ordered_total, ordered_total.c.order_id == received.c.order_id)
+        .cte("deliveries")
+    )
+
+def _categorized(deliveries):
+    # Notes naming no item count for every category on their order
+    line, item = order_models.OrderItem, models.Item
+    return (
+        select(deliveries, item.category)
+        .outerjoin(line, and_(deliveries.c.item_id.is_(None), line.order_id == deliveries.c.order_id))
+        .join(item, item.item_id == func.coalesce(deliveries.c.item_id, line.item_id))
+        .where(item.category.is_not(None))
+        .distinct()
+        .cte("categorized")
+    )
+
+def _rates(deliveries, today: date, by_category: bool):
+    windows = func.unnest(literal(SUPPLIER_SCORE_WINDOWS, ARRAY(Integer))).table_valued("days").render_derived(name="windows")
+    category = deliveries.c.category if by_category else literal("")
+    return (
+        select(
+            deliveries.c.supplier_id,
+            windows.c.days,
+            category.label("category"),
+            func.count().label("deliveries"),
+            func.avg(deliveries.c.on_time).label("on_time_rate"),
+            func.avg(deliveries.c.in_full).label("in_full_rate"),
+            (func.sum(deliveries.c.compliant) / func.nullif(func.sum(deliveries.c.notes), 0)).label("quality_rate"),
+        )
+        .join(windows, deliveries.c.received_on >= literal(today, Date) - windows.c.days)
+        .group_by(deliveries.c.supplier_id, windows.c.days, *([deliveries.c.category] if by_category else []))
+    )
+
+def _score(rates: Iterable[Optional[Decimal]]) -> Decimal:
+    weighted = [(weight, rate) for weight, rate in zip(SUPPLIER_SCORE_WEIGHTS, rates) if rate is not None]
+    total = sum(weight for weight, _ in weighted)
+    if not total:
+        return Decimal(0)
+    return (sum(Decimal(str(weight)) * Decimal(rate) for weight, rate in weighted) / Decimal(str(total))).quantize(RATE)
+
+def _rate(value) -> Optional[Decimal]:
+    return None if value is None else Decimal(value).quantize(RATE)
+
+async def score_suppliers(db: AsyncSession, supplier_ids: Optional[Iterable[int]] = None, today: Optional[date] = None) -> dict:
+    """Rescore `supplier_ids` (everyone when None)."""
+    supplier_ids = None if supplier_ids is None else sorted(set(supplier_ids))
+    if supplier_ids is None:
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SUPPLIER_SCORING_LOCK_KEY})
+    else:
+        await db.execute(text("SELECT pg_advisory_xact_lock_shared(:key)"), {"key": SUPPLIER_SCORING_LOCK_KEY})
+        for supplier_id in supplier_ids:
+            await db.execute(
+                text("SELECT pg_advisory_xact_lock(:key, :supplier_id)"),
+                {"key": SUPPLIER_SCORING_LOCK_KEY, "supplier_id": supplier_id},
+            )
+    today = today or datetime.utcnow().date()
+    deliveries = _deliveries(today, supplier_ids)
+    rows = (await db.execute(_rates(deliveries, today, False))).all()
+    rows += (await db.execute(_rates(_categorized(deliveries), today, True))).all()
+
+    now = datetime.utcnow()
+    scores = []
+    for supplier_id, days, category, count, on_time, in_full, quality in rows:
+        rates = [_rate(on_time), _rate(in_full), _rate(quality)]
+        scores.append({
+            "supplier_id": supplier_id,
+            "window_days": days,
+            "category": category,
+            "deliveries": count,
+            "on_time_rate": rates[0],
+            "in_full_rate": rates[1],
+            "quality_rate": rates[2],
+            "score": _score(rates),
+            "computed_at": now,
+        })
+
+    score = models.SupplierScore
+    stale = delete(score)
+    if supplier_ids is not None:
+        stale = stale.where(score.supplier_id == any_(literal(supplier_ids, ARRAY(Integer))))
+    await db.execute(stale)
+    if scores:
+        await db.execute(insert(score), scores)
+
+    ratings = {
+        row["supplier_id"]: round(float(row["score"]) * MAX_RATING, 2)
+        for row in scores
+        if row["window_days"] == SUPPLIER_RATING_WINDOW_DAYS and row["category"] == ""
+    }
+    if ratings:
+        supplier = models.Supplier.__table__
+        await db.execute(
+            update(supplier)
+            .where(supplier.c.supplier_id == bindparam("b_supplier_id"))
+            .values(rating=bindparam("b_rating")),
+            [{"b_supplier_id": supplier_id, "b_rating": rating} for supplier_id, rating in ratings.items()],
+        )
+    return {"suppliers": len({row["supplier_id"] for row in scores}), "scores": len(scores), "ratings_updated": len(ratings)}
+
+async def rank_suppliers(
+    db: AsyncSession,
+    category: Optional[str] = None,
+    window_days: int = SUPPLIER_RATING_WINDOW_DAYS,
+    min_deliveries: int = 1,
+    limit: int = 100,
+) -> List[Dict]:
+    score, supplier = models.SupplierScore, models.Supplier
+    result = await db.execute(
+        select(score, supplier.company_name, supplier.rating)
+        .join(supplier, supplier.supplier_id == score.supplier_id)
+        .where(
+            score.category == (category or ""),
+            score.window_days == window_days,
+            score.deliveries >= min_deliveries,
+        )
+        .order_by(score.score.desc(), score.deliveries.desc(), score.supplier_id)
+        .limit(limit)
+    )
+    return [
+        {**{c.key: getattr(row, c.key) for c in score.__table__.c}, "company_name": company_name, "rating": rating}
+        for row, company_name, rating in result
+    ]
+
+@job_handler("supplier_scoring", max_attempts=2)
+async def supplier_scoring_job(ctx):
+    await ctx.progress(0, "Scoring suppliers", force=True)
+    result = await score_suppliers(ctx.db)
+    await ctx.db.commit()
+    return result
+
+if SUPPLIER_SCORING_SCHEDULE:
+    schedule_daily("supplier_scoring", SUPPLIER_SCORING_SCHEDULE)
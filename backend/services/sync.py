@@ -0,0 +1,157 @@
+import base64
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import BigInteger, delete, literal, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as inventory_models
+from models import master_data as master_data_models
+from models import production as production_models
+from models.sync import SyncTombstone
+from schemas import inventory as inventory_schemas
+from schemas import master_data as master_data_schemas
+from schemas import production as production_schemas
+from schemas.compat import from_orm
+from services.jobs import job_handler, schedule_daily
+
+# Delta sync for offline clients (scanner tablets, shop-floor terminals).
+#
+# Every write to a tracked table goes through the sync_touch trigger, which
+# stamps updated_at and sync_xid, the id of the writing transaction. Deletes
+# leave a tombstone (sync_tombstone trigger). A client keeps an opaque
+# watermark and asks for what changed since; per table it holds a cursor
+# (cycle start, sync_xid, key) for the rows and one for the tombstones,
+# read in (sync_xid, key) order so every page is an index range scan.
+#
+# Transactions commit out of xid order, so a pass over a table does not
+# stop at the last xid it saw: the next pass starts again from the oldest
+# transaction that was still running when the pass began (the snapshot
+# xmin). Rows written by those transactions are sent once they commit;
+# rows may arrive twice and clients apply them as upserts. Watermarks older
+# than SYNC_TOMBSTONE_DAYS may have missed purged tombstones and get a
+# full resync.
+
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", 30))
+SYNC_TOMBSTONE_PURGE_SCHEDULE = os.getenv("SYNC_TOMBSTONE_PURGE_SCHEDULE", "03:45") # UTC, empty to disable
+SYNC_MAX_LIMIT = 1000 # per table; also the API-wide MAX_PAGE_SIZE
+
+class SyncTable(NamedTuple):
+    model: Any
+    schema: Any
+
+# Tracked tables; names follow the list URLs
+SYNC_TABLES: Dict[str, SyncTable] = {
+    "items": SyncTable(master_data_models.Item, master_data_schemas.Item),
+    "products": SyncTable(master_data_models.Product, master_data_schemas.Product),
+    "locations": SyncTable(inventory_models.Location, inventory_schemas.Location),
+    "inventory_levels": SyncTable(inventory_models.InventoryLevel, inventory_schemas.InventoryLevel),
+    "bill_of_materials": SyncTable(production_models.BillOfMaterials, production_schemas.BillOfMaterials),
+    "manufacturing_orders": SyncTable(production_models.ManufacturingOrder, production_schemas.ManufacturingOrder),
+}
+
+def primary_key(model):
+    return model.__table__.primary_key.columns[0]
+
+# [cycle start xid or None between passes, sync_xid, key]
+Cursor = List[Optional[int]]
+
+def _encode(cursors: Dict[str, Cursor]) -> str:
+    payload = json.dumps({"t": int(time.time()), "c": cursors}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode(watermark: str) -> Optional[Dict[str, Cursor]]:
+    """Cursors of a watermark, or None when it is too old to resume from."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(watermark + "=" * (-len(watermark) % 4)))
+        issued, cursors = payload["t"], payload["c"]
+        for start, xid, key in cursors.values():
+            if not all(value is None or isinstance(value, int) for value in (start, xid, key)):
+                raise ValueError(start, xid, key)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=422, detail="Invalid sync watermark")
+    if time.time() - issued > SYNC_TOMBSTONE_DAYS * 86400:
+        return None
+    return cursors
+
+async def _page(db: AsyncSession, query, xid_column, key_column, cursor: Cursor, xmin: int, limit: int):
+    """One page of a stream. Returns (rows, next cursor, more to read)."""
+    start, xid, key = cursor
+    if start is None:
+        start = xmin
+    result = await db.execute(
+        query.where(tuple_(xid_column, key_column) > tuple_(literal(xid, BigInteger), literal(key, BigInteger)))
+        .order_by(xid_column, key_column)
+        .limit(limit + 1)
+    )
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, [start, last.sync_xid, last.key], True
+    # Pass complete; the next one starts where this one's oldest
+    # in-progress transaction was
+    return rows, [None, start, 0], False
+
+async def changes(
+    db: AsyncSession,
+    tables: Sequence[str],
+    since: Optional[str] = None,
+    limit: int = 500,
+    location_id: Optional[int] = None,
+) -> dict:
+    cursors = _decode(since) if since else None
+    full_resync = cursors is None
+    cursors = dict(cursors or {})
+    xmin = await db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+    result, more = {}, False
+    for name in tables:
+        model, schema = SYNC_TABLES[name]
+        key = primary_key(model)
+        deletes_name = f"{name}:deletes"
+        if name not in cursors:
+            # First sync of this table: every row, and only deletes from now on
+            cursors[name] = [None, -1, 0]
+            cursors[deletes_name] = [None, xmin, 0]
+
+        query = select(model, model.sync_xid.label("sync_xid"), key.label("key"))
+        if location_id is not None and name == "inventory_levels":
+            query = query.where(model.location_id == location_id)
+        rows, cursors[name], rows_more = await _page(db, query, model.sync_xid, key, cursors[name], xmin, limit)
+
+        tombstone = SyncTombstone
+        tombstones = (
+            select(tombstone.row_id, tombstone.sync_xid, tombstone.tombstone_id.label("key"))
+            .where(tombstone.table_name == model.__tablename__)
+        )
+        deleted, cursors[deletes_name], deletes_more = await _page(
+            db, tombstones, tombstone.sync_xid, tombstone.tombstone_id, cursors[deletes_name], xmin, limit
+        )
+
+        result[name] = {
+            "upserts": [
+                {**jsonable_encoder(from_orm(schema, row[0])), "updated_at": row[0].updated_at}
+                for row in rows
+            ],
+            "deletes": [row.row_id for row in deleted],
+        }
+        more = more or rows_more or deletes_more
+
+    return {"watermark": _encode(cursors), "full_resync": full_resync, "has_more": more, "tables": result}
+
+@job_handler("sync_tombstone_purge", max_attempts=2)
+async def purge_job(ctx):
+    await ctx.progress(0, "Purging sync tombstones", force=True)
+    result = await ctx.db.execute(
+        delete(SyncTombstone).where(SyncTombstone.deleted_at < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS))
+    )
+    await ctx.db.commit()
+    return {"deleted": result.rowcount}
+
+if SYNC_TOMBSTONE_PURGE_SCHEDULE:
+    schedule_daily("sync_tombstone_purge", SYNC_TOMBSTONE_PURGE_SCHEDULE)
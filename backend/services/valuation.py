@@ -0,0 +1,393 @@
+import os
+from collections import defaultdict, deque
+from datetime import datetime, time as dtime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+from fastapi import HTTPException
+from sqlalchemy import bindparam, case, delete, func, literal, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import inventory as models
+from models import orders as order_models
+from services.inventory import MOVEMENT_SIGNS
+from services.jobs import job_handler, schedule_daily
+from services.ledger import post_stock_movements, reverse_source
+from services.partitions import with_archive
+from services.pricing import ZERO, round_money, to_decimal
+
+# Inventory valuation.
+#
+# Every movement is costed when it is posted and carries unit_cost and
+# total_cost. Inbound stock is costed at the given unit cost, else at the
+# net price of its purchase order line. Outbound stock is costed by
+# INVENTORY_VALUATION_METHOD:
+#   fifo    - consumes valuation layers (one per receipt) oldest first
+#   average - at the item's moving average cost
+# item_valuations keeps running quantity and value per item, so posting
+# costs one locked row per item and never re-reads movement history; its
+# value always equals the sum of signed movement costs. Transfers are
+# costed at the current average and net out across locations. Receipts
+# and issues post to the general ledger in the same transaction.
+#
+# As-of reports (value, stock on hand, stock card openings) start from the
+# latest snapshot of quantity and value per item and location at or before
+# the requested time and add the movements dated after it. Snapshots are
+# taken daily at midnight UTC by the valuation_snapshot job, built the
+# same way, so a report never scans more than about a day of movements.
+# Movements backdated before the latest snapshot are not in that
+# snapshot, just as postings into a closed period would not be. Reports
+# reaching back into archived fiscal years also read the archive.
+
+VALUATION_METHODS = ("fifo", "average")
+VALUATION_METHOD = os.getenv("INVENTORY_VALUATION_METHOD", "fifo").lower()
+if VALUATION_METHOD not in VALUATION_METHODS:
+    raise RuntimeError(f"INVENTORY_VALUATION_METHOD must be one of {', '.join(VALUATION_METHODS)}")
+VALUATION_SNAPSHOT_SCHEDULE = os.getenv("VALUATION_SNAPSHOT_SCHEDULE", "00:05") # UTC, empty to disable
+
+UNIT_COST_QUANTUM = Decimal("0.0001")
+
+def _unit_cost(total: Decimal, quantity: Decimal) -> Decimal:
+    return (total / quantity).quantize(UNIT_COST_QUANTUM) if quantity else ZERO
+
+async def _lock_totals(db: AsyncSession, item_ids: List[int]) -> Dict[int, List[Decimal]]:
+    """Running [quantity, value] per item, row-locked in item order so
+    concurrent postings for the same items serialize without deadlocks."""
+    totals = models.ItemValuation.__table__
+    await db.execute(
+        pg_insert(totals)
+        .values([{"item_id": item_id, "quantity": 0, "value": 0} for item_id in item_ids])
+        .on_conflict_do_nothing(index_elements=["item_id"])
+    )
+    result = await db.execute(
+        select(totals.c.item_id, totals.c.quantity, totals.c.value)
+        .where(totals.c.item_id.in_(item_ids))
+        .order_by(totals.c.item_id)
+        .with_for_update()
+    )
+    return {item_id: [Decimal(quantity), Decimal(value)] for item_id, quantity, value in result}
+
+async def _save_totals(db: AsyncSession, totals: Dict[int, List[Decimal]]):
+    table = models.ItemValuation.__table__
+    now = datetime.utcnow()
+    await db.execute(
+        update(table)
+        .where(table.c.item_id == bindparam("b_item_id"))
+        .values(quantity=bindparam("b_quantity"), value=bindparam("b_value"), updated_at=now),
+        [{"b_item_id": item_id, "b_quantity": quantity, "b_value": value} for item_id, (quantity, value) in totals.items()],
+    )
+
+async def _purchase_costs(db: AsyncSession, movements: Sequence[dict]) -> Dict[tuple, Decimal]:
+    """Net unit price per (purchase order, item) for uncosted receipts."""
+    wanted = {
+        (m["reference_id"], m["item_id"])
+        for m in movements
+        if m["movement_type"] == "inbound" and m.get("unit_cost") is None and m.get("reference_id") is not None
+    }
+    if not wanted:
+        return {}
+    order, line = order_models.Order, order_models.OrderItem
+    result = await db.execute(
+        select(line.order_id, line.item_id, func.sum(line.line_total), func.sum(line.quantity))
+        .join(order, order.order_id == line.order_id)
+        .where(
+            order.order_type == "purchase",
+            line.order_id.in_({order_id for order_id, _ in wanted}),
+            line.item_id.in_({item_id for _, item_id in wanted}),
+        )
+        .group_by(line.order_id, line.item_id)
+    )
+    return {(order_id, item_id): _unit_cost(Decimal(total), Decimal(quantity)) for order_id, item_id, total, quantity in result}
+
+async def _open_layers(db: AsyncSession, item_ids: List[int]) -> Dict[int, deque]:
+    layer = models.ValuationLayer
+    result = await db.execute(
+        select(layer.layer_id, layer.item_id, layer.remaining, layer.unit_cost)
+        .where(layer.item_id.in_(item_ids), layer.remaining > 0)
+        .order_by(layer.item_id, layer.layer_id)
+    )
+    queues: Dict[int, deque] = defaultdict(deque)
+    for layer_id, item_id, remaining, unit_cost in result:
+        queues[item_id].append({"layer_id": layer_id, "remaining": Decimal(remaining), "unit_cost": Decimal(unit_cost)})
+    return queues
+
+async def value_movements(db: AsyncSession, movements: Sequence[dict]) -> Dict[int, dict]:
+    """Cost freshly inserted movements and update the valuation.
+
+    `movements` are stock_movements rows as dicts; a unit_cost already on an
+    inbound row is kept. Costs are written back to the rows in one
+    executemany and returned as {movement_id: {"unit_cost", "total_cost"}}.
+    """
+    if not movements:
+        return {}
+    movements = sorted(movements, key=lambda m: (m["date"] or datetime.min, m["movement_id"]))
+    item_ids = sorted({m["item_id"] for m in movements})
+    totals = await _lock_totals(db, item_ids)
+    purchase_costs = await _purchase_costs(db, movements)
+    fifo = VALUATION_METHOD == "fifo"
+    queues = await _open_layers(db, item_ids) if fifo else {}
+
+    costs: Dict[int, dict] = {}
+    for m in movements:
+        item_totals = totals[m["item_id"]]
+        quantity = Decimal(m["quantity"])
+        average = _unit_cost(item_totals[1], item_totals[0]) if item_totals[0] > 0 else ZERO
+        if m["movement_type"] == "inbound":
+            unit_cost = m.get("unit_cost")
+            if unit_cost is None:
+                unit_cost = purchase_costs.get((m.get("reference_id"), m["item_id"]), average)
+            unit_cost = to_decimal(unit_cost)
+            total = round_money(quantity * unit_cost)
+            item_totals[0] += quantity
+            item_totals[1] += total
+            if fifo:
+                queues[m["item_id"]].append({
+                    "layer_id": None,
+                    "movement_id": m["movement_id"],
+                    "received_at": m["date"],
+                    "quantity": quantity,
+                    "remaining": quantity,
+                    "unit_cost": unit_cost,
+                })
+        elif m["movement_type"] == "outbound":
+            if fifo:
+                total, left = ZERO, quantity
+                for open_layer in queues[m["item_id"]]:
+                    if not left:
+                        break
+                    take = min(left, open_layer["remaining"])
+                    if take:
+                        open_layer["remaining"] -= take
+                        open_layer["touched"] = True
+                        total += take * open_layer["unit_cost"]
+                        left -= take
+                # Stock received before valuation has no layer; cost it at the average
+                total = round_money(total + left * average)
+            else:
+                total = round_money(quantity * average)
+            if quantity == item_totals[0]:
+                # Emptying the item takes exactly the value left, rounding included
+                total = item_totals[1]
+            unit_cost = _unit_cost(total, quantity)
+            item_totals[0] -= quantity
+            item_totals[1] -= total
+        else:
+            # Transfers move value between locations, not in or out of stock
+            unit_cost = average
+            total = round_money(quantity * average)
+        costs[m["movement_id"]] = {"unit_cost": unit_cost, "total_cost": total}
+
+    table = models.StockMovement.__table__
+    await db.execute(
+        update(table)
+        .where(table.c.movement_id == bindparam("b_movement_id"))
+        .values(unit_cost=bindparam("b_unit_cost"), total_cost=bindparam("b_total_cost")),
+        [{"b_movement_id": movement_id, "b_unit_cost": c["unit_cost"], "b_total_cost": c["total_cost"]} for movement_id, c in costs.items()],
+    )
+    await _save_totals(db, totals)
+    if fifo:
+        await _save_layers(db, queues)
+    await post_stock_movements(db, [{**m, **costs[m["movement_id"]]} for m in movements])
+    return costs
+
+async def _save_layers(db: AsyncSession, queues: Dict[int, deque]):
+    layers = models.ValuationLayer.__table__
+    changed = [l for queue in queues.values() for l in queue if l["layer_id"] is not None and l.get("touched")]
+    if changed:
+        await db.execute(
+            update(layers)
+            .where(layers.c.layer_id == bindparam("b_layer_id"))
+            .values(remaining=bindparam("b_remaining")),
+            [{"b_layer_id": l["layer_id"], "b_remaining": l["remaining"]} for l in changed],
+        )
+    created = [
+        dict(item_id=item_id, **{key: l[key] for key in ("movement_id", "received_at", "quantity", "remaining", "unit_cost")})
+        for item_id, queue in queues.items()
+        for l in queue
+        if l["layer_id"] is None
+    ]
+    if created:
+        await db.execute(layers.insert(), created)
+
+async def reverse_movement(db: AsyncSession, movement: models.StockMovement):
+    """Undo a movement's effect on the valuation before it is deleted."""
+    if movement.movement_type not in ("inbound", "outbound"):
+        return
+    await reverse_source(db, "stock_movement", movement.movement_id)
+    item_totals = (await _lock_totals(db, [movement.item_id]))[movement.item_id]
+    quantity = Decimal(movement.quantity)
+    total = to_decimal(movement.total_cost)
+    layer = models.ValuationLayer
+    if movement.movement_type == "inbound":
+        if VALUATION_METHOD == "fifo":
+            deleted = await db.scalar(
+                delete(layer)
+                .where(layer.movement_id == movement.movement_id, layer.remaining >= layer.quantity)
+                .returning(layer.layer_id)
+                .execution_options(synchronize_session=False)
+            )
+            if deleted is None and await db.scalar(select(layer.layer_id).where(layer.movement_id == movement.movement_id).limit(1)):
+                raise HTTPException(status_code=409, detail="Stock from this receipt has already been issued")
+        item_totals[0] -= quantity
+        item_totals[1] -= total
+    else:
+        if VALUATION_METHOD == "fifo":
+            # Put the issued stock back as a layer at the cost it left at
+            await db.execute(layer.__table__.insert(), [{
+                "item_id": movement.item_id,
+                "movement_id": movement.movement_id,
+                "received_at": movement.date,
+                "quantity": quantity,
+                "remaining": quantity,
+                "unit_cost": to_decimal(movement.unit_cost),
+            }])
+        item_totals[0] += quantity
+        item_totals[1] += total
+    await _save_totals(db, {movement.item_id: item_totals})
+
+def _sign(movement=models.StockMovement):
+    movement_type = movement.movement_type
+    return case(*((movement_type == kind, sign) for kind, sign in MOVEMENT_SIGNS.items()), else_=0)
+
+def _signed(movement, column):
+    return func.sum(_sign(movement) * func.coalesce(column, 0))
+
+async def _balances_query(db: AsyncSession, as_of: datetime, location_id: Optional[int] = None, item_id: Optional[int] = None):
+    """(select of item_id, location_id, quantity, value as of `as_of`,
+    taken_at of the snapshot it starts from)."""
+    snapshot = models.ValuationSnapshot
+    base_at = await db.scalar(select(func.max(snapshot.taken_at)).where(snapshot.taken_at <= as_of))
+
+    # Archived years are only read when there is no snapshot to start from after them
+    movement = with_archive(models.StockMovement, base_at)
+    moved = (
+        select(movement.item_id, movement.location_id, _signed(movement, movement.quantity).label("quantity"), _signed(movement, movement.total_cost).label("value"))
+        .where(movement.date <= as_of, movement.location_id.is_not(None))
+        .group_by(movement.item_id, movement.location_id)
+    )
+    parts = [moved]
+    if base_at is not None:
+        moved = moved.where(movement.date > base_at)
+        parts = [
+            select(snapshot.item_id, snapshot.location_id, snapshot.quantity, snapshot.value).where(snapshot.taken_at == base_at),
+            moved,
+        ]
+    if location_id is not None:
+        parts = [part.where(part.selected_columns.location_id == location_id) for part in parts]
+    if item_id is not None:
+        parts = [part.where(part.selected_columns.item_id == item_id) for part in parts]
+    combined = union_all(*parts).subquery("combined")
+    quantity, value = func.sum(combined.c.quantity), func.sum(combined.c.value)
+    query = (
+        select(combined.c.item_id, combined.c.location_id, quantity.label("quantity"), value.label("value"))
+        .group_by(combined.c.item_id, combined.c.location_id)
+        .having((quantity != 0) | (value != 0))
+    )
+    return query, base_at
+
+async def valuation_as_of(db: AsyncSession, as_of: Optional[datetime] = None, location_id: Optional[int] = None) -> dict:
+    as_of = as_of or datetime.utcnow()
+    query, base_at = await _balances_query(db, as_of, location_id)
+    result = await db.execute(query.order_by("location_id", "item_id"))
+    lines = [dict(row) for row in result.mappings()]
+    return {
+        "as_of": as_of,
+        "method": VALUATION_METHOD,
+        "snapshot_at": base_at,
+        "total_value": sum((Decimal(line["value"]) for line in lines), ZERO),
+        "lines": lines,
+    }
+
+async def stock_as_of(db: AsyncSession, as_of: datetime, location_id: Optional[int] = None, item_id: Optional[int] = None) -> dict:
+    query, base_at = await _balances_query(db, as_of, location_id, item_id)
+    result = await db.execute(query.order_by("location_id", "item_id"))
+    lines = [{"item_id": row.item_id, "location_id": row.location_id, "on_hand": row.quantity} for row in result if row.quantity]
+    return {"as_of": as_of, "snapshot_at": base_at, "lines": lines}
+
+async def stock_card(
+    db: AsyncSession,
+    item_id: int,
+    location_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+) -> dict:
+    """Movements of an item with running quantity and value balances.
+
+    The opening balance comes from the snapshots; the running balances are
+    window sums over the movements in range, so a page costs one query
+    however long the history is.
+    """
+    date_to = date_to or datetime.utcnow()
+    opening_quantity = opening_value = ZERO
+    if date_from is not None:
+        query, _ = await _balances_query(db, date_from - timedelta(microseconds=1), location_id, item_id)
+        for row in await db.execute(query):
+            opening_quantity += Decimal(row.quantity)
+            opening_value += Decimal(row.value)
+
+    movement = with_archive(models.StockMovement, date_from)
+    signed_quantity = _sign(movement) * movement.quantity
+    signed_cost = _sign(movement) * func.coalesce(movement.total_cost, 0)
+    window = {"order_by": (movement.date, movement.movement_id)}
+    query = (
+        select(
+            movement.movement_id,
+            movement.date,
+            movement.movement_type,
+            movement.transaction_number,
+            movement.reference_id,
+            movement.location_id,
+            signed_quantity.label("quantity"),
+            movement.unit_cost,
+            movement.total_cost,
+            (opening_quantity + func.sum(signed_quantity).over(**window)).label("balance"),
+            (opening_value + func.sum(signed_cost).over(**window)).label("value_balance"),
+        )
+        .where(movement.item_id == item_id, movement.date <= date_to)
+        .order_by(movement.date, movement.movement_id)
+        .offset(skip)
+        .limit(limit)
+    )
+    if date_from is not None:
+        query = query.where(movement.date >= date_from)
+    if location_id is not None:
+        query = query.where(movement.location_id == location_id)
+    result = await db.execute(query)
+    return {
+        "item_id": item_id,
+        "location_id": location_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "opening_balance": opening_quantity,
+        "opening_value": opening_value,
+        "lines": [dict(row) for row in result.mappings()],
+    }
+
+async def take_snapshot(db: AsyncSession, taken_at: datetime) -> int:
+    """Store the valuation as of `taken_at`; a no-op if it already exists."""
+    snapshot = models.ValuationSnapshot
+    exists = await db.scalar(select(snapshot.snapshot_id).where(snapshot.taken_at == taken_at).limit(1))
+    if exists is not None:
+        return 0
+    query, _ = await _balances_query(db, taken_at)
+    rows = query.subquery("valued")
+    result = await db.execute(
+        snapshot.__table__.insert().from_select(
+            ["taken_at", "item_id", "location_id", "quantity", "value"],
+            select(literal(taken_at), rows.c.item_id, rows.c.location_id, rows.c.quantity, rows.c.value),
+        )
+    )
+    return result.rowcount
+
+@job_handler("valuation_snapshot", max_attempts=3)
+async def valuation_snapshot_job(ctx):
+    taken_at = datetime.combine(datetime.utcnow().date(), dtime.min)
+    await ctx.progress(0, "Taking valuation snapshot", force=True)
+    rows = await take_snapshot(ctx.db, taken_at)
+    await ctx.db.commit()
+    return {"taken_at": taken_at.isoformat(), "rows": rows}
+
+if VALUATION_SNAPSHOT_SCHEDULE:
+    schedule_daily("valuation_snapshot", VALUATION_SNAPSHOT_SCHEDULE)
@@ -9,9 +9,48 @@ const api = axios.create({
     timeout: 120000, // 2 minutes timeout for Render Free Tier cold start
 });
 
+// Idempotency keys for writes. Identical writes (double clicks, or a retry
+// after a timeout with no response) reuse the key of the first attempt, so
+// the server runs them once and replays its response.
+const WRITE_METHODS = ['post', 'put', 'patch', 'delete'];
+const KEY_REUSE_MS = 5000; // after a response, identical writes count as duplicates this long
+const KEY_RETRY_MS = 10 * 60 * 1000; // after a timeout, a manual retry reuses the key this long
+const idempotencyKeys = new Map(); // request fingerprint -> { key, expires }
+
+const newKey = () =>
+    window.crypto?.randomUUID?.() || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+const fingerprint = (config) =>
+    `${config.method} ${config.url} ${JSON.stringify(config.params || {})} ${typeof config.data === 'string' ? config.data : JSON.stringify(config.data ?? null)}`;
+
+const assignIdempotencyKey = (config) => {
+    const now = Date.now();
+    for (const [print, entry] of idempotencyKeys) {
+        if (entry.expires < now) idempotencyKeys.delete(print);
+    }
+    const print = fingerprint(config);
+    let entry = idempotencyKeys.get(print);
+    if (!entry) {
+        entry = { key: newKey(), expires: Infinity }; // kept while in flight
+        idempotencyKeys.set(print, entry);
+    }
+    config.headers['Idempotency-Key'] = entry.key;
+    config.idempotencyFingerprint = print;
+};
+
+const settleIdempotencyKey = (config, ttl) => {
+    const entry = config && idempotencyKeys.get(config.idempotencyFingerprint);
+    if (!entry) return;
+    if (ttl > 0) entry.expires = Date.now() + ttl;
+    else idempotencyKeys.delete(config.idempotencyFingerprint);
+};
+
 // Add auth token to requests
 api.interceptors.request.use(
     (config) => {
+        if (WRITE_METHODS.includes(config.method) && !config.headers['Idempotency-Key']) {
+            assignIdempotencyKey(config);
+        }
         const authStorage = localStorage.getItem('auth-storage');
         if (authStorage) {
             try {
@@ -32,8 +71,14 @@ api.interceptors.request.use(
 
 // Handle response errors
 api.interceptors.response.use(
-    (response) => response,
+    (response) => {
+        settleIdempotencyKey(response.config, KEY_REUSE_MS);
+        return response;
+    },
     (error) => {
+        // No response means the write may have happened: keep the key for a retry.
+        // An error response means it did not: the next attempt is a new request.
+        settleIdempotencyKey(error.config, error.response ? 0 : KEY_RETRY_MS);
         // Handle 401 errors - redirect to login
         if (error.response?.status === 401 && !window.location.pathname.includes('/login')) {
             localStorage.removeItem('auth-storage');
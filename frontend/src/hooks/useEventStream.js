@@ -0,0 +1,47 @@
+import { useEffect, useRef } from 'react';
+import api from '../api/axios';
+
+/**
+ * Apply a change event ({ op, id, data }) to a list of rows keyed by idKey
+ */
+export const applyChange = (rows, event, idKey) => {
+    if (event.op === 'delete') {
+        return rows.filter((row) => row[idKey] !== event.id);
+    }
+    if (!event.data) {
+        return rows;
+    }
+    const index = rows.findIndex((row) => row[idKey] === event.id);
+    if (index === -1) {
+        return [...rows, event.data];
+    }
+    const next = [...rows];
+    next[index] = { ...rows[index], ...event.data };
+    return next;
+};
+
+/**
+ * Custom hook subscribing to live change events (server-sent events)
+ * so pages can patch their local state instead of refetching lists
+ */
+export const useEventStream = (topics, onEvent, options = {}) => {
+    const handlers = useRef({ onEvent, onResync: options.onResync });
+    handlers.current = { onEvent, onResync: options.onResync };
+    const topicKey = topics.join(',');
+
+    useEffect(() => {
+        const source = new EventSource(`${api.defaults.baseURL}/events/stream?topics=${topicKey}`);
+        const listener = (message) => {
+            try {
+                handlers.current.onEvent(JSON.parse(message.data));
+            } catch (e) {
+                console.error('Error handling change event:', e);
+            }
+        };
+        const resync = () => handlers.current.onResync?.();
+
+        topicKey.split(',').forEach((topic) => source.addEventListener(topic, listener));
+        source.addEventListener('resync', resync);
+        return () => source.close();
+    }, [topicKey]);
+};
@@ -0,0 +1,69 @@
+import { useState, useEffect, useRef } from 'react';
+import api from '../api/axios';
+import useToastStore from '../store/toastStore';
+import { getErrorMessage } from '../utils/errorHandler';
+
+const TERMINAL_STATUSES = ['succeeded', 'failed', 'cancelled'];
+
+/**
+ * Custom hook for starting a background job and polling its progress
+ */
+export const useJob = (options = {}) => {
+    const [job, setJob] = useState(null);
+    const [error, setError] = useState(null);
+    const timer = useRef(null);
+    const addToast = useToastStore((state) => state.addToast);
+    const { pollInterval = 1500, showToastOnError = true } = options;
+
+    const stopPolling = () => {
+        if (timer.current) {
+            clearTimeout(timer.current);
+            timer.current = null;
+        }
+    };
+
+    const poll = async (jobId) => {
+        try {
+            const response = await api.get(`/jobs/${jobId}`);
+            setJob(response.data);
+            if (!TERMINAL_STATUSES.includes(response.data.status)) {
+                timer.current = setTimeout(() => poll(jobId), pollInterval);
+            }
+        } catch (err) {
+            setError(getErrorMessage(err));
+        }
+    };
+
+    const start = async (jobType, params = {}) => {
+        stopPolling();
+        setError(null);
+        try {
+            const response = await api.post('/jobs/', { job_type: jobType, params });
+            setJob(response.data);
+            timer.current = setTimeout(() => poll(response.data.job_id), pollInterval);
+            return response.data;
+        } catch (err) {
+            const errorMsg = getErrorMessage(err);
+            setError(errorMsg);
+            if (showToastOnError) {
+                addToast(errorMsg, 'error');
+            }
+            return null;
+        }
+    };
+
+    const cancel = async () => {
+        if (!job) return;
+        try {
+            const response = await api.post(`/jobs/${job.job_id}/cancel`);
+            setJob(response.data);
+        } catch (err) {
+            setError(getErrorMessage(err));
+        }
+    };
+
+    useEffect(() => stopPolling, []);
+
+    const running = job !== null && !TERMINAL_STATUSES.includes(job.status);
+    return { job, error, running, start, cancel };
+};
@@ -38,11 +38,11 @@ const Dashboard = () => {
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6 mb-8">
                 <div className="bg-white p-6 rounded-xl shadow-lg hover:shadow-xl transition-all duration-300 border-l-4 border-blue-500 transform hover:-translate-y-1">
                     <h3 className="text-gray-500 text-sm font-semibold uppercase tracking-wider">{t('dashboard.totalSales')}</h3>
-                    <p className="text-3xl font-bold text-gray-900 mt-2">${stats.financials.total_sales.toLocaleString()}</p>
+                    <p className="text-3xl font-bold text-gray-900 mt-2">${Number(stats.financials.total_sales).toLocaleString()}</p>
                 </div>
                 <div className="bg-white p-6 rounded-xl shadow-lg hover:shadow-xl transition-all duration-300 border-l-4 border-green-500 transform hover:-translate-y-1">
                     <h3 className="text-gray-500 text-sm font-semibold uppercase tracking-wider">{t('dashboard.totalPurchases')}</h3>
-                    <p className="text-3xl font-bold text-gray-900 mt-2">${stats.financials.total_purchases.toLocaleString()}</p>
+                    <p className="text-3xl font-bold text-gray-900 mt-2">${Number(stats.financials.total_purchases).toLocaleString()}</p>
                 </div>
                 <div className="bg-white p-6 rounded-xl shadow-lg hover:shadow-xl transition-all duration-300 border-l-4 border-red-500 transform hover:-translate-y-1">
                     <h3 className="text-gray-500 text-sm font-semibold uppercase tracking-wider">{t('dashboard.pendingInvoices')}</h3>
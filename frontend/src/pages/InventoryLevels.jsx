@@ -7,6 +7,7 @@ import ConfirmDialog from '../components/ConfirmDialog';
 import FormInput from '../components/FormInput';
 import FormSection from '../components/FormSection';
 import FormSelect from '../components/FormSelect';
+import { useEventStream, applyChange } from '../hooks/useEventStream';
 
 const InventoryLevels = () => {
     const { t } = useTranslation();
@@ -33,6 +34,10 @@ const InventoryLevels = () => {
         fetchItems();
     }, []);
 
+    useEventStream(['inventory_levels'], (event) => {
+        setLevels((prev) => applyChange(prev, event, 'inventory_id'));
+    }, { onResync: () => fetchLevels() });
+
     const fetchLevels = async () => {
         setFetching(true);
         try {
@@ -281,7 +286,7 @@ const InventoryLevels = () => {
                         <tbody className="bg-white divide-y divide-gray-100">
                             {levels.map((level, index) => {
                                 const item = items.find(i => i.item_id === level.item_id);
-                                const isLowStock = level.available <= level.reorder_point;
+                                const isLowStock = Number(level.available) <= Number(level.reorder_point);
                                 return (
                                     <tr
                                         key={level.inventory_id}
@@ -292,13 +297,13 @@ const InventoryLevels = () => {
                                             <div className="font-bold text-gray-900">{getItemName(level.item_id)}</div>
                                             <div className="text-xs text-gray-400">{item?.item_code}</div>
                                         </td>
-                                        <td className="px-6 py-4 whitespace-nowrap text-gray-600 font-medium">{level.on_hand}</td>
+                                        <td className="px-6 py-4 whitespace-nowrap text-gray-600 font-medium">{Number(level.on_hand)}</td>
                                         <td className="px-6 py-4 whitespace-nowrap">
                                             <span className={`font-bold ${isLowStock ? 'text-red-600' : 'text-green-600'}`}>
-                                                {level.available}
+                                                {Number(level.available)}
                                             </span>
                                         </td>
-                                        <td className="px-6 py-4 whitespace-nowrap text-gray-500 italic">{level.reorder_point}</td>
+                                        <td className="px-6 py-4 whitespace-nowrap text-gray-500 italic">{Number(level.reorder_point)}</td>
                                         <td className="px-6 py-4 whitespace-nowrap">
                                             <span className={`px-2 py-1 rounded text-xs font-bold border ${isLowStock ? 'bg-red-50 text-red-600 border-red-100' : 'bg-green-50 text-green-600 border-green-100'
                                                 }`}>
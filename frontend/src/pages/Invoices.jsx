@@ -47,7 +47,9 @@ const Invoices = () => {
 
     const fetchOrders = async () => {
         try {
-            const response = await api.get('/orders/');
+            const response = await api.get('/orders/', {
+                params: { fields: 'order_id,order_number,order_type' },
+            });
             setOrders(response.data);
         } catch (error) {
             console.error('Error fetching orders:', error);
@@ -163,7 +165,6 @@ const Invoices = () => {
                             name="invoice_number"
                             value={formData.invoice_number}
                             onChange={handleChange}
-                            required
                             disabled={loading}
                             placeholder={t('invoices.invoiceNumber')}
                             icon="🔢"
@@ -292,7 +293,7 @@ const Invoices = () => {
                                             {order ? `#${order.order_number}` : `ID: ${invoice.order_id}`}
                                         </td>
                                         <td className="px-6 py-4 whitespace-nowrap font-bold text-gray-900">
-                                            ${invoice.amount?.toLocaleString()}
+                                            ${Number(invoice.amount ?? 0).toLocaleString()}
                                         </td>
                                         <td className="px-6 py-4 whitespace-nowrap">
                                             <span className={`px-3 py-1 inline-flex text-xs leading-5 font-bold rounded-full border ${invoice.status === 'paid' ? 'bg-green-100 text-green-800 border-green-200' :
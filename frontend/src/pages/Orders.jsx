@@ -7,6 +7,7 @@ import ConfirmDialog from '../components/ConfirmDialog';
 import FormInput from '../components/FormInput';
 import FormSection from '../components/FormSection';
 import FormSelect from '../components/FormSelect';
+import { useEventStream, applyChange } from '../hooks/useEventStream';
 
 const Orders = () => {
     const { t } = useTranslation();
@@ -32,17 +33,34 @@ const Orders = () => {
     const addToast = useToastStore((state) => state.addToast);
 
     useEffect(() => {
-        fetchOrders();
-        fetchItems();
-        fetchSuppliers();
-        fetchCustomers();
+        fetchPage();
     }, []);
 
-    const fetchOrders = async () => {
+    useEventStream(['orders'], async (event) => {
+        if (event.op !== 'delete' && !event.data) {
+            // Id-only event: fetch just the changed order
+            try {
+                const response = await api.get(`/orders/${event.id}`);
+                event = { ...event, data: response.data };
+            } catch (error) {
+                return;
+            }
+        }
+        setOrders((prev) => applyChange(prev, event, 'order_id'));
+    }, { onResync: () => fetchOrders() });
+
+    const fetchPage = async () => {
+        // Everything the page needs in one round-trip
         setFetching(true);
         try {
-            const response = await api.get('/orders/');
-            setOrders(response.data);
+            const response = await api.get('/composite/', {
+                params: { resources: 'orders,items,suppliers,customers' },
+            });
+            const { orders, items, suppliers, customers } = response.data;
+            setOrders(orders.data || []);
+            setItems(items.data || []);
+            setSuppliers(suppliers.data || []);
+            setCustomers(customers.data || []);
         } catch (error) {
             console.error('Error fetching orders:', error);
             addToast(getErrorMessage(error), 'error');
@@ -51,30 +69,16 @@ const Orders = () => {
         }
     };
 
-    const fetchItems = async () => {
-        try {
-            const response = await api.get('/master-data/items/');
-            setItems(response.data);
-        } catch (error) {
-            console.error('Error fetching items:', error);
-        }
-    };
-
-    const fetchSuppliers = async () => {
-        try {
-            const response = await api.get('/master-data/suppliers/');
-            setSuppliers(response.data);
-        } catch (error) {
-            console.error('Error fetching suppliers:', error);
-        }
-    };
-
-    const fetchCustomers = async () => {
+    const fetchOrders = async () => {
+        setFetching(true);
         try {
-            const response = await api.get('/master-data/customers/');
-            setCustomers(response.data);
+            const response = await api.get('/orders/');
+            setOrders(response.data);
         } catch (error) {
-            console.error('Error fetching customers:', error);
+            console.error('Error fetching orders:', error);
+            addToast(getErrorMessage(error), 'error');
+        } finally {
+            setFetching(false);
         }
     };
 
@@ -97,7 +101,15 @@ const Orders = () => {
         setFormData({ ...formData, items: newItems });
     };
 
-    const handleEdit = (order) => {
+    const handleEdit = async (order) => {
+        // The list comes without lines; load them for the form
+        try {
+            const response = await api.get(`/orders/${order.order_id}`);
+            order = response.data;
+        } catch (error) {
+            addToast(getErrorMessage(error), 'error');
+            return;
+        }
         setFormData({
             order_number: order.order_number,
             order_type: order.order_type,
@@ -216,7 +228,6 @@ const Orders = () => {
                             name="order_number"
                             value={formData.order_number}
                             onChange={handleChange}
-                            required
                             disabled={loading}
                             placeholder={t('orders.orderNumber')}
                             icon="🔢"
@@ -413,7 +424,7 @@ const Orders = () => {
                                         </span>
                                     </td>
                                     <td className="px-6 py-4 whitespace-nowrap font-bold text-gray-900">
-                                        ${order.total_amount?.toLocaleString()}
+                                        ${Number(order.total_amount ?? 0).toLocaleString()}
                                     </td>
                                     <td className="px-6 py-4 whitespace-nowrap text-right text-sm font-medium">
                                         <button
@@ -28,15 +28,18 @@ const Production = () => {
     const addToast = useToastStore((state) => state.addToast);
 
     useEffect(() => {
-        fetchOrders();
-        fetchProducts();
+        fetchPage();
     }, []);
 
-    const fetchOrders = async () => {
+    const fetchPage = async () => {
+        // Everything the page needs in one round-trip
         setFetching(true);
         try {
-            const response = await api.get('/production/orders/');
-            setOrders(response.data);
+            const response = await api.get('/composite/', {
+                params: { resources: 'manufacturing_orders,products' },
+            });
+            setOrders(response.data.manufacturing_orders.data || []);
+            setProducts(response.data.products.data || []);
         } catch (error) {
             console.error('Error fetching manufacturing orders:', error);
             addToast(getErrorMessage(error), 'error');
@@ -45,12 +48,16 @@ const Production = () => {
         }
     };
 
-    const fetchProducts = async () => {
+    const fetchOrders = async () => {
+        setFetching(true);
         try {
-            const response = await api.get('/master-data/products/');
-            setProducts(response.data);
+            const response = await api.get('/production/orders/');
+            setOrders(response.data);
         } catch (error) {
-            console.error('Error fetching products:', error);
+            console.error('Error fetching manufacturing orders:', error);
+            addToast(getErrorMessage(error), 'error');
+        } finally {
+            setFetching(false);
         }
     };
 
@@ -167,7 +174,6 @@ const Production = () => {
                             name="production_order_number"
                             value={formData.production_order_number}
                             onChange={handleChange}
-                            required
                             disabled={loading}
                             placeholder={t('production.orderNumber')}
                             icon="🔢"
@@ -268,7 +274,7 @@ const Production = () => {
                                 >
                                     <td className="px-6 py-4 whitespace-nowrap font-bold text-gray-900">{order.production_order_number}</td>
                                     <td className="px-6 py-4 whitespace-nowrap text-gray-600">{getProductName(order.product_id)}</td>
-                                    <td className="px-6 py-4 whitespace-nowrap text-gray-600 font-medium">{order.quantity_required}</td>
+                                    <td className="px-6 py-4 whitespace-nowrap text-gray-600 font-medium">{Number(order.quantity_required)}</td>
                                     <td className="px-6 py-4 whitespace-nowrap">
                                         <span className={`px-3 py-1 inline-flex text-xs leading-5 font-bold rounded-full border ${order.status === 'completed' ? 'bg-green-100 text-green-800 border-green-200' :
                                             order.status === 'in_progress' ? 'bg-blue-100 text-blue-800 border-blue-200' :
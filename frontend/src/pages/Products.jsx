@@ -229,7 +229,7 @@ const Products = () => {
                         <div className="h-48 bg-gray-100 flex items-center justify-center relative overflow-hidden group">
                             <span className="text-6xl group-hover:scale-110 transition-transform duration-500">🏷️</span>
                             <div className="absolute top-4 right-4 bg-gradient-to-r from-blue-600 to-purple-600 text-white px-3 py-1 rounded-full text-sm font-bold shadow-lg">
-                                ${product.price?.toLocaleString()}
+                                ${Number(product.price ?? 0).toLocaleString()}
                             </div>
                         </div>
                         <div className="p-5">
@@ -7,6 +7,7 @@ import ConfirmDialog from '../components/ConfirmDialog';
 import FormInput from '../components/FormInput';
 import FormSection from '../components/FormSection';
 import FormSelect from '../components/FormSelect';
+import { useEventStream, applyChange } from '../hooks/useEventStream';
 
 const StockMovements = () => {
     const { t } = useTranslation();
@@ -32,6 +33,10 @@ const StockMovements = () => {
         fetchItems();
     }, []);
 
+    useEventStream(['stock_movements'], (event) => {
+        setMovements((prev) => applyChange(prev, event, 'movement_id'));
+    }, { onResync: () => fetchMovements() });
+
     const fetchMovements = async () => {
         setFetching(true);
         try {
@@ -271,7 +276,7 @@ const StockMovements = () => {
                                             </span>
                                         </td>
                                         <td className="px-6 py-4 whitespace-nowrap font-bold text-gray-900">
-                                            {movement.quantity} {item?.unit}
+                                            {Number(movement.quantity)} {item?.unit}
                                         </td>
                                         <td className="px-6 py-4 whitespace-nowrap text-gray-600">
                                             {movement.movement_date}